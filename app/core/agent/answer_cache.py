@@ -0,0 +1,138 @@
+from collections import OrderedDict
+from typing_extensions import Any, Dict, Optional, Tuple, TypedDict
+import os
+import pickle
+import threading
+import time
+
+import numpy as np
+
+class CachedAnswer(TypedDict):
+    question : str
+    answer : str
+    scope : str
+    created : float
+    hits : int
+
+class AnswerCache:
+    """
+    Semantic cache of final agent answers.
+    A question hits when an earlier question about the same scope (log file + index fingerprint)
+    has an embedding within similarity threshold (cosine) and is younger than ttl seconds.
+    Least recently used entries are evicted beyond max_entries. With a path the cache is
+    reloaded at start and saved after every insert, so it is shared across CLI runs.
+    """
+    def __init__(self, embedder, threshold : float = 0.92, ttl : float = 3600, max_entries : int = 256,
+                 path : Optional[str] = None) -> None:
+        """
+        Args:
+            embedder : Embedder used for the question embeddings (the index's embedder is fine)
+            threshold : minimum cosine similarity for a hit
+            ttl : seconds an answer stays valid
+            max_entries : entries kept, least recently used are evicted first
+            path : optional pickle file the cache is persisted to
+        """
+        self._embedder = embedder
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.path = path
+        self._entries : "OrderedDict[int, Tuple[np.ndarray, CachedAnswer]]" = OrderedDict()
+        self._next_id = 0
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "evictions": 0}
+        if path and os.path.exists(path):
+            self._load()
+
+    @classmethod
+    def from_env(cls, embedder) -> Optional["AnswerCache"]:
+        """
+        Reads ANSWER_CACHE (0 disables), ANSWER_CACHE_THRESHOLD, ANSWER_CACHE_TTL,
+        ANSWER_CACHE_SIZE and ANSWER_CACHE_PATH (default data/answer_cache.pkl, empty for memory only)
+        """
+        if os.getenv('ANSWER_CACHE', '1') == '0':
+            return None
+        return cls(embedder,
+                   threshold=float(os.getenv('ANSWER_CACHE_THRESHOLD', 0.92)),
+                   ttl=float(os.getenv('ANSWER_CACHE_TTL', 3600)),
+                   max_entries=int(os.getenv('ANSWER_CACHE_SIZE', 256)),
+                   path=os.getenv('ANSWER_CACHE_PATH', 'data/answer_cache.pkl') or None)
+
+    def _embed(self, question : str) -> np.ndarray:
+        vector = np.asarray(self._embedder.embed(question.strip().lower()), dtype="float32")
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def _expire(self, now : float):
+        expired = [key for key, (_, entry) in self._entries.items() if now - entry["created"] > self.ttl]
+        for key in expired:
+            del self._entries[key]
+
+    def lookup(self, question : str, scope : str) -> Optional[Tuple[CachedAnswer, float]]:
+        """
+        Returns:
+            (cached answer, similarity) of the most similar live question of the scope, None on a miss
+        """
+        vector = self._embed(question)
+        with self._lock:
+            self._expire(time.time())
+            # entries embedded by another model (different size) can never match
+            keys = [key for key, (cached, entry) in self._entries.items()
+                    if entry["scope"] == scope and cached.shape == vector.shape]
+            if keys:
+                similarities = np.stack([self._entries[key][0] for key in keys]) @ vector
+                best = int(np.argmax(similarities))
+                if similarities[best] >= self.threshold:
+                    key = keys[best]
+                    self._entries.move_to_end(key)
+                    entry = self._entries[key][1]
+                    entry["hits"] += 1
+                    self.stats["hits"] += 1
+                    return entry, float(similarities[best])
+            self.stats["misses"] += 1
+            return None
+
+    def put(self, question : str, scope : str, answer : str):
+        vector = self._embed(question)
+        with self._lock:
+            self._entries[self._next_id] = (vector, CachedAnswer(question=question, answer=answer, scope=scope,
+                                                                 created=time.time(), hits=0))
+            self._next_id += 1
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.stats["evictions"] += 1
+            if self.path:
+                self._save()
+
+    def invalidate(self, scope : Optional[str] = None):
+        """
+        Drops every entry, or only the entries of scope
+        """
+        with self._lock:
+            for key in [key for key, (_, entry) in self._entries.items() if scope is None or entry["scope"] == scope]:
+                del self._entries[key]
+            if self.path:
+                self._save()
+
+    def _save(self):
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "wb") as f:
+            pickle.dump({"entries": list(self._entries.values())}, f)
+        os.replace(tmp_path, self.path)
+
+    def _load(self):
+        try:
+            with open(self.path, "rb") as f:
+                state : Dict[str, Any] = pickle.load(f)
+        except (OSError, pickle.UnpicklingError, EOFError) as e:
+            print(f"[AnswerCache] Ignoring unreadable cache {self.path}: {e}")
+            return
+        for vector, entry in state["entries"]:
+            self._entries[self._next_id] = (vector, entry)
+            self._next_id += 1
+
+def cache_scope(log_file_path : str, index_fingerprint : str) -> str:
+    return f"{os.path.abspath(log_file_path)}|{index_fingerprint}"
+
+__all__ = ['AnswerCache', 'CachedAnswer', 'cache_scope']
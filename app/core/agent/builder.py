@@ -2,21 +2,24 @@ from .state import AgentState, AgentInputSchema
 from .tools import ToolMaker
 from .prompts import LLM_PROMPT
 from .model_provider import ModelProvider
+from .memory import ConversationWindow
 
 from langchain_core.messages import AIMessage, ToolMessage, HumanMessage, SystemMessage
 from langgraph.graph import StateGraph,  START, END
 
 from langgraph.types import Command
-from typing_extensions import Literal
+from typing_extensions import Literal, Optional
 
 from dotenv import load_dotenv
 load_dotenv()
 
 MAX_EXECUTIONS = 4
 
-async def build_workflow(provider: ModelProvider, tool_maker: ToolMaker, log_list: list[str], log_file_path: str) -> StateGraph:
+async def build_workflow(provider: ModelProvider, tool_maker: ToolMaker, log_list: list[str], log_file_path: str,
+                         memory: Optional[ConversationWindow] = None) -> StateGraph:
     """
     Builds the LangGraph-based workflow for the Log Analysis Agent.
+    memory : message window applied at the start of every turn (default: ConversationWindow.from_env())
     """
     if not log_list:
         raise ValueError("Error - log list was not provided")
@@ -31,18 +34,31 @@ async def build_workflow(provider: ModelProvider, tool_maker: ToolMaker, log_lis
     print(tools)
     print('-----------------------------------------------')
     model_with_tools = provider.model.bind_tools(tools)
+    window = memory or ConversationWindow.from_env()
+
+    # ----------- MEMORY NODE -----------
+    def memory_node(state: AgentState) -> dict:
+        # Runs once per user turn: older turns are compacted / summarized so the LLM input stays bounded
+        update = window.apply(state["messages"], state.get("summary"))
+        if "summary" in update:
+            print(f"[MEMORY NODE] Summarized older turns, {len(update.get('messages', []))} message updates")
+        update["execution_count"] = 0
+        return update
 
     # ----------- LLM NODE -----------
-    def llm_node(state: AgentState) -> dict:
+    async def llm_node(state: AgentState) -> dict:
         exec_count = state.get("execution_count", 0)
         print(f"[LLM NODE] Execution #{exec_count + 1}")
 
         # Format the system prompt with dynamic log context
+        system_prompt = LLM_PROMPT.format(log_list=log_list, log_file_path=log_file_path, max_executions=MAX_EXECUTIONS-1, execution_count=exec_count)
+        if state.get("summary"):
+            system_prompt += f"\nSummary of the earlier conversation:\n{state['summary']}\n"
         messages = [
-            SystemMessage(LLM_PROMPT.format(log_list=log_list, log_file_path=log_file_path, max_executions=MAX_EXECUTIONS-1, execution_count=exec_count)),
+            SystemMessage(system_prompt),
         ] + state["messages"]
 
-        response = model_with_tools.invoke(messages)
+        response = await model_with_tools.ainvoke(messages)
         return {
             "messages": [response],
             "execution_count": exec_count + 1,  # increment counter
@@ -64,9 +80,9 @@ async def build_workflow(provider: ModelProvider, tool_maker: ToolMaker, log_lis
                 if tool_name == "delegate_complex_analysis":
                     print("[Tool Node] Intercepted call to delegate_complex_analysis")
                     
-                    # 1. Find the original user query from the message history
+                    # 1. Find the user query of this turn from the message history
                     initial_query = ""
-                    for msg in state['messages']:
+                    for msg in reversed(state['messages']):
                         if isinstance(msg, HumanMessage):
                             initial_query = msg.content
                             print(f"[Tool Node] Found user query: {initial_query}")
@@ -132,10 +148,12 @@ async def build_workflow(provider: ModelProvider, tool_maker: ToolMaker, log_lis
     # ----------- GRAPH BUILDING -----------
     graph_builder = StateGraph(AgentState, input_schema=AgentInputSchema)
 
+    graph_builder.add_node("memory_node", memory_node)
     graph_builder.add_node("llm_node", llm_node)
     graph_builder.add_node("tool_node", tool_node)
 
-    graph_builder.add_edge(START, "llm_node")
+    graph_builder.add_edge(START, "memory_node")
+    graph_builder.add_edge("memory_node", "llm_node")
     graph_builder.add_conditional_edges(
         "llm_node",
         should_continue,
@@ -0,0 +1,211 @@
+from typing_extensions import TYPE_CHECKING, Any, Dict, List, Optional
+import asyncio
+import json
+import os
+import sys
+import time
+
+if TYPE_CHECKING:
+    from langchain_core.tools import StructuredTool
+
+SERVER_NAME = "python_analyzer_service"
+# mcp/ of this repository, the server runs with its own venv when it has one
+_MCP_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', '..', 'mcp'))
+
+def mcp_connection_from_env() -> Dict[str, Any]:
+    """
+    stdio connection of the python analyzer MCP server.
+    MCP_SERVER_PYTHON / MCP_SERVER_SCRIPT override the interpreter and script,
+    by default mcp/.venv's python (or the current one) runs mcp/main.py
+    """
+    python = os.getenv('MCP_SERVER_PYTHON')
+    if not python:
+        candidates = [os.path.join(_MCP_DIR, '.venv', 'Scripts', 'python.exe'), os.path.join(_MCP_DIR, '.venv', 'bin', 'python')]
+        python = next((path for path in candidates if os.path.exists(path)), sys.executable)
+    script = os.getenv('MCP_SERVER_SCRIPT', os.path.join(_MCP_DIR, 'main.py'))
+    # the server needs the API keys, stdio servers otherwise only get a minimal environment
+    return {"transport": "stdio", "command": python, "args": [script], "env": dict(os.environ)}
+
+class PersistentMCPSession:
+    """
+    One long-lived MCP session to a server, owned by a background task:
+        - started early (e.g. at CLI startup) so the server subprocess is spawned off the critical path
+        - tools are built from a schema cache on disk when there is one, so they are available before
+          the server is up; the cache is refreshed from list_tools() on every connect
+        - a call failing on a broken connection reconnects (with backoff) and is retried once
+        - per tool latency / error metrics
+    """
+    def __init__(self, connection : Optional[Dict[str, Any]] = None, server_name : str = SERVER_NAME,
+                 schema_cache_path : Optional[str] = None, call_timeout : float = 600, connect_timeout : float = 60) -> None:
+        self.server_name = server_name
+        self.connection = connection or mcp_connection_from_env()
+        self.schema_cache_path = schema_cache_path
+        self.call_timeout = call_timeout
+        # seconds get_tools / call_tool wait for the server, the background task keeps retrying after that
+        self.connect_timeout = connect_timeout
+        self._session = None
+        self._connected = asyncio.Event()
+        self._broken = asyncio.Event()
+        self._closing = False
+        self._task : Optional[asyncio.Task] = None
+        self._tool_specs : Optional[List[Dict[str, Any]]] = self._load_cache()
+        self._listed = asyncio.Event()
+        self._metrics : Dict[str, Dict[str, float]] = {}
+
+    @classmethod
+    def from_env(cls) -> "PersistentMCPSession":
+        """
+        Reads MCP_SERVER_PYTHON, MCP_SERVER_SCRIPT, MCP_TOOL_CACHE (default data/mcp_tools.json, empty to disable)
+        and MCP_CONNECT_TIMEOUT (seconds, default 60)
+        """
+        return cls(schema_cache_path=os.getenv('MCP_TOOL_CACHE', 'data/mcp_tools.json') or None,
+                   connect_timeout=float(os.getenv('MCP_CONNECT_TIMEOUT', 60)))
+
+    def start(self) -> "PersistentMCPSession":
+        """
+        Starts connecting in the background, must be called from the event loop the tools run in
+        """
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._run(), name=f"mcp-session-{self.server_name}")
+        return self
+
+    async def _run(self):
+        from langchain_mcp_adapters.client import MultiServerMCPClient
+
+        client = MultiServerMCPClient({self.server_name: self.connection})
+        delay = 1.0
+        while not self._closing:
+            started = time.perf_counter()
+            try:
+                # enter and exit in this task, the stdio transport's task group is bound to it
+                async with client.session(self.server_name) as session:
+                    listed = await session.list_tools()
+                    self._store_specs([{"name": t.name, "description": t.description or "", "inputSchema": t.inputSchema}
+                                       for t in listed.tools])
+                    print(f"[MCP] Connected to {self.server_name} in {time.perf_counter() - started:.2f}s")
+                    self._session = session
+                    self._broken.clear()
+                    self._connected.set()
+                    delay = 1.0
+                    await self._broken.wait()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"[MCP] Session to {self.server_name} failed: {e}")
+            finally:
+                self._session = None
+                self._connected.clear()
+            if not self._closing:
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, 30.0)
+
+    def _load_cache(self) -> Optional[List[Dict[str, Any]]]:
+        if not self.schema_cache_path or not os.path.exists(self.schema_cache_path):
+            return None
+        try:
+            with open(self.schema_cache_path, 'r', encoding='utf-8') as f:
+                cache = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"[MCP] Ignoring unreadable tool cache {self.schema_cache_path}: {e}")
+            return None
+        # a cache written for another server command is stale
+        if cache.get("connection") != {"command": self.connection.get("command"), "args": self.connection.get("args")}:
+            return None
+        return cache.get("tools")
+
+    def _store_specs(self, specs : List[Dict[str, Any]]):
+        if self._tool_specs != specs and self.schema_cache_path:
+            os.makedirs(os.path.dirname(os.path.abspath(self.schema_cache_path)), exist_ok=True)
+            with open(self.schema_cache_path, 'w', encoding='utf-8') as f:
+                json.dump({"connection": {"command": self.connection.get("command"), "args": self.connection.get("args")},
+                           "tools": specs}, f, indent=2)
+        self._tool_specs = specs
+        self._listed.set()
+
+    async def get_tools(self) -> List['StructuredTool']:
+        """
+        The server's tools as langchain tools calling through this session.
+        Uses the cached schemas right away, otherwise waits for the first connect.
+        Raises:
+            ConnectionError when the server did not come up within connect_timeout
+        """
+        self.start()
+        if self._tool_specs is None:
+            try:
+                await asyncio.wait_for(self._listed.wait(), timeout=self.connect_timeout)
+            except asyncio.TimeoutError:
+                raise ConnectionError(f"MCP server {self.server_name} did not start within {self.connect_timeout:g}s "
+                                      f"({self.connection.get('command')} {' '.join(self.connection.get('args', []))})")
+        return [self._make_tool(spec) for spec in self._tool_specs]
+
+    def _make_tool(self, spec : Dict[str, Any]) -> 'StructuredTool':
+        # imported here, the CLI creates the session before its first prompt and langchain is slow to import
+        from langchain_core.tools import StructuredTool
+
+        name = spec["name"]
+
+        async def call(**arguments):
+            return await self.call_tool(name, arguments)
+
+        return StructuredTool.from_function(coroutine=call, name=name, description=spec["description"],
+                                            args_schema=spec["inputSchema"])
+
+    async def call_tool(self, name : str, arguments : Dict[str, Any]) -> str:
+        import anyio
+        from langchain_core.tools import ToolException
+
+        self.start()
+        metrics = self._metrics.setdefault(name, {"calls": 0, "errors": 0, "reconnects": 0, "total_s": 0.0, "max_s": 0.0})
+        started = time.perf_counter()
+        metrics["calls"] += 1
+        try:
+            for attempt in range(2):
+                try:
+                    await asyncio.wait_for(self._connected.wait(), timeout=self.connect_timeout)
+                except asyncio.TimeoutError:
+                    # returned to the agent as the tool's error instead of hanging the turn
+                    raise ToolException(f"{self.server_name} is unavailable: no connection within {self.connect_timeout:g}s")
+                session = self._session
+                try:
+                    result = await asyncio.wait_for(session.call_tool(name, arguments), timeout=self.call_timeout)
+                    break
+                except (anyio.ClosedResourceError, anyio.BrokenResourceError, anyio.EndOfStream, ConnectionError) as e:
+                    # the server process died or the pipe broke: reconnect and retry once
+                    if attempt:
+                        raise
+                    print(f"[MCP] {name}: connection lost ({type(e).__name__}), reconnecting")
+                    metrics["reconnects"] += 1
+                    self._broken.set()
+                    self._connected.clear()
+            text = "\n".join(getattr(part, "text", str(part)) for part in result.content)
+            if result.isError:
+                raise ToolException(text)
+            return text
+        except Exception:
+            metrics["errors"] += 1
+            raise
+        finally:
+            elapsed = time.perf_counter() - started
+            metrics["total_s"] += elapsed
+            metrics["max_s"] = max(metrics["max_s"], elapsed)
+            print(f"[MCP] {name} took {elapsed:.2f}s")
+
+    def metrics(self) -> Dict[str, Dict[str, float]]:
+        """
+        Per tool: calls, errors, reconnects, avg_s and max_s
+        """
+        return {name: {**{key: value for key, value in m.items() if key != "total_s"},
+                       "avg_s": round(m["total_s"] / m["calls"], 3) if m["calls"] else 0.0}
+                for name, m in self._metrics.items()}
+
+    async def close(self):
+        self._closing = True
+        self._broken.set()
+        if self._task is not None:
+            try:
+                await asyncio.wait_for(self._task, timeout=5)
+            except (asyncio.TimeoutError, asyncio.CancelledError):
+                self._task.cancel()
+            self._task = None
+
+__all__ = ['PersistentMCPSession', 'mcp_connection_from_env', 'SERVER_NAME']
@@ -0,0 +1,113 @@
+from contextlib import asynccontextmanager
+from typing_extensions import AsyncIterator, List, Optional
+import os
+
+from langchain_core.messages import AIMessage, AnyMessage, HumanMessage, RemoveMessage, ToolMessage
+
+class ConversationWindow:
+    """
+    Message window policy that keeps the conversation sent to the LLM bounded:
+        - the last keep_turns turns are kept verbatim
+        - the compact_turns turns before them keep their messages, tool outputs cut to tool_output_chars
+        - older turns are removed from the state and folded into a running summary
+          (question + final answer of each turn, no extra LLM call)
+    A turn is a user message and everything the agent did to answer it.
+    """
+    def __init__(self, keep_turns : int = 3, compact_turns : int = 3, tool_output_chars : int = 400,
+                 summary_chars : int = 3000) -> None:
+        self.keep_turns = keep_turns
+        self.compact_turns = compact_turns
+        self.tool_output_chars = tool_output_chars
+        self.summary_chars = summary_chars
+
+    @classmethod
+    def from_env(cls) -> "ConversationWindow":
+        """
+        Reads AGENT_KEEP_TURNS, AGENT_COMPACT_TURNS and AGENT_TOOL_OUTPUT_CHARS
+        """
+        options = {}
+        for env_name, option in (('AGENT_KEEP_TURNS', 'keep_turns'), ('AGENT_COMPACT_TURNS', 'compact_turns'),
+                                 ('AGENT_TOOL_OUTPUT_CHARS', 'tool_output_chars')):
+            value = os.getenv(env_name)
+            if value:
+                options[option] = int(value)
+        return cls(**options)
+
+    @staticmethod
+    def split_turns(messages : List[AnyMessage]) -> List[List[AnyMessage]]:
+        turns : List[List[AnyMessage]] = []
+        for message in messages:
+            if isinstance(message, HumanMessage) or not turns:
+                turns.append([])
+            turns[-1].append(message)
+        return turns
+
+    @staticmethod
+    def _digest(turn : List[AnyMessage]) -> str:
+        question = next((str(m.content) for m in turn if isinstance(m, HumanMessage)), "")
+        answer = next((str(m.content) for m in reversed(turn) if isinstance(m, AIMessage) and m.content), "")
+        tools = sorted({call["name"] for m in turn if isinstance(m, AIMessage) for call in m.tool_calls})
+        digest = f"- User: {question[:200]}"
+        if tools:
+            digest += f"\n  Tools used: {', '.join(tools)}"
+        if answer:
+            digest += f"\n  Answer: {answer[:400]}"
+        return digest
+
+    def _compact(self, message : AnyMessage) -> Optional[ToolMessage]:
+        content = str(message.content)
+        if not isinstance(message, ToolMessage) or len(content) <= self.tool_output_chars or content.endswith("chars omitted]"):
+            return None
+        omitted = len(content) - self.tool_output_chars
+        return ToolMessage(content=f"{content[:self.tool_output_chars]}\n[tool output compacted, {omitted} chars omitted]",
+                           tool_call_id=message.tool_call_id, id=message.id, name=message.name)
+
+    def apply(self, messages : List[AnyMessage], summary : Optional[str]) -> dict:
+        """
+        Returns:
+            The state update for the window: RemoveMessages for summarized turns, compacted
+            tool messages (same id, so they replace the originals) and the new summary.
+            Empty when nothing changes.
+        """
+        turns = self.split_turns(messages)
+        update : dict = {}
+        messages_update : List[AnyMessage] = []
+
+        evicted = turns[:max(0, len(turns) - self.keep_turns - self.compact_turns)]
+        if evicted:
+            digests = [summary] if summary else []
+            digests += [self._digest(turn) for turn in evicted]
+            new_summary = "\n".join(digests)
+            if len(new_summary) > self.summary_chars:
+                # the oldest part of the summary goes first
+                new_summary = "...\n" + new_summary[-self.summary_chars:].split("\n", 1)[-1]
+            update["summary"] = new_summary
+            messages_update += [RemoveMessage(id=m.id) for turn in evicted for m in turn if m.id]
+
+        for turn in turns[len(evicted):max(len(evicted), len(turns) - self.keep_turns)]:
+            messages_update += [compacted for compacted in map(self._compact, turn) if compacted is not None]
+
+        if messages_update:
+            update["messages"] = messages_update
+        return update
+
+@asynccontextmanager
+async def open_checkpointer(path : Optional[str] = None) -> AsyncIterator:
+    """
+    LangGraph checkpointer for the agent graph: sqlite at path when langgraph-checkpoint-sqlite
+    is installed (sessions survive restarts), otherwise in memory for this process only.
+    """
+    if path:
+        try:
+            from langgraph.checkpoint.sqlite.aio import AsyncSqliteSaver
+        except ImportError:
+            print("[Memory] langgraph-checkpoint-sqlite is not installed, sessions are kept in memory only")
+        else:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            async with AsyncSqliteSaver.from_conn_string(path) as saver:
+                yield saver
+            return
+    from langgraph.checkpoint.memory import MemorySaver
+    yield MemorySaver()
+
+__all__ = ['ConversationWindow', 'open_checkpointer']
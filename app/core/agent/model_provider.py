@@ -2,71 +2,135 @@ import os
 import sys
 from langchain_openai import ChatOpenAI
 from langchain_google_genai import ChatGoogleGenerativeAI
-from typing import Optional, Union
+from typing import Any, List, Optional, Sequence, Tuple, Union
+
+from .routing import RoutedChatModel
 
 class ModelProvider:
     """
     A factory class to build and return a ChatModel instance
     based on the specified provider.
+    The built model routes over the provider and its fallbacks (see RoutedChatModel):
+    per call deadline, hedged requests, rate limit backoff and failover.
     """
-    def __init__(self, provider: str, model_name: str):
+    def __init__(self, provider: str, model_name: str, fallbacks: Optional[Sequence[Tuple[str, str]]] = None,
+                 deadline: Optional[float] = None, hedge_delay: Optional[float] = None, hedge: Optional[bool] = None):
+        """
+        Args:
+            provider, model_name : primary model
+            fallbacks : (provider, model name) tried after the primary, default MODEL_FALLBACKS
+                        ("openrouter:openai/gpt-4.1-mini,googleai:gemini-2.0-flash")
+            deadline : seconds per LLM call over all attempts, default MODEL_DEADLINE or 120
+            hedge_delay : seconds before a hedged request, default MODEL_HEDGE_DELAY or the rolling p90 latency
+            hedge : send hedged requests, default MODEL_HEDGE (1)
+        """
         self.provider = provider.lower()
         self.model_name = model_name
-        self.model : Optional[Union[ChatOpenAI, ChatGoogleGenerativeAI]] = None
+        self.model : Optional[Union[RoutedChatModel, ChatOpenAI, ChatGoogleGenerativeAI]] = None
         self.api_keys = {
             "openai": lambda : os.getenv('OPENAI_API_KEY', ''),
             "googleai" : lambda : os.getenv('GOOGLE_API_KEY'),
             "openrouter": lambda : os.getenv('OPENROUTER_API_KEY','')
         }
+        self.fallbacks = list(fallbacks) if fallbacks is not None else self._fallbacks_from_env()
+        self.deadline = deadline if deadline is not None else float(os.getenv('MODEL_DEADLINE', 120))
+        hedge_delay_env = os.getenv('MODEL_HEDGE_DELAY')
+        self.hedge_delay = hedge_delay if hedge_delay is not None else (float(hedge_delay_env) if hedge_delay_env else None)
+        self.hedge = hedge if hedge is not None else os.getenv('MODEL_HEDGE', '1') != '0'
         self._validate_keys()
 
+    @classmethod
+    def from_models(cls, models: Sequence[Tuple[str, Any]], **routing) -> "ModelProvider":
+        """
+        Provider over already built chat models, e.g. local fake chat models for tests:
+            ModelProvider.from_models([("slow", FakeChatModel(...)), ("fast", FakeChatModel(...))], deadline=5)
+        Args:
+            routing : RoutedChatModel options (deadline, hedge_delay, hedge, min_hedge_delay), deadline defaults to 120
+        """
+        routing.setdefault("deadline", 120.0)
+        provider = cls.__new__(cls)
+        provider.provider, provider.model_name = "custom", models[0][0]
+        provider.fallbacks = []
+        provider.deadline, provider.hedge_delay = routing["deadline"], routing.get("hedge_delay")
+        provider.hedge = routing.get("hedge", True)
+        provider.model = RoutedChatModel(models, **routing)
+        return provider
+
+    @staticmethod
+    def _fallbacks_from_env() -> List[Tuple[str, str]]:
+        fallbacks = []
+        for item in os.getenv('MODEL_FALLBACKS', '').split(','):
+            if ':' in item:
+                provider, model_name = item.split(':', 1)
+                fallbacks.append((provider.strip().lower(), model_name.strip()))
+        return fallbacks
+
+    def _has_key(self, provider: str) -> bool:
+        return provider in self.api_keys and bool(self.api_keys[provider]())
+
     def _validate_keys(self):
         """Check that the required API key for the provider is set."""
-        if self.provider == "googleai" and not self.api_keys["googleai"]:
+        if self.provider == "googleai" and not self._has_key("googleai"):
             raise ValueError("MODEL_PROVIDER is 'googleai' but GOOGLE_API_KEY is not set.")
-        if self.provider == "openai" and not self.api_keys["openai"]:
+        if self.provider == "openai" and not self._has_key("openai"):
             raise ValueError("MODEL_PROVIDER is 'openai' but OPENAI_API_KEY is not set.")
-        if self.provider == "openrouter" and not self.api_keys["openrouter"]:
+        if self.provider == "openrouter" and not self._has_key("openrouter"):
             raise ValueError("MODEL_PROVIDER is 'openrouter' but OPENROUTER_API_KEY is not set.")
 
-    def _build_openai(self) -> ChatOpenAI:
+    def _build_openai(self, model_name: str) -> ChatOpenAI:
         """Builds an OpenAI model instance."""
-        print(f"Building OpenAI model: {self.model_name}")
+        print(f"Building OpenAI model: {model_name}")
         return ChatOpenAI(
-            model=self.model_name,
+            model=model_name,
             temperature=0.3,
-            api_key=self.api_keys["openai"]
+            api_key=self.api_keys["openai"](),
+            # the router owns deadlines and retries
+            max_retries=0,
+            timeout=self.deadline
         )
     
-    def _build_googleai(self) -> ChatGoogleGenerativeAI:
-        """Builds an OpenAI model instance."""
-        print(f"Building OpenAI model: {self.model_name}")
+    def _build_googleai(self, model_name: str) -> ChatGoogleGenerativeAI:
+        """Builds a Google AI model instance."""
+        print(f"Building Google AI model: {model_name}")
         return ChatGoogleGenerativeAI(
-            model=self.model_name,
+            model=model_name,
             temperature=0.3,
-            google_api_key=self.api_keys["googleai"]()
+            google_api_key=self.api_keys["googleai"](),
+            max_retries=0,
+            timeout=self.deadline
         )
 
-    def _build_openrouter(self) -> ChatOpenAI:
+    def _build_openrouter(self, model_name: str) -> ChatOpenAI:
         """Builds an OpenRouter model instance."""
-        print(f"Building OpenRouter model: {self.model_name}")
+        print(f"Building OpenRouter model: {model_name}")
         return ChatOpenAI(
-            model=self.model_name,
-            api_key=self.api_keys["openrouter"],
+            model=model_name,
+            api_key=self.api_keys["openrouter"](),
             base_url='https://openrouter.ai/api/v1',
-            temperature=0.0
+            temperature=0.0,
+            max_retries=0,
+            timeout=self.deadline
         )
 
+    def _build_one(self, provider: str, model_name: str):
+        if provider == "openai":
+            return self._build_openai(model_name)
+        elif provider == "openrouter":
+            return self._build_openrouter(model_name)
+        elif provider == 'googleai':
+            return self._build_googleai(model_name)
+        else:
+            raise ValueError(f"Unknown model provider: {provider}")
+
     def build(self) :
         """
         Public method to build the model.
         This acts as the factory.
         """
-        if self.provider == "openai":
-            self.model = self._build_openai()
-        elif self.provider == "openrouter":
-            self.model = self._build_openrouter()
-        elif self.provider == 'googleai':
-            self.model = self._build_googleai()
-        else:
-            raise ValueError(f"Unknown model provider: {self.provider}")
\ No newline at end of file
+        backends = [(f"{self.provider}:{self.model_name}", self._build_one(self.provider, self.model_name))]
+        for provider, model_name in self.fallbacks:
+            if not self._has_key(provider):
+                print(f"Skipping fallback {provider}:{model_name}, unknown provider or no API key set")
+                continue
+            backends.append((f"{provider}:{model_name}", self._build_one(provider, model_name)))
+        self.model = RoutedChatModel(backends, deadline=self.deadline, hedge_delay=self.hedge_delay, hedge=self.hedge)
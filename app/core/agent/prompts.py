@@ -14,17 +14,35 @@ You have access to the following information:
     {log_file_path}
     </log_file_path>
 
-You have access to TWO tools. You must follow these rules for tool use:
+You have access to FIVE tools. You must follow these rules for tool use:
 
 1.  `query_tool(query: str)`
     * **What it does:** Searches a vector database for log entries that are *semantically similar* to your query.
     * **When to use it:** Use this for *vague* or *example-based* queries.
     * **Example Queries:** "Find logs *about* camera connection failures," or "What do 'database timeout' errors look like?"
+    * **Time range:** If the question is about a specific period, pass `start_time` / `end_time` (ISO format, e.g. "2025-10-05 14:00:00") so only that period is searched.
+    * **Service:** If the question is about one service, pass `service` (the log file name without extension) so other services are not searched.
+    * **Output:** Results come back as the individual log lines closest to your query, marked `>>`, each with a few surrounding lines (neighbouring matches merged). If you need the whole surrounding log window, pass `whole_chunks=True` to get line ranges instead (repeated lines collapsed). If a note says lines were omitted, narrow the query, time range or service instead of raising `k`.
 
-2.  `python_analyzer_service(query: str, log_file_path: str)`
+2.  `log_stats_tool(start_time, end_time, service, level, bucket, top)`
+    * **What it does:** Answers counting questions from per-minute counts precomputed when the logs were indexed: lines and errors per level / service, time series per minute / hour / day, lines per minute and the most frequent messages.
+    * **When to use it:** Use this FIRST for *how many*, *how often*, *per hour*, *rate* and *most common* questions. It answers in milliseconds.
+    * **Example Queries:** "How many WARNING logs per hour on 2025-10-05?" -> `level="WARNING", bucket="hour", start_time="2025-10-05 00:00:00", end_time="2025-10-05 23:59:59"`, "Most frequent errors of the billing service" -> `service="billing"`.
+
+3.  `log_query_tool(start_time, end_time, filters, group_by, bucket, top_k, sample_rows)`
+    * **What it does:** Runs a structured query over every parsed log line in-process: filter on level / service / source / message template / is_error and time, group by any of them and a time bucket, count, and return example lines. Results are exact and take milliseconds.
+    * **When to use it:** Use this for *filter / group-by / count / top-k* questions that `log_stats_tool` cannot answer directly (e.g. filtering on message text, several group keys, exact first / last occurrence) and to fetch example lines.
+    * **Example Queries:** "Which services logged 'timeout' errors and when first?" -> `filters=[{{"field": "template", "op": "contains", "value": "timeout"}}, {{"field": "is_error", "value": true}}], group_by=["service"]`, "Errors per service per hour" -> `filters=[{{"field": "is_error", "value": true}}], group_by=["service"], bucket="hour"`.
+
+4.  `log_range_tool(start_time, end_time, around, seconds, service, max_lines, cursor)`
+    * **What it does:** Returns the raw log lines of a time range, in order, read straight from the log files through a time index (fast even on very large logs). The number of lines is capped.
+    * **When to use it:** Use this to see *exactly what was logged* at a given time: the lines around an error found with another tool, or a short window of a service. Pass `around` with `seconds` for "what happened around 14:03:12", or a narrow `start_time` / `end_time`.
+    * **Example Queries:** "What happened right before the crash at 2025-10-05 14:03:12?" -> `around="2025-10-05 14:03:12", seconds=30`. If the result says more lines are in the range, narrow the range or add `service` rather than paging through everything; when you do need the next lines, call again with the same range and the `cursor` given in the note.
+
+5.  `python_analyzer_service(query: str, log_file_path: str)`
     * **What it does:** Delegates a complex query to a specialized Python analysis service. This service can read and process the *entire* log file.
-    * **When to use it:** Use this for ANY query that requires *counting*, *filtering by specific criteria* (like dates or log levels), *aggregation*, or *correlation*.
-    * **Example Queries:** "How many 'WARNING' logs were there on 2025-10-05?", "List all errors between 2 PM and 3 PM."
+    * **When to use it:** Use this as a LAST RESORT, only for analysis `log_stats_tool` and `log_query_tool` cannot answer: *correlation*, *filtering on message contents* (user ids, request paths...) or custom computations over the full file.
+    * **Example Queries:** "Which users hit a timeout after a failed login?", "Average response time of /v1/events requests between 2 PM and 3 PM."
     * **IMPORTANT:** You **must** pass two arguments: the `query` (which should be the user's original question) and the `log_file_path` (which is provided above).
 
 **Your Action Plan:**
@@ -33,7 +51,10 @@ You have access to TWO tools. You must follow these rules for tool use:
 2.  **Check Context First:** Examine the `<log_list>` above. If this list *already contains* the full answer, provide the answer directly without using any tools.
 3.  **Decide on a Tool:**
     * If the query is *semantic* or *example-seeking*, use `query_tool`.
-    * If the query requires *counting, filtering, or complex analysis* of the full file, you **must** use `python_analyzer_service`.
+    * If the query is about *counts, rates or most frequent messages*, use `log_stats_tool`.
+    * If it needs *filtering, grouping or example lines* beyond that, use `log_query_tool`.
+    * If you need the *raw lines of a short time window* (e.g. around an error), use `log_range_tool`.
+    * Only if the query requires *correlation or custom analysis* of the full file, use `python_analyzer_service`.
 4.  **Respond:**
     * If you used a tool, you will get new information. Base your final answer on that.
     * If you are answering directly from the `<log_list>`, just provide the answer.
@@ -0,0 +1,273 @@
+from typing_extensions import Any, Callable, Dict, List, Optional, Sequence, Set, Tuple, TypedDict
+import re
+
+from app.core.embedding.templates import template_of
+
+# rough size of a token in characters, good enough for budgeting English / log text
+CHARS_PER_TOKEN = 4
+# lines kept around a highlighted line when a range has to be cut down
+CONTEXT_LINES = 2
+
+_WORD_RE = re.compile(r"[a-z0-9_]{2,}")
+_ERROR_WORDS = ("error", "exception", "fail", "critical", "fatal")
+
+class LineRange(TypedDict):
+    source : Optional[str]
+    service : Optional[str]
+    start_line : Optional[int]
+    end_line : Optional[int]
+    # (line number or None, text)
+    lines : List[Tuple[Optional[int], str]]
+    distance : float
+    occurrences : int
+    start_timestamp : Any
+    end_timestamp : Any
+
+def estimate_tokens(text : str) -> int:
+    return len(text) // CHARS_PER_TOKEN + 1
+
+def _words(text : str) -> Set[str]:
+    return set(_WORD_RE.findall(text.lower()))
+
+def _hit_lines(hit : Dict) -> List[str]:
+    return [line.rstrip() for line in hit["document"].splitlines()]
+
+def _estimated_occurrences(metadata : Dict) -> int:
+    """
+    Repetitions a chunk stands for: itself, the duplicates folded onto it (occurrences - 1) and the
+    routine windows sampled away after it (sample_weight - 1). Both count non overlapping windows, so they add up.
+    """
+    return metadata.get("occurrences", 1) + round(metadata.get("sample_weight", 1.0)) - 1
+
+def merge_hits(hits : List[Dict]) -> List[LineRange]:
+    """
+    Merges overlapping / adjacent hits of the same source into line ranges.
+    Hits without line numbers (stores built before they were recorded) stay separate ranges.
+    Returns:
+        Ranges ordered by their best (smallest) distance
+    """
+    ranges : List[LineRange] = []
+    numbered : Dict[Optional[str], List[Dict]] = {}
+    for hit in hits:
+        metadata = hit.get("metadata") or {}
+        if metadata.get("start_line") is None:
+            ranges.append(LineRange(source=metadata.get("source"), service=metadata.get("service"),
+                                    start_line=None, end_line=None,
+                                    lines=[(None, line) for line in _hit_lines(hit)],
+                                    distance=hit.get("distance", 0.0), occurrences=_estimated_occurrences(metadata),
+                                    start_timestamp=metadata.get("start_timestamp"), end_timestamp=metadata.get("end_timestamp")))
+        else:
+            numbered.setdefault(metadata.get("source"), []).append(hit)
+
+    for source, source_hits in numbered.items():
+        source_hits.sort(key=lambda hit: hit["metadata"]["start_line"])
+        current : Optional[LineRange] = None
+        by_line : Dict[int, str] = {}
+        for hit in source_hits:
+            metadata = hit["metadata"]
+            if current is not None and metadata["start_line"] <= current["end_line"] + 1:
+                current["end_line"] = max(current["end_line"], metadata["end_line"])
+                current["distance"] = min(current["distance"], hit.get("distance", 0.0))
+                current["occurrences"] = max(current["occurrences"], _estimated_occurrences(metadata))
+                if metadata.get("end_timestamp") is not None:
+                    current["end_timestamp"] = max(filter(None, (current["end_timestamp"], metadata["end_timestamp"])))
+            else:
+                if current is not None:
+                    current["lines"] = sorted(by_line.items())
+                    ranges.append(current)
+                current = LineRange(source=source, service=metadata.get("service"),
+                                    start_line=metadata["start_line"], end_line=metadata["end_line"], lines=[],
+                                    distance=hit.get("distance", 0.0), occurrences=_estimated_occurrences(metadata),
+                                    start_timestamp=metadata.get("start_timestamp"), end_timestamp=metadata.get("end_timestamp"))
+                by_line = {}
+            # overlapping windows share line numbers, each line is kept once
+            for i, line in enumerate(_hit_lines(hit)):
+                by_line.setdefault(metadata["start_line"] + i, line)
+        if current is not None:
+            current["lines"] = sorted(by_line.items())
+            ranges.append(current)
+
+    ranges.sort(key=lambda r: r["distance"])
+    return ranges
+
+def _collapse_repeats(lines : List[Tuple[Optional[int], str]]) -> List[Tuple[Optional[int], str, int]]:
+    """
+    Collapses runs of consecutive lines with the same template (heartbeats, retries...) into their
+    first line and a repeat count. Returns (line number, text, repeats)
+    """
+    collapsed : List[Tuple[Optional[int], str, int]] = []
+    previous = None
+    for number, text in lines:
+        if not text.strip():
+            continue
+        template = template_of(text)
+        if collapsed and template == previous:
+            first_number, first_text, repeats = collapsed[-1]
+            collapsed[-1] = (first_number, first_text, repeats + 1)
+        else:
+            collapsed.append((number, text, 1))
+        previous = template
+    return collapsed
+
+def _line_score(text : str, query_words : Set[str]) -> float:
+    """
+    Lexical fallback when no line_distances is given: share of the query's words in the line,
+    plus a little for error lines
+    """
+    words = _words(text)
+    score = len(words & query_words) / len(query_words) if query_words else 0.0
+    if any(word in text.lower() for word in _ERROR_WORDS):
+        score += 0.1
+    return score
+
+def _format_line(number : Optional[int], text : str, repeats : int, highlighted : bool) -> str:
+    prefix = ">> " if highlighted else "   "
+    location = f"{number + 1}: " if number is not None else ""
+    suffix = f"  (x{repeats} similar lines)" if repeats > 1 else ""
+    return f"{prefix}{location}{text}{suffix}"
+
+def _format_header(r : LineRange) -> str:
+    parts = [r["source"] or "unknown source"]
+    if r["start_line"] is not None:
+        parts.append(f"lines {r['start_line'] + 1}-{r['end_line'] + 1}")
+    if r["service"]:
+        parts.append(f"service={r['service']}")
+    if r["start_timestamp"] is not None:
+        parts.append(f"{r['start_timestamp']} .. {r['end_timestamp']}")
+    if r["occurrences"] > 1:
+        parts.append(f"pattern seen {r['occurrences']}x")
+    parts.append(f"distance={r['distance']:.3f}")
+    return "## " + ", ".join(parts)
+
+def pack_results(query : str, hits : List[Dict], token_budget : int = 2000, highlights : int = 5,
+                 line_distances : Optional[Callable[[List[str]], Sequence[float]]] = None) -> str:
+    """
+    Packs vector search hits into a compact text block for the LLM:
+    overlapping / adjacent hits are merged into line ranges, repeated lines collapsed,
+    the lines most similar to the query marked with '>>', and the output cut to token_budget
+    (ranges are kept in relevance order, ranges that do not fit are cut to their highlighted
+    lines with some context or omitted, with a note of what was left out).
+    Args:
+        query : the query text, used to pick the highlighted lines
+        hits : results of VectorPipeline.query
+        token_budget : approximate maximum size of the output in tokens
+        highlights : number of highlighted lines per range
+        line_distances : embedding distance of each line to the query (e.g. LineReranker.distances),
+                         the closest lines are highlighted; without it lines are scored by the query's words
+    """
+    if not hits:
+        return "No matching logs found."
+
+    query_words = _words(query)
+    sections : List[str] = []
+    used = 0
+    omitted_ranges = 0
+    omitted_lines = 0
+    seen_lines : Set[str] = set()
+
+    for r in merge_hits(hits):
+        # lines already shown in a previous range (e.g. the same text stored for two sources) are dropped
+        lines = [(number, text, repeats) for number, text, repeats in _collapse_repeats(r["lines"])
+                 if text not in seen_lines]
+        if not lines:
+            continue
+        if line_distances is not None:
+            distances = line_distances([text for _, text, _ in lines])
+            ranked = sorted(range(len(lines)), key=lambda i: distances[i])
+            top = set(ranked[:highlights])
+        else:
+            scores = [_line_score(text, query_words) for _, text, _ in lines]
+            ranked = sorted(range(len(lines)), key=lambda i: scores[i], reverse=True)
+            top = {i for i in ranked[:highlights] if scores[i] > 0}
+
+        header = _format_header(r)
+        formatted = [_format_line(number, text, repeats, i in top) for i, (number, text, repeats) in enumerate(lines)]
+        section = "\n".join([header] + formatted)
+        cost = estimate_tokens(section)
+
+        if used + cost > token_budget:
+            # keep the highlighted lines with a little context, in file order
+            keep = sorted({j for i in (top or set(ranked[:highlights]))
+                           for j in range(max(0, i - CONTEXT_LINES), min(len(lines), i + CONTEXT_LINES + 1))})
+            trimmed = [header]
+            previous = -1
+            for j in keep:
+                if j > previous + 1:
+                    trimmed.append("   ...")
+                trimmed.append(formatted[j])
+                previous = j
+            if previous < len(lines) - 1:
+                trimmed.append("   ...")
+            section = "\n".join(trimmed)
+            cost = estimate_tokens(section)
+            if used + cost > token_budget:
+                omitted_ranges += 1
+                omitted_lines += sum(repeats for _, _, repeats in lines)
+                continue
+            omitted_lines += sum(lines[j][2] for j in range(len(lines)) if j not in keep)
+
+        sections.append(section)
+        seen_lines.update(text for _, text, _ in lines)
+        used += cost
+
+    if omitted_ranges or omitted_lines:
+        note = f"[{omitted_lines} lines"
+        if omitted_ranges:
+            note += f" and {omitted_ranges} whole ranges"
+        note += f" omitted to fit the {token_budget} token budget; narrow the query, time range or service to see them]"
+        sections.append(note)
+    return "\n\n".join(sections) if sections else "No matching logs fit the token budget."
+
+def pack_lines(hits : List[Dict], token_budget : int = 2000) -> str:
+    """
+    Packs line hits of VectorPipeline.query_lines: the hit lines of a file whose contexts overlap or
+    touch are shown as one block, hit lines marked with '>>'. Blocks are kept in relevance order
+    until token_budget, the rest is counted in a note.
+    Args:
+        hits : results of VectorPipeline.query_lines
+        token_budget : approximate maximum size of the output in tokens
+    """
+    if not hits:
+        return "No matching logs found."
+
+    # hits of the same file are merged into ranges by their context, hits without line numbers stay alone
+    ranges : List[LineRange] = []
+    marked : List[Set] = []
+    for hit in hits:
+        numbers = [number for number, _ in hit["context"] if number is not None]
+        r = None
+        if hit["line"] is not None:
+            r = next((r for r in ranges if r["source"] == hit["source"] and r["start_line"] is not None
+                      and min(numbers) <= r["end_line"] + 1 and max(numbers) >= r["start_line"] - 1), None)
+        if r is None:
+            ranges.append(LineRange(source=hit["source"], service=hit["service"],
+                                    start_line=min(numbers) if numbers else None, end_line=max(numbers) if numbers else None,
+                                    lines=list(hit["context"]), distance=hit["distance"], occurrences=1,
+                                    start_timestamp=None, end_timestamp=None))
+            marked.append({hit["line"]} if hit["line"] is not None else {hit["text"]})
+        else:
+            r["lines"] = sorted(dict(r["lines"] + list(hit["context"])).items())
+            r["start_line"], r["end_line"] = r["lines"][0][0], r["lines"][-1][0]
+            marked[ranges.index(r)].add(hit["line"])
+
+    sections : List[str] = []
+    used = 0
+    omitted = 0
+    for i in sorted(range(len(ranges)), key=lambda i: ranges[i]["distance"]):
+        r = ranges[i]
+        formatted = [_format_header(r)] + [_format_line(number, text, 1, (text if number is None else number) in marked[i])
+                                           for number, text in r["lines"]]
+        section = "\n".join(formatted)
+        cost = estimate_tokens(section)
+        if used + cost > token_budget:
+            omitted += len(marked[i])
+            continue
+        sections.append(section)
+        used += cost
+
+    if omitted:
+        sections.append(f"[{omitted} matching lines omitted to fit the {token_budget} token budget; "
+                        "narrow the query, time range or service to see them]")
+    return "\n\n".join(sections) if sections else "No matching logs fit the token budget."
+
+__all__ = ['pack_results', 'pack_lines', 'merge_hits', 'estimate_tokens']
@@ -0,0 +1,208 @@
+from collections import deque
+from typing_extensions import Any, Deque, Dict, List, Optional, Sequence, Tuple
+import asyncio
+import time
+
+# rolling window of calls kept per backend
+STATS_WINDOW = 50
+# a backend with at least this error rate over the window is tried after the healthy ones
+MAX_ERROR_RATE = 0.5
+
+class ModelRoutingError(Exception):
+    """Raised when no backend produced a response before the deadline"""
+
+def is_rate_limit(error : BaseException) -> bool:
+    """
+    429 / quota errors of the OpenAI, OpenRouter and Google clients
+    """
+    if getattr(error, "status_code", None) == 429 or getattr(getattr(error, "response", None), "status_code", None) == 429:
+        return True
+    name = type(error).__name__
+    return "RateLimit" in name or "ResourceExhausted" in name or "429" in str(error)[:200]
+
+def _retry_after(error : BaseException) -> Optional[float]:
+    headers = getattr(getattr(error, "response", None), "headers", None) or {}
+    try:
+        return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+class BackendStats:
+    """
+    Rolling latency / error statistics and rate limit cooldown of one backend
+    """
+    def __init__(self) -> None:
+        self.calls : Deque[Tuple[float, bool]] = deque(maxlen=STATS_WINDOW)
+        self.cooldown_until = 0.0
+        self.rate_limited = 0
+
+    def record(self, latency : float, ok : bool):
+        self.calls.append((latency, ok))
+        if ok:
+            self.rate_limited = 0
+
+    def record_rate_limit(self, error : BaseException):
+        self.rate_limited += 1
+        delay = _retry_after(error) or min(60.0, 2.0 ** self.rate_limited)
+        self.cooldown_until = time.monotonic() + delay
+        self.calls.append((0.0, False))
+
+    @property
+    def cooling_down(self) -> bool:
+        return time.monotonic() < self.cooldown_until
+
+    @property
+    def error_rate(self) -> float:
+        return sum(not ok for _, ok in self.calls) / len(self.calls) if self.calls else 0.0
+
+    def percentile(self, q : float) -> Optional[float]:
+        latencies = sorted(latency for latency, ok in self.calls if ok)
+        if not latencies:
+            return None
+        return latencies[min(len(latencies) - 1, int(q * len(latencies)))]
+
+    def summary(self) -> Dict[str, Any]:
+        p50, p90 = self.percentile(0.5), self.percentile(0.9)
+        return {
+            "calls": len(self.calls),
+            "error_rate": round(self.error_rate, 3),
+            "p50_s": round(p50, 3) if p50 is not None else None,
+            "p90_s": round(p90, 3) if p90 is not None else None,
+            "cooldown_s": round(max(0.0, self.cooldown_until - time.monotonic()), 1),
+        }
+
+class RoutedChatModel:
+    """
+    Routes chat calls over a prioritized list of chat models:
+        - backends rate limited (cooling down) or failing often are moved behind the healthy ones
+        - a call has a deadline; when the first backend has not answered after the hedge delay a
+          duplicate request goes to the next backend (the same one if there is only one), the first
+          answer wins and the others are cancelled
+        - a failed attempt immediately fails over to the next backend
+        - the hedge delay follows the backend's rolling p90 latency once it has stats
+    Works with any langchain chat model, fake ones included.
+    """
+    def __init__(self, backends : Sequence[Tuple[str, Any]], deadline : float = 60.0, hedge_delay : Optional[float] = None,
+                 hedge : bool = True, min_hedge_delay : float = 1.0, stats : Optional[Dict[str, BackendStats]] = None) -> None:
+        """
+        Args:
+            backends : (name, chat model) in priority order
+            deadline : seconds one call may take over all attempts
+            hedge_delay : fixed seconds before the hedged request, default the backend's p90 (or deadline / 4 without stats)
+            hedge : send hedged requests at all
+            min_hedge_delay : lower bound of the hedge delay
+            stats : shared statistics (bind_tools copies share them with the original)
+        """
+        if not backends:
+            raise ValueError("RoutedChatModel needs at least one backend")
+        self.backends = list(backends)
+        self.deadline = deadline
+        self.hedge_delay = hedge_delay
+        self.hedge = hedge
+        self.min_hedge_delay = min_hedge_delay
+        self._stats = stats if stats is not None else {name: BackendStats() for name, _ in self.backends}
+
+    def bind_tools(self, tools, **kwargs) -> "RoutedChatModel":
+        return RoutedChatModel([(name, model.bind_tools(tools, **kwargs)) for name, model in self.backends],
+                               deadline=self.deadline, hedge_delay=self.hedge_delay, hedge=self.hedge,
+                               min_hedge_delay=self.min_hedge_delay, stats=self._stats)
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        return {name: self._stats[name].summary() for name, _ in self.backends}
+
+    def _route(self) -> List[Tuple[str, Any]]:
+        def rank(item):
+            index, (name, _) = item
+            stats = self._stats[name]
+            return (stats.cooling_down, stats.error_rate >= MAX_ERROR_RATE and len(stats.calls) >= 5, index)
+        return [backend for _, backend in sorted(enumerate(self.backends), key=rank)]
+
+    def _hedge_delay(self, name : str) -> float:
+        if self.hedge_delay is not None:
+            return self.hedge_delay
+        p90 = self._stats[name].percentile(0.9)
+        return max(self.min_hedge_delay, p90 if p90 is not None else self.deadline / 4)
+
+    async def _attempt(self, name : str, model, messages, kwargs):
+        started = time.monotonic()
+        try:
+            response = await model.ainvoke(messages, **kwargs)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            if is_rate_limit(e):
+                self._stats[name].record_rate_limit(e)
+            else:
+                self._stats[name].record(time.monotonic() - started, False)
+            raise
+        self._stats[name].record(time.monotonic() - started, True)
+        return response
+
+    async def ainvoke(self, messages, **kwargs):
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.deadline
+        order = self._route()
+        attempts = order if len(order) > 1 else order * 2
+        next_attempt = 0
+        pending : Dict[asyncio.Task, str] = {}
+        errors : List[str] = []
+        hedged = False
+        hedge_at = None
+
+        def launch():
+            nonlocal next_attempt, hedge_at
+            name, model = attempts[next_attempt]
+            next_attempt += 1
+            pending[asyncio.ensure_future(self._attempt(name, model, messages, kwargs))] = name
+            hedge_at = loop.time() + self._hedge_delay(name)
+
+        launch()
+        try:
+            while pending:
+                now = loop.time()
+                if now >= deadline:
+                    break
+                can_hedge = self.hedge and not hedged and next_attempt < len(attempts)
+                timeout = min(deadline, hedge_at) - now if can_hedge else deadline - now
+                done, _ = await asyncio.wait(pending, timeout=max(0.0, timeout), return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    if can_hedge and loop.time() >= hedge_at:
+                        print(f"[Router] {', '.join(pending.values())} slow, hedging with {attempts[next_attempt][0]}")
+                        hedged = True
+                        launch()
+                    continue
+                for task in done:
+                    name = pending.pop(task)
+                    if task.exception() is None:
+                        return task.result()
+                    errors.append(f"{name}: {type(task.exception()).__name__}: {task.exception()}")
+                    print(f"[Router] {errors[-1]}")
+                    if next_attempt < len(attempts):
+                        launch()
+        finally:
+            for task in pending:
+                task.cancel()
+        reason = "; ".join(errors) if errors else f"no response within {self.deadline:g}s"
+        raise ModelRoutingError(f"All model backends failed: {reason}")
+
+    def invoke(self, messages, **kwargs):
+        """
+        Blocking variant: plain failover in routing order, no hedging
+        """
+        errors = []
+        for name, model in self._route():
+            started = time.monotonic()
+            try:
+                response = model.invoke(messages, **kwargs)
+            except Exception as e:
+                if is_rate_limit(e):
+                    self._stats[name].record_rate_limit(e)
+                else:
+                    self._stats[name].record(time.monotonic() - started, False)
+                errors.append(f"{name}: {type(e).__name__}: {e}")
+                continue
+            self._stats[name].record(time.monotonic() - started, True)
+            return response
+        raise ModelRoutingError(f"All model backends failed: {'; '.join(errors)}")
+
+__all__ = ['RoutedChatModel', 'BackendStats', 'ModelRoutingError', 'is_rate_limit']
@@ -9,6 +9,8 @@ class AgentState(MessagesState):
     log_start : Optional[str]
     total_calls : int
     execution_count : int
+    # digest of the turns dropped from messages by the conversation window
+    summary : Optional[str]
 
 class AgentInputSchema(MessagesState):
     log_list : List[str]
@@ -1,22 +1,70 @@
-from langchain_mcp_adapters.client import MultiServerMCPClient
-from app.core.embedding.pipeline import VectorPipeline
-from app.core.embedding.indexer import PersistentFaissIndexer, InMemoryIndexer
+from app.core.embedding.pipeline import VectorPipeline, open_pipeline
+from app.core.embedding.sources import resolve_log_files
+from app.core.embedding.live import LogTailer
+from app.core.service.client import RemotePipeline, ServiceUnavailable
+from app.core.embedding.sources import is_gzip
+from app.core.embedding.rerank import LineReranker
+from app.core.agent.result_packer import pack_results, pack_lines
+from app.core.agent.mcp_session import PersistentMCPSession
+from app.core.analytics.engine import LogQueryEngine
+from app.core.analytics.spec import LogQuerySpec
 from langchain.tools import tool
+from datetime import datetime, timedelta
+import json
 import os
 
 from typing_extensions import Optional
 
+# approximate token budget of one query_tool result, QUERY_TOKEN_BUDGET=0 returns the raw hits
+DEFAULT_TOKEN_BUDGET = 2000
+# lines returned by the line level query_tool search, QUERY_LINES=0 returns whole chunks
+DEFAULT_QUERY_LINES = 10
+# most raw lines one log_range_tool call returns, TIME_RANGE_MAX_LINES overrides it
+DEFAULT_RANGE_LINES = 200
+
 class ToolMaker:
-    def __init__(self, db_type : str, log_file_path : Optional[str] = None, faiss_path : Optional[str] = None, store_path : Optional[str] = None) -> None:
+    def __init__(self, db_type : str, log_file_path : Optional[str] = None, faiss_path : Optional[str] = None, store_path : Optional[str] = None,
+                 token_budget : Optional[int] = None, mcp_session : Optional[PersistentMCPSession] = None) -> None:
         self._db_type = db_type
+        if token_budget is None:
+            token_budget = int(os.getenv('QUERY_TOKEN_BUDGET', DEFAULT_TOKEN_BUDGET))
+        self.token_budget = token_budget
+        self.query_lines = int(os.getenv('QUERY_LINES', DEFAULT_QUERY_LINES))
+        self.range_lines = int(os.getenv('TIME_RANGE_MAX_LINES', DEFAULT_RANGE_LINES))
         self.pipe = self._init_pipeline(log_file_path=log_file_path, faiss_path=faiss_path, store_path=store_path)
-        self.mcp_client = MultiServerMCPClient({
-                "python_analyzer_service" : {
-                    "transport" : "stdio",
-                    "command" : "C:\\Machine Learning\\log-analyzer\\mcp\\.venv\\Scripts\\python.exe",
-                    "args" : ["C:\\Machine Learning\\log-analyzer\\mcp\\main.py"]
-                }
-            })
+        # long-lived session to the analyzer server, pass one started early to keep the spawn off the critical path
+        self.mcp_session = mcp_session or PersistentMCPSession.from_env()
+        self.tailers : list[LogTailer] = []
+        # scores the lines of whole chunk results against the query, a served index gets its own line cache here
+        self._highlighter = getattr(self.pipe, "reranker", None) or LineReranker(self.pipe.embedder)
+
+    def start_live_tail(self, log_file_path : str, poll_interval : Optional[float] = None) -> list:
+        """
+        Follows the plain log files of log_file_path in the background, new lines become searchable
+        within about poll_interval seconds (default LIVE_TAIL_INTERVAL or 1)
+        """
+        if isinstance(self.pipe, RemotePipeline):
+            # the service tails the files once for every client
+            return self.pipe.start_tail(log_file_path)
+        if poll_interval is None:
+            poll_interval = float(os.getenv('LIVE_TAIL_INTERVAL', 1.0))
+        for path in resolve_log_files(log_file_path):
+            if not is_gzip(path):
+                self.tailers.append(LogTailer(self.pipe, path, poll_interval=poll_interval).start())
+        return self.tailers
+
+    def stop_live_tail(self):
+        for tailer in self.tailers:
+            tailer.stop()
+        self.tailers = []
+
+    def close(self):
+        """
+        Stops the tailers and the local pipeline's background compactor (a served index is closed by the service)
+        """
+        self.stop_live_tail()
+        if not isinstance(self.pipe, RemotePipeline):
+            self.pipe.close()
     
     async def __call__(self):
         """
@@ -25,48 +73,141 @@ class ToolMaker:
             A tuple containing list of tools and tool_dict
         """
         query_tool = self._get_vector_tool()
+        stats_tool = self._get_stats_tool()
+        analytics_tool = self._get_analytics_tool()
+        range_tool = self._get_range_tool()
         mcp_tools = await self._get_mcp_tools()
 
-        tools = [query_tool] + mcp_tools
+        tools = [query_tool, stats_tool, analytics_tool, range_tool] + mcp_tools
         tool_dict = {tool.name : tool for tool in tools}
         return tools, tool_dict
         
     async def _get_mcp_tools(self):
-        return await self.mcp_client.get_tools()
+        return await self.mcp_session.get_tools()
     
     def _get_vector_tool(self):
         @tool
-        def query_tool(text : str, k : int = 3):
+        def query_tool(text : str, k : int = 3, start_time : Optional[str] = None, end_time : Optional[str] = None,
+                       service : Optional[str] = None, whole_chunks : bool = False):
             """
                 Query the the vector Database
                 Args:
                     text : the query text to perform search
-                    k : number of documents to retrieve (default - 3)
+                    k : number of log lines to return, at least QUERY_LINES (10 unless configured), so max(QUERY_LINES, k);
+                        with whole_chunks (or QUERY_LINES=0) the number of log windows (default - 3)
+                    start_time : optional ISO timestamp (e.g. 2025-10-05 14:00:00), only logs after it
+                    end_time : optional ISO timestamp, only logs before it
+                    service : optional service name (log file name without extension, e.g. 'billing'), only its logs
+                    whole_chunks : return whole matching log windows instead of the most relevant lines
                 Returns:
-                    A list of similar documents
+                    The log lines closest to the query marked with '>>' with a few lines of context
+                    (whole_chunks: the matching log line ranges, overlapping results merged)
             """
-            return self.pipe.query(text, k)
+            start = datetime.fromisoformat(start_time) if start_time else None
+            end = datetime.fromisoformat(end_time) if end_time else None
+            if self.query_lines and not whole_chunks:
+                lines = self.pipe.query_lines(text, max(self.query_lines, k), start=start, end=end, service=service)
+                return pack_lines(lines, token_budget=self.token_budget) if self.token_budget else lines
+            hits = self.pipe.query(text, k, start=start, end=end, service=service)
+            if not self.token_budget:
+                return hits
+            query_embedding = self.pipe.embedder.embed(text)
+            return pack_results(text, hits, token_budget=self.token_budget,
+                                line_distances=lambda lines: self._highlighter.distances(query_embedding, lines))
         return query_tool
 
-    def _init_pipeline(self, **kwargs):
-        pipe : Optional[VectorPipeline]= None
-        if self._db_type == 'memory':
-            log_file_path = kwargs.get('log_file_path',None)
-            if not log_file_path  or not os.path.exists(log_file_path):
-                raise FileExistsError('log_file_path does not exists')
-            pipe = VectorPipeline(InMemoryIndexer)
-            pipe.create_db(log_file_path)
-        else:
-            log_file_path = kwargs.get('log_file_path')
-            faiss_path = kwargs.get('faiss_path')
-            store_path = kwargs.get('store_path')
-            if not faiss_path:
-                raise ValueError('Provide faiss_path for persistent indexer')
-            if not store_path:
-                raise ValueError('Provide store_path for persistent indexer')
+    def _get_stats_tool(self):
+        @tool
+        def log_stats_tool(start_time : Optional[str] = None, end_time : Optional[str] = None, service : Optional[str] = None,
+                           level : Optional[str] = None, bucket : str = 'hour', top : int = 5):
+            """
+                Counts log lines from rollups precomputed at ingest (per minute, per file), answers in milliseconds.
+                Use it for counts, rates, histograms and most frequent messages instead of the python analyzer.
+                Args:
+                    start_time : optional ISO timestamp (e.g. 2025-10-05 14:00:00), only lines after it (minute precision)
+                    end_time : optional ISO timestamp, only lines before it
+                    service : optional service name (log file name without extension), only its lines
+                    level : optional log level (ERROR, WARNING, INFO, DEBUG, CRITICAL), only lines of that level
+                    bucket : width of the returned time series, 'minute', 'hour' or 'day' (default - hour)
+                    top : number of most frequent message templates to return (default - 5)
+                Returns:
+                    total and error line counts, counts by level and service, lines per minute,
+                    the count series per bucket and the top message templates (variables masked)
+            """
+            start = datetime.fromisoformat(start_time) if start_time else None
+            end = datetime.fromisoformat(end_time) if end_time else None
+            return self.pipe.rollups.query(start=start, end=end, service=service, level=level, bucket=bucket, top=top)
+        return log_stats_tool
+
+    def _get_analytics_tool(self):
+        engine = self.pipe.query_engine if isinstance(self.pipe, RemotePipeline) else LogQueryEngine(self.pipe.columns)
 
-            pipe = VectorPipeline(PersistentFaissIndexer)
-            if log_file_path:
-                pipe.create_db(log_file_path)
-            pipe.load(faiss_path, store_path)
-        return pipe
+        @tool(args_schema=LogQuerySpec)
+        def log_query_tool(**spec):
+            """
+                Filters, groups and counts every parsed log line in-process (milliseconds, exact results).
+                Columns: level, service, source (file path), template (message with timestamps / ids / numbers
+                masked), is_error, plus the line timestamp for start_time / end_time and bucket.
+                Use it for filter / group-by / count / top-k questions and to fetch example lines (sample_rows).
+                Returns:
+                    matched_rows, groups (keys, count, first_seen, last_seen), groups_total and samples
+            """
+            try:
+                return engine.run(LogQuerySpec(**spec))
+            except ValueError as e:
+                return f"Invalid query: {e}"
+        return log_query_tool
+
+    def _get_range_tool(self):
+        @tool
+        def log_range_tool(start_time : Optional[str] = None, end_time : Optional[str] = None, around : Optional[str] = None,
+                           seconds : float = 30, service : Optional[str] = None, max_lines : Optional[int] = None,
+                           cursor : Optional[str] = None):
+            """
+                Reads the raw log lines of a time range, in time order, straight from the log files.
+                A sparse time index finds where the range starts, so it is fast even on very large logs.
+                Args:
+                    start_time : ISO timestamp (e.g. 2025-10-05 14:00:00), first moment of the range
+                    end_time : ISO timestamp, last moment of the range
+                    around : ISO timestamp, reads `seconds` before and after it instead of start_time / end_time
+                    seconds : half width of the range around `around` (default - 30)
+                    service : optional service name (log file name without extension), only its lines
+                    max_lines : lines returned at most (default and maximum - the configured cap)
+                    cursor : the cursor from the note of a truncated result, with the same range and service,
+                             returns the next lines
+                Returns:
+                    The lines as 'file:line text', with a note and a cursor when the range holds more lines than returned
+            """
+            if around:
+                center = datetime.fromisoformat(around)
+                start, end = center - timedelta(seconds=seconds), center + timedelta(seconds=seconds)
+            else:
+                start = datetime.fromisoformat(start_time) if start_time else None
+                end = datetime.fromisoformat(end_time) if end_time else None
+            if start is None and end is None:
+                return "Give start_time / end_time or around, the whole log is too large to return"
+            limit = min(max_lines or self.range_lines, self.range_lines)
+            try:
+                position = json.loads(cursor) if cursor else None
+            except ValueError:
+                return "Invalid cursor, pass the cursor of the previous result unchanged"
+            result = self.pipe.read_range(start=start, end=end, service=service, max_lines=limit, cursor=position)
+            lines = [f"{line['source']}:{line['line']} {line['text']}" for line in result["lines"]]
+            if not lines:
+                return "No log lines in this time range"
+            if result["truncated"]:
+                # a cursor and not the last timestamp: more than `limit` lines can share one timestamp
+                lines.append(f"... [more lines in the range, only {limit} returned. Narrow the range, or call again with the "
+                             f"same range and cursor='{json.dumps(result['cursor'], separators=(',', ':'))}']")
+            return "\n".join(lines)
+        return log_range_tool
+
+    def _init_pipeline(self, **kwargs):
+        url = os.getenv('INDEX_SERVICE_URL')
+        if url:
+            # the shared service owns the embedder and index, this process only holds a client
+            try:
+                return RemotePipeline.connect(url, self._db_type, **kwargs)
+            except (ServiceUnavailable, PermissionError) as e:
+                print(f"[ToolMaker] Index service unavailable ({e}), building a local index")
+        return open_pipeline(self._db_type, **kwargs)
@@ -0,0 +1,125 @@
+from datetime import datetime
+from typing_extensions import Any, Dict, List
+import time
+
+import numpy as np
+
+from app.core.embedding.columns import LogColumns, MISSING_TIME, from_millis, to_millis
+from .spec import Filter, LogQuerySpec
+
+BUCKET_MILLIS = {
+    "minute": 60_000,
+    "hour": 3_600_000,
+    "day": 86_400_000,
+}
+
+class LogQueryEngine:
+    """
+    Runs LogQuerySpecs over a LogColumns table with vectorized NumPy operations:
+    filters become boolean masks, groups are found with np.unique over the key columns.
+    Results are deterministic (ties ordered by key), no log text is read except sample rows.
+    """
+    def __init__(self, columns: LogColumns) -> None:
+        self.columns = columns
+
+    def _codes_matching(self, f: Filter) -> np.ndarray:
+        """Codes of a string column's vocabulary matching the filter"""
+        vocabulary = self.columns.vocabulary(f.field)
+        values = f.value if isinstance(f.value, list) else [f.value]
+        values = [str(value) for value in values]
+        if f.field == "level":
+            values = [value.upper() for value in values]
+        if f.op == "contains":
+            needles = [value.lower() for value in values]
+            codes = [code for code, entry in enumerate(vocabulary) if any(needle in entry.lower() for needle in needles)]
+        else:
+            wanted = set(values)
+            codes = [code for code, entry in enumerate(vocabulary) if entry in wanted]
+        return np.array(codes, dtype=np.int64)
+
+    def _mask(self, columns: Dict[str, np.ndarray], spec: LogQuerySpec) -> np.ndarray:
+        timestamps = columns["timestamp"]
+        mask = np.ones(len(timestamps), dtype=bool)
+        if spec.start_time:
+            mask &= timestamps >= to_millis(datetime.fromisoformat(spec.start_time))
+        if spec.end_time:
+            mask &= (timestamps < to_millis(datetime.fromisoformat(spec.end_time))) & (timestamps != MISSING_TIME)
+        for f in spec.filters:
+            if f.field == "is_error":
+                if isinstance(f.value, list) or f.op not in ("eq", "ne"):
+                    raise ValueError("is_error only supports 'eq' / 'ne' with true or false")
+                value = f.value if isinstance(f.value, bool) else str(f.value).lower() == "true"
+                matched = columns["is_error"] == value
+                mask &= matched if f.op == "eq" else ~matched
+                continue
+            if f.op in ("in", "not_in") and not isinstance(f.value, list):
+                raise ValueError(f"'{f.op}' needs a list value")
+            matched = np.isin(columns[f.field], self._codes_matching(f))
+            mask &= ~matched if f.op in ("ne", "not_in") else matched
+        return mask
+
+    def _decode(self, field: str, code: int) -> Any:
+        if field == "is_error":
+            return bool(code)
+        if field == "bucket":
+            return None if code == MISSING_TIME else from_millis(code).isoformat(sep=" ")
+        return self.columns.vocabulary(field)[code] or None
+
+    def run(self, spec: LogQuerySpec) -> Dict[str, Any]:
+        """
+        Returns:
+            matched_rows, the groups with their count and first / last seen timestamps
+            (at most top_k, groups_total tells how many there were) and sample rows
+        """
+        started = time.perf_counter()
+        columns = self.columns.columns()
+        rows = np.flatnonzero(self._mask(columns, spec))
+        timestamps = columns["timestamp"][rows]
+
+        fields: List[str] = list(dict.fromkeys(spec.group_by))
+        keys = [columns[field][rows].astype(np.int64) for field in fields]
+        if spec.bucket:
+            width = BUCKET_MILLIS[spec.bucket]
+            keys.append(np.where(timestamps == MISSING_TIME, MISSING_TIME, (timestamps // width) * width))
+            fields.append("bucket")
+
+        groups: List[Dict[str, Any]] = []
+        groups_total = 0
+        if len(rows):
+            if keys:
+                unique, inverse, counts = np.unique(np.stack(keys, axis=1), axis=0, return_inverse=True, return_counts=True)
+                inverse = inverse.reshape(-1)
+            else:
+                unique, inverse, counts = np.empty((1, 0), dtype=np.int64), np.zeros(len(rows), dtype=np.int64), np.array([len(rows)])
+            # first / last timestamp per group: sort rows by group, reduce each run
+            order = np.argsort(inverse, kind="stable")
+            starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+            dated = timestamps[order]
+            first = np.minimum.reduceat(np.where(dated == MISSING_TIME, np.iinfo(np.int64).max, dated), starts)
+            last = np.maximum.reduceat(dated, starts)
+
+            if fields == ["bucket"]:
+                ranking = np.arange(len(counts))
+            else:
+                # largest counts first, np.unique already sorted the keys for ties
+                ranking = np.argsort(-counts, kind="stable")
+            groups_total = len(counts)
+            for g in ranking[:spec.top_k]:
+                group = {field: self._decode(field, int(unique[g][i])) for i, field in enumerate(fields)}
+                group["count"] = int(counts[g])
+                group["first_seen"] = None if first[g] == np.iinfo(np.int64).max else from_millis(int(first[g])).isoformat(sep=" ")
+                group["last_seen"] = None if last[g] == MISSING_TIME else from_millis(int(last[g])).isoformat(sep=" ")
+                groups.append(group)
+
+        result: Dict[str, Any] = {
+            "matched_rows": int(len(rows)),
+            "groups_total": groups_total,
+            "groups": groups,
+        }
+        if spec.sample_rows and len(rows):
+            sample = rows[np.argsort(timestamps, kind="stable")[:spec.sample_rows]]
+            result["samples"] = self.columns.read_rows(sample)
+        result["elapsed_ms"] = round((time.perf_counter() - started) * 1000, 3)
+        return result
+
+__all__ = ['LogQueryEngine', 'BUCKET_MILLIS']
@@ -0,0 +1,26 @@
+from pydantic import BaseModel, Field
+from typing_extensions import List, Literal, Optional, Union
+
+Column = Literal["level", "service", "source", "template", "is_error"]
+
+class Filter(BaseModel):
+    """
+    One row condition, all filters of a query must hold
+    """
+    field: Column = Field(description="Column to test. 'template' is the log message with timestamps, ids and numbers masked (e.g. '<TS> [ERROR] api: Failed to connect to <IP> after <N> retries')")
+    op: Literal["eq", "ne", "in", "not_in", "contains"] = Field("eq", description="'contains' is a case-insensitive substring match, 'in' / 'not_in' take a list")
+    value: Union[bool, str, List[str]] = Field(description="Value(s) to compare with, e.g. 'ERROR', ['ERROR', 'CRITICAL'], 'timeout' or true for is_error")
+
+class LogQuerySpec(BaseModel):
+    """
+    Declarative query over every parsed log line: filter, group and count
+    """
+    start_time: Optional[str] = Field(None, description="Optional ISO timestamp (e.g. 2025-10-05 14:00:00), only lines at or after it")
+    end_time: Optional[str] = Field(None, description="Optional ISO timestamp, only lines before it")
+    filters: List[Filter] = Field(default_factory=list, description="Row conditions, combined with AND")
+    group_by: List[Column] = Field(default_factory=list, description="Columns to count by, e.g. ['service', 'level']. Empty for a single total")
+    bucket: Optional[Literal["minute", "hour", "day"]] = Field(None, description="Also group by time bucket, for rates and histograms")
+    top_k: int = Field(20, ge=1, le=200, description="Groups returned, largest counts first (time order when only grouped by bucket)")
+    sample_rows: int = Field(0, ge=0, le=20, description="Number of matching raw log lines to return as examples")
+
+__all__ = ['Filter', 'LogQuerySpec']
@@ -1,7 +1,10 @@
 import argparse
+import glob
 import os
 import sys
 import asyncio
+import threading
+from datetime import datetime
 from dotenv import load_dotenv
 
 # Rich imports for a clean CLI interface
@@ -9,50 +12,142 @@ from rich.console import Console
 from rich.panel import Panel
 from rich.prompt import Prompt
 
-# LangChain/LangGraph imports
-from langchain_core.messages import HumanMessage
+from typing_extensions import TYPE_CHECKING, Callable, Union
+
+if TYPE_CHECKING:
+    from core.agent.state import AgentInputSchema
 
 # --- Add app root to sys.path ---
 # This allows the script to be run from anywhere and still find core modules
 APP_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
 sys.path.append(APP_ROOT)
 
-try:
+def _import_core():
+    """
+    Imports the agent modules. They pull in langchain, langgraph, faiss and torch,
+    so they are imported on demand instead of before the first prompt.
+    """
     from core.agent.builder import build_workflow
     from core.agent.model_provider import ModelProvider
     from core.agent.tools import ToolMaker
     from core.agent.helpers import create_log_flow
     from core.agent.state import AgentInputSchema
-except ImportError:
-    print("Error: Failed to import core modules. Ensure you are in the correct directory and venv.")
-    print(f"Attempted to add {APP_ROOT} to sys.path")
-    sys.exit(1)
+    from core.agent.memory import open_checkpointer
+    return build_workflow, ModelProvider, ToolMaker, create_log_flow, AgentInputSchema, open_checkpointer
+
+def _load_core():
+    try:
+        return _import_core()
+    except ImportError:
+        print("Error: Failed to import core modules. Ensure you are in the correct directory and venv.")
+        print(f"Attempted to add {APP_ROOT} to sys.path")
+        sys.exit(1)
+
+def _start_background_warmup() -> threading.Thread:
+    """
+    Imports the heavy modules in a daemon thread, so the work overlaps with the interactive setup
+    questions. The embedding model loads in its own thread (embedder.warm_up) while the agent
+    modules are imported.
+    """
+    def _warm():
+        try:
+            if not os.getenv('INDEX_SERVICE_URL'):
+                # with a shared index service the model lives in the service
+                from app.core.embedding.embedder import warm_up
+                warm_up()
+            _import_core()
+        except Exception:
+            # Errors are raised again, with context, when the foreground needs the component
+            pass
+
+    thread = threading.Thread(target=_warm, name="cli-warmup", daemon=True)
+    thread.start()
+    return thread
+
+async def _ask(*args, **kwargs) -> str:
+    """
+    Prompt.ask in a daemon thread, so background tasks on the event loop (the MCP server spawn)
+    keep running while the user types. A daemon thread does not keep the process alive on Ctrl+C.
+    """
+    loop = asyncio.get_running_loop()
+    answer = loop.create_future()
+
+    def _settle(result=None, error=None):
+        if not answer.done():
+            answer.set_exception(error) if error is not None else answer.set_result(result)
+
+    def _prompt():
+        try:
+            result = Prompt.ask(*args, **kwargs)
+        except BaseException as e:
+            loop.call_soon_threadsafe(_settle, None, e)
+        else:
+            loop.call_soon_threadsafe(_settle, result)
+
+    threading.Thread(target=_prompt, name="cli-prompt", daemon=True).start()
+    return await answer
+
+# prefix that skips the answer cache for one question (the fresh answer replaces the cached one)
+BYPASS_CACHE_PREFIX = "/fresh "
 
-async def chat_loop(app, state : AgentInputSchema, console: Console):
+async def chat_loop(app, state : 'AgentInputSchema', console: Console, config : dict,
+                    answer_cache=None, cache_scope : Union[str, Callable[[], str]] = ""):
     """
     Main interactive chat loop.
     Uses Rich for input and output.
+    The conversation lives in the graph's checkpointer under config's thread_id,
+    each turn only sends the new user message.
+    With an answer_cache, questions similar to an earlier one on the same scope are answered from it
+    (cache_scope may be a callable, evaluated for every question).
     """
+    from langchain_core.messages import AIMessage, HumanMessage
+
+    snapshot = await app.aget_state(config)
+    previous = len(snapshot.values.get("messages", [])) if snapshot and snapshot.values else 0
+    if previous:
+        console.print(f"[green]Resumed session with {previous} stored messages.[/green]")
     console.print("\n[bold green]SRE Agent is ready! Type 'exit' or 'quit' to end.[/bold green]")
+    if answer_cache is not None:
+        console.print(f"[dim]Repeated questions are answered from cache, start a question with '{BYPASS_CACHE_PREFIX.strip()}' to skip it.[/dim]")
     while True:
         try:
             # Get user input
-            user_input = Prompt.ask("[bold cyan]You[/bold cyan]")
+            user_input = await _ask("[bold cyan]You[/bold cyan]")
             
             if user_input.lower() in ['exit', 'quit']:
                 console.print("[yellow]Goodbye![/yellow]")
                 break
 
+            bypass = user_input.startswith(BYPASS_CACHE_PREFIX)
+            if bypass:
+                user_input = user_input[len(BYPASS_CACHE_PREFIX):]
+
+            scope = cache_scope() if callable(cache_scope) else cache_scope
+            cached = None
+            if answer_cache is not None and not bypass:
+                cached = answer_cache.lookup(user_input, scope)
+            if cached is not None:
+                entry, similarity = cached
+                # keep the session history complete, as if the agent had answered
+                await app.aupdate_state(config, {"messages": [HumanMessage(content=user_input), AIMessage(content=entry["answer"])]},
+                                        as_node="llm_node")
+                console.print(Panel(entry["answer"], title=f"[bold magenta]SRE Agent[/bold magenta] [dim](cached, similar to: {entry['question'][:60]!r}, {similarity:.2f})[/dim]",
+                                    border_style="magenta"))
+                continue
+
             # Stream the agent's response
             with console.status("[spinner]Thinking...[/spinner]"):
                 # Use ainvoke for the async graph
-                state['messages'].append(HumanMessage(content=user_input))
-                response = await app.ainvoke(state)
+                turn = dict(state, messages=[HumanMessage(content=user_input)])
+                response = await app.ainvoke(turn, config)
                 
                 # The final response is the last message in the state
                 ai_message = response['messages'][-1]
                 content = ai_message.content
 
+            if answer_cache is not None and isinstance(ai_message, AIMessage) and not ai_message.tool_calls and content:
+                answer_cache.put(user_input, scope, str(content))
+
             # Print the AI's response in a formatted panel
             console.print(Panel(content, title="[bold magenta]SRE Agent[/bold magenta]", border_style="magenta"))
 
@@ -72,8 +167,15 @@ async def main():
     """
     Main async function to parse args, set up, and run the CLI app.
     """
-    # Load .env file for API keys
+    # Load .env file for API keys (and the MCP_* settings read below)
     load_dotenv()
+
+    # Start importing agent modules and loading the embedding model right away
+    _start_background_warmup()
+    # and spawn the MCP analyzer server, its session is reused for every question. The module is light
+    # (langchain is imported when the tools are built), the spawn runs while the prompts below wait in a thread
+    from core.agent.mcp_session import PersistentMCPSession
+    mcp_session = PersistentMCPSession.from_env().start()
     
     console = Console()
     console.print("[bold blue]Starting SRE Log Analysis Agent CLI...[/bold blue]")
@@ -97,8 +199,8 @@ async def main():
     # 1. Get Log File
     log_file = ""
     while not log_file:
-        log_file_input = Prompt.ask("[cyan]1.[/cyan] [yellow]Enter path to the log file[/yellow]", default="data/python.log")
-        if not os.path.exists(log_file_input):
+        log_file_input = await _ask("[cyan]1.[/cyan] [yellow]Enter path to the log file, directory or glob (plain or .gz)[/yellow]", default="data/python.log")
+        if not os.path.exists(log_file_input) and not glob.glob(log_file_input, recursive=True):
             console.print(f"[bold red]Error: Log file not found at {log_file_input}[/bold red]")
         else:
             log_file = log_file_input
@@ -106,35 +208,53 @@ async def main():
     # 2. Get Repomix File
     repomix_file = ""
     while not repomix_file:
-        repomix_file_input = Prompt.ask("[cyan]2.[/cyan] [yellow]Enter path to the repomix-output.xml file[/yellow]", default="repomix-output.xml")
+        repomix_file_input = await _ask("[cyan]2.[/cyan] [yellow]Enter path to the repomix-output.xml file[/yellow]", default="repomix-output.xml")
         if not os.path.exists(repomix_file_input):
             console.print(f"[bold red]Error: Repomix file not found at {repomix_file_input}[/bold red]")
         else:
             repomix_file = repomix_file_input
 
     # 3. Get Model Provider
-    provider_name = Prompt.ask("[cyan]3.[/cyan] [yellow]Enter model provider[/yellow]", choices=["openai", "openrouter","googleai"], default="openai")
+    provider_name = await _ask("[cyan]3.[/cyan] [yellow]Enter model provider[/yellow]", choices=["openai", "openrouter","googleai"], default="openai")
 
     # 4. Get Model Name
-    model_name = Prompt.ask("[cyan]4.[/cyan] [yellow]Enter model name[/yellow]", default="gpt-4.1-mini")
+    model_name = await _ask("[cyan]4.[/cyan] [yellow]Enter model name[/yellow]", default="gpt-4.1-mini")
 
     # 5. Get DB Type
-    db_type = Prompt.ask("[cyan]5.[/cyan] [yellow]Select vector DB type[/yellow]", choices=["memory", "persistent"], default="memory")
+    db_type = await _ask("[cyan]5.[/cyan] [yellow]Select vector DB type[/yellow]", choices=["memory", "persistent"], default="memory")
 
     # 6. Conditional DB Paths
     faiss_path = None
     store_path = None
     if db_type == 'persistent':
-        faiss_path = Prompt.ask("  [yellow]Enter path to faiss.index[/yellow]", default="data/faiss.index")
-        store_path = Prompt.ask("  [yellow]Enter path to store.pkl[/yellow]", default="data/store.pkl")
+        faiss_path = await _ask("  [yellow]Enter path to faiss.index[/yellow]", default="data/faiss.index")
+        store_path = await _ask("  [yellow]Enter path to store.pkl[/yellow]", default="data/store.pkl")
         if not os.path.exists(faiss_path) or not os.path.exists(store_path):
              console.print(f"[bold yellow]Warning: faiss/store path not found. Will attempt to load, but may fail if files are missing.[/bold yellow]")
+
+    # Index build / load only needs the answers so far, start it while the remaining questions are asked
+    def _build_tool_maker():
+        ToolMaker = _import_core()[2]
+        return ToolMaker(
+            db_type=db_type,
+            # Only pass log_file_path to ToolMaker if db_type is 'memory' for indexing
+            log_file_path=log_file if db_type == 'memory' else None,
+            faiss_path=faiss_path,
+            store_path=store_path,
+            mcp_session=mcp_session
+        )
+    # run_in_executor submits right away, independent of the event loop
+    tool_maker_future = asyncio.get_running_loop().run_in_executor(None, _build_tool_maker)
     
     # 7. Get Log Start (Optional)
-    log_start = Prompt.ask("[cyan]6.[/cyan] [yellow]Enter log start token (optional, e.g., 'logger', press Enter to skip)[/yellow]", default="")
+    log_start = await _ask("[cyan]6.[/cyan] [yellow]Enter log start token (optional, e.g., 'logger', press Enter to skip)[/yellow]", default="")
     if log_start == "":
         log_start = None
 
+    # 8. Session to resume (stored in AGENT_SESSION_DB)
+    session_id = await _ask("[cyan]7.[/cyan] [yellow]Enter session name to resume (press Enter for a new session)[/yellow]",
+                            default=datetime.now().strftime("session-%Y%m%d-%H%M%S"))
+
     # --- Validations --- (Handled interactively above)
     # if not os.path.exists(args.log_file):
     #     console.print(f"[bold red]Error: Log file not found at {args.log_file}[/bold red]")
@@ -150,23 +270,17 @@ async def main():
     #     if not os.path.exists(args.faiss_path) or not os.path.exists(args.store_path):
     #          console.print(f"[bold yellow]Warning: faiss/store path not found. Will attempt to load, but may fail if files are missing.[/bold yellow]")
 
+    provider = None
+    tool_maker = None
     try:
         # --- Initialization ---
         console.print("\n[yellow]Initializing components...[/yellow]")
+        build_workflow, ModelProvider, _, create_log_flow, AgentInputSchema, open_checkpointer = _load_core()
         
         # 1. Initialize Model Provider
         provider = ModelProvider(provider=provider_name, model_name=model_name)
         provider.build()
         
-        # 2. Initialize Tool Maker
-        tool_maker = ToolMaker(
-            db_type=db_type,
-            # Only pass log_file_path to ToolMaker if db_type is 'memory' for indexing
-            log_file_path=log_file if db_type == 'memory' else None,
-            faiss_path=faiss_path,
-            store_path=store_path
-        )
-
         # 3. Load Repomix Context and extract logs
         console.print(f"[green]Loading repomix context from {repomix_file}...[/green]")
         with open(repomix_file, 'r', encoding='utf-8') as f:
@@ -175,28 +289,57 @@ async def main():
         log_list = create_log_flow(repomix_context, log_start)
         console.print(f"Extracted [bold]{len(log_list)}[/bold] log statements from code context.")
 
+        # 2. Wait for the Tool Maker (vector index) started during setup
+        with console.status("[yellow]Waiting for the vector index...[/yellow]"):
+            tool_maker = await tool_maker_future
+        if os.getenv('LIVE_TAIL', '0') == '1':
+            tailers = tool_maker.start_live_tail(log_file)
+            console.print(f"[green]Live tail: following {len(tailers)} log file(s), new lines are searchable within seconds.[/green]")
+
         # 4. Build Agent Workflow
         console.print("[yellow]Building agent workflow...[/yellow]")
         log_file_abs_path = os.path.abspath(log_file)
+        # the sandbox mounts one file, a directory or glob is indexed whole but analyzed through its newest file
+        from app.core.embedding.sources import analysis_file
+        analyzed_file = os.path.abspath(analysis_file(log_file) or log_file)
+        if analyzed_file != log_file_abs_path:
+            console.print(f"[yellow]The python analyzer reads one file: {analyzed_file} (search covers every file)[/yellow]")
         
         workflow = await build_workflow(
             provider=provider, 
             tool_maker=tool_maker, 
             log_list=log_list, 
-            log_file_path=log_file_abs_path # Pass full absolute path for the agent
+            log_file_path=analyzed_file # Pass full absolute path for the agent
         )
         
-        state = AgentInputSchema(log_list=log_list, log_file_path=log_file_abs_path,messages=[])
-        # 5. Compile the graph
-        app = workflow.compile()
+        state = AgentInputSchema(log_list=log_list, log_file_path=analyzed_file,messages=[])
+        # 5. Compile the graph with a checkpointer, sessions resume from disk without replaying them
+        async with open_checkpointer(os.getenv('AGENT_SESSION_DB', 'data/sessions.sqlite')) as checkpointer:
+            app = workflow.compile(checkpointer=checkpointer)
+
+            # Answers of earlier sessions on the same logs / index are reused for similar questions
+            from core.agent.answer_cache import AnswerCache, cache_scope
+            answer_cache = AnswerCache.from_env(tool_maker.pipe.embedder)
+            # recomputed per question, a live tail changes the indexed data while the session runs
+            scope = (lambda: cache_scope(log_file_abs_path, tool_maker.pipe.fingerprint())) if answer_cache is not None else ""
 
-        # --- Run Chat Loop ---
-        await chat_loop(app, state, console)
+            # --- Run Chat Loop ---
+            console.print(f"[green]Session: {session_id}[/green]")
+            await chat_loop(app, state, console, config={"configurable": {"thread_id": session_id}},
+                            answer_cache=answer_cache, cache_scope=scope)
 
     except Exception as e:
         console.print(f"[bold red]Failed to initialize agent:[/bold red] {e}")
         console.print_exception(show_locals=True)
         sys.exit(1)
+    finally:
+        if tool_maker is not None:
+            tool_maker.close()
+        if provider is not None and hasattr(provider.model, "stats"):
+            console.print(f"[dim]LLM routing: {provider.model.stats()}[/dim]")
+        if mcp_session.metrics():
+            console.print(f"[dim]MCP call latency: {mcp_session.metrics()}[/dim]")
+        await mcp_session.close()
 
 if __name__ == "__main__":
     # Use asyncio.run() to execute the main async function
@@ -0,0 +1,221 @@
+from array import array
+from datetime import datetime, timedelta
+from typing_extensions import Any, Dict, List, Optional
+import os
+import pickle
+import threading
+
+import numpy as np
+
+from .sources import open_log
+from .types import Log
+
+# timestamp column value of lines before the first timestamp of their file
+MISSING_TIME = np.iinfo(np.int64).min
+UNKNOWN_LEVEL = "UNKNOWN"
+
+_EPOCH = datetime(1970, 1, 1)
+
+def to_millis(timestamp: datetime) -> int:
+    """Timestamp column value of a datetime (taken as naive log time): milliseconds since the epoch"""
+    return (timestamp.replace(tzinfo=None) - _EPOCH) // timedelta(milliseconds=1)
+
+def from_millis(value: int) -> Optional[datetime]:
+    if value == MISSING_TIME:
+        return None
+    return _EPOCH + timedelta(milliseconds=int(value))
+
+class _Vocabulary:
+    """Interns strings as int codes"""
+    def __init__(self, values: Optional[List[str]] = None) -> None:
+        self.values: List[str] = list(values or [])
+        self._codes: Dict[str, int] = {value: i for i, value in enumerate(self.values)}
+
+    def code(self, value: str) -> int:
+        code = self._codes.get(value)
+        if code is None:
+            code = self._codes[value] = len(self.values)
+            self.values.append(value)
+        return code
+
+    def rename(self, old: str, new: str):
+        code = self._codes.pop(old, None)
+        if code is not None:
+            self.values[code] = new
+            self._codes[new] = code
+
+class ColumnObserver:
+    """
+    Accumulates one file's parsed lines as rows (see LogChunker.invoke's line_observer).
+    Lines without a timestamp (stack traces, continuation lines) get the timestamp of
+    the last timestamped line before them.
+    """
+    def __init__(self, source: str, service: Optional[str], first_line: int = 0) -> None:
+        self.source = source
+        self.service = service
+        self.timestamps = array("q")
+        self.offsets = array("q")
+        self.line_numbers = array("q")
+        self.levels: List[str] = []
+        self.templates: List[str] = []
+        self.errors = array("b")
+        self._timestamp = MISSING_TIME
+        self._line = first_line
+
+    def next_batch(self) -> "ColumnObserver":
+        """
+        Empty observer continuing this one (line numbers, carried timestamp), for files ingested in batches
+        """
+        observer = ColumnObserver(self.source, self.service, first_line=self._line)
+        observer._timestamp = self._timestamp
+        return observer
+
+    def add(self, log: Log, offset: int, template: str):
+        """
+        Args:
+            log : the parsed line
+            offset : byte offset of the line in its (decompressed) file
+            template : template_of the line's message
+        """
+        line = self._line
+        self._line += 1
+        if not log["message"]:
+            return
+        if log["timestamp"] is not None:
+            self._timestamp = to_millis(log["timestamp"])
+        self.timestamps.append(self._timestamp)
+        self.offsets.append(offset)
+        self.line_numbers.append(line)
+        self.levels.append(log["level"] or UNKNOWN_LEVEL)
+        self.templates.append(template)
+        self.errors.append(log["is_error"])
+
+class LogColumns:
+    """
+    Columnar table of every ingested line, one NumPy array per column:
+    timestamp (ms since epoch), level / service / source / template codes, error flag,
+    byte offset and line number. The text itself stays in the log files, rows are read
+    back by offset. Built during ingest from ColumnObservers, one per file.
+    """
+    COLUMNS = ("timestamp", "level", "service", "source", "template", "is_error", "offset", "line")
+
+    def __init__(self) -> None:
+        self.levels = _Vocabulary()
+        self.services = _Vocabulary()
+        self.sources = _Vocabulary()
+        self.templates = _Vocabulary()
+        self._parts: List[Dict[str, np.ndarray]] = []
+        self._columns: Optional[Dict[str, np.ndarray]] = None
+        self._lock = threading.Lock()
+
+    def observer(self, source: str, service: Optional[str] = None, first_line: int = 0) -> ColumnObserver:
+        return ColumnObserver(source, service, first_line)
+
+    def rename_source(self, old: str, new: str):
+        """
+        Points the rows of a rotated file at its new path (app.log -> app.log.1), new rows of old get a new code
+        """
+        with self._lock:
+            self.sources.rename(old, new)
+
+    def merge(self, observer: ColumnObserver):
+        rows = len(observer.timestamps)
+        with self._lock:
+            part = {
+                "timestamp": np.frombuffer(observer.timestamps, dtype=np.int64).copy(),
+                "level": np.array([self.levels.code(level) for level in observer.levels], dtype=np.int16),
+                "service": np.full(rows, self.services.code(observer.service or ""), dtype=np.int32),
+                "source": np.full(rows, self.sources.code(observer.source), dtype=np.int32),
+                "template": np.array([self.templates.code(template) for template in observer.templates], dtype=np.int32),
+                "is_error": np.frombuffer(observer.errors, dtype=np.int8).astype(bool),
+                "offset": np.frombuffer(observer.offsets, dtype=np.int64).copy(),
+                "line": np.frombuffer(observer.line_numbers, dtype=np.int64).copy(),
+            }
+            self._parts.append(part)
+            self._columns = None
+
+    def columns(self) -> Dict[str, np.ndarray]:
+        """
+        The table's columns, concatenated on first use after a merge
+        """
+        with self._lock:
+            if self._columns is None:
+                if self._parts:
+                    self._columns = {name: np.concatenate([part[name] for part in self._parts]) for name in self.COLUMNS}
+                    self._parts = [self._columns]
+                else:
+                    self._columns = {name: np.empty(0, dtype=np.int64) for name in self.COLUMNS}
+            return self._columns
+
+    def __len__(self) -> int:
+        return len(self.columns()["timestamp"])
+
+    def drop_before(self, cutoff: datetime) -> int:
+        """
+        Drops the rows timestamped before cutoff (rows without any timestamp are kept)
+        Returns:
+            The number of rows dropped
+        """
+        columns = self.columns()
+        with self._lock:
+            keep = (columns["timestamp"] >= to_millis(cutoff)) | (columns["timestamp"] == MISSING_TIME)
+            dropped = int(len(keep) - keep.sum())
+            if dropped:
+                self._columns = {name: column[keep] for name, column in columns.items()}
+                self._parts = [self._columns]
+            return dropped
+
+    def vocabulary(self, column: str) -> List[str]:
+        return {"level": self.levels, "service": self.services, "source": self.sources, "template": self.templates}[column].values
+
+    def read_rows(self, rows: np.ndarray) -> List[Dict[str, Any]]:
+        """
+        Reads the raw text of the given row indices from their log files, in the given order
+        """
+        columns = self.columns()
+        position = {int(row): i for i, row in enumerate(rows)}
+        results = []
+        for source_code in np.unique(columns["source"][rows]):
+            path = self.sources.values[source_code]
+            source_rows = sorted(rows[columns["source"][rows] == source_code], key=lambda row: columns["offset"][row])
+            try:
+                with open_log(path, binary=True) as f:
+                    for row in source_rows:
+                        f.seek(int(columns["offset"][row]))
+                        text = f.readline().decode("utf-8", errors="replace").rstrip()
+                        results.append({"row": int(row), "source": path, "line": int(columns["line"][row]) + 1, "text": text})
+            except OSError as e:
+                results.extend({"row": int(row), "source": path, "line": int(columns["line"][row]) + 1,
+                                "text": f"<log text unavailable: {e}>"} for row in source_rows)
+        results.sort(key=lambda result: position[result["row"]])
+        return results
+
+    def save(self, path: str):
+        columns = self.columns()
+        with self._lock:
+            with open(path, "wb") as f:
+                pickle.dump({
+                    "columns": columns,
+                    "vocabularies": {name: self.vocabulary(name) for name in ("level", "service", "source", "template")},
+                }, f)
+
+    def load(self, path: str):
+        with open(path, "rb") as f:
+            state = pickle.load(f)
+        with self._lock:
+            vocabularies = state["vocabularies"]
+            self.levels = _Vocabulary(vocabularies["level"])
+            self.services = _Vocabulary(vocabularies["service"])
+            self.sources = _Vocabulary(vocabularies["source"])
+            self.templates = _Vocabulary(vocabularies["template"])
+            self._columns = state["columns"]
+            self._parts = [self._columns]
+
+def columns_path(store_path: str) -> str:
+    """
+    Columns are saved next to the index store: data/store.pkl -> data/store.columns.pkl
+    """
+    root, _ = os.path.splitext(store_path)
+    return f"{root}.columns.pkl"
+
+__all__ = ['LogColumns', 'ColumnObserver', 'columns_path', 'to_millis', 'from_millis', 'MISSING_TIME']
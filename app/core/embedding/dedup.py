@@ -0,0 +1,164 @@
+from collections import OrderedDict, deque
+from typing_extensions import Deque, Dict, Optional, Tuple
+import hashlib
+
+import numpy as np
+
+from .templates import template_of
+from .types import Chunk, ChunkMetaData
+
+SIMHASH_BITS = 64
+
+class ChunkDeduplicator:
+    """
+    Detects exact and near duplicate chunks over a sliding horizon of recent canonical chunks.
+
+    Lines are reduced to templates (timestamps, ids and numbers masked) before hashing, so
+    heartbeat / health-check windows that only differ in their variables count as duplicates.
+    Near duplicates are found with a 64 bit SimHash of the chunk's template tokens.
+
+    A duplicate is not indexed, instead its canonical chunk's metadata is updated in place
+    (occurrences and last_seen), the indexers keep a reference to that same metadata dict.
+    Sliding windows overlap, so a duplicate only counts as another occurrence when it starts after the
+    lines already counted for its canonical (the canonical's own lines, then those of the last counted
+    duplicate): a window shifted by one line is the same occurrence, not a repetition.
+    """
+    def __init__(self, horizon: int = 512, max_distance: int = 3, max_gap: Optional[int] = None,
+                 line_cache_size: int = 50_000) -> None:
+        """
+        Args:
+            horizon : number of recent canonical chunks compared against
+            max_distance : SimHash hamming distance up to which chunks are near duplicates
+            max_gap : keep a chunk anyway after this many consecutive duplicates; with sliding
+                      windows pass window_size - 1 (and index finish()) so every line stays in some indexed chunk
+            line_cache_size : lines / templates whose SimHash contributions are cached across windows
+        """
+        self.horizon = horizon
+        self.max_distance = max_distance
+        self.max_gap = max_gap
+        self.line_cache_size = line_cache_size
+        # (simhash, digest, canonical metadata)
+        self._recent: Deque[Tuple[int, bytes, ChunkMetaData]] = deque(maxlen=horizon)
+        self._by_digest: Dict[bytes, ChunkMetaData] = {}
+        # id(canonical metadata) -> last line counted as one of its occurrences
+        self._counted_until: Dict[int, int] = {}
+        # raw line -> (template, simhash contribution); with sliding windows each line recurs in many chunks
+        self._lines: "OrderedDict[str, Tuple[str, np.ndarray]]" = OrderedDict()
+        self._template_vectors: Dict[str, np.ndarray] = {}
+        self._since_kept = 0
+        # last suppressed chunk with its canonical's previous last_seen and counted line, see finish()
+        self._last_duplicate: Optional[Tuple[Chunk, ChunkMetaData, str, object, Optional[int], bool]] = None
+        self.stats = {"chunks": 0, "unique": 0, "exact": 0, "near": 0}
+
+    def _line_info(self, line: str) -> Tuple[str, np.ndarray]:
+        info = self._lines.get(line)
+        if info is not None:
+            self._lines.move_to_end(line)
+            return info
+        template = template_of(line)
+        vector = self._template_vectors.get(template)
+        if vector is None:
+            vector = self._template_vector(template)
+            if len(self._template_vectors) < self.line_cache_size:
+                self._template_vectors[template] = vector
+        info = self._lines[line] = (template, vector)
+        if len(self._lines) > self.line_cache_size:
+            self._lines.popitem(last=False)
+        return info
+
+    @staticmethod
+    def _template_vector(template: str) -> np.ndarray:
+        """+1/-1 per SimHash bit summed over the tokens of a line template"""
+        tokens = template.split()
+        if tokens:
+            hashes = np.array([int.from_bytes(hashlib.blake2b(t.encode(), digest_size=8).digest(), "little") for t in tokens],
+                              dtype=np.uint64)
+            bits = np.unpackbits(hashes.view(np.uint8).reshape(-1, 8), axis=1, bitorder="little")
+            vector = (bits.astype(np.int32) * 2 - 1).sum(axis=0)
+        else:
+            vector = np.zeros(SIMHASH_BITS, dtype=np.int32)
+        return vector
+
+    def fingerprint(self, text: str) -> Tuple[int, bytes]:
+        """
+        Returns:
+            (64 bit SimHash, digest of the templated text)
+        """
+        infos = [self._line_info(line) for line in text.splitlines()]
+        digest = hashlib.blake2b("\n".join(template for template, _ in infos).encode(), digest_size=16).digest()
+        total = np.sum([vector for _, vector in infos], axis=0) if infos else np.zeros(SIMHASH_BITS)
+        simhash = int.from_bytes(np.packbits(total > 0, bitorder="little").tobytes(), "little")
+        return simhash, digest
+
+    def _find_canonical(self, simhash: int, digest: bytes, has_error: bool) -> Tuple[Optional[ChunkMetaData], str]:
+        canonical = self._by_digest.get(digest)
+        if canonical is not None and canonical["has_error"] == has_error:
+            return canonical, "exact"
+        for other_hash, _, metadata in reversed(self._recent):
+            # an error window is never folded into a clean one (or vice versa)
+            if metadata["has_error"] == has_error and (simhash ^ other_hash).bit_count() <= self.max_distance:
+                return metadata, "near"
+        return None, ""
+
+    def is_duplicate(self, chunk: Chunk) -> bool:
+        """
+        Checks a chunk against the horizon. Duplicates are recorded on their canonical chunk,
+        anything else becomes a canonical chunk itself.
+        Returns:
+            True when the chunk should not be embedded / indexed
+        """
+        self.stats["chunks"] += 1
+        metadata = chunk["metadata"]
+        simhash, digest = self.fingerprint(chunk["text"])
+
+        force_keep = self.max_gap is not None and self._since_kept >= self.max_gap
+        canonical, kind = (None, "") if force_keep else self._find_canonical(simhash, digest, metadata["has_error"])
+        if canonical is not None:
+            counted_until = self._counted_until.get(id(canonical))
+            start_line = metadata.get("start_line")
+            # chunks without line numbers cannot overlap by position, each one counts
+            counted = start_line is None or counted_until is None or start_line > counted_until
+            self._last_duplicate = (chunk, canonical, kind, canonical.get("last_seen"), counted_until, counted)
+            if counted:
+                canonical["occurrences"] = canonical.get("occurrences", 1) + 1
+                if metadata.get("end_line") is not None:
+                    self._counted_until[id(canonical)] = metadata["end_line"]
+                seen = metadata.get("end_timestamp") or metadata.get("start_timestamp")
+                if seen is not None and (canonical.get("last_seen") is None or seen > canonical["last_seen"]):
+                    canonical["last_seen"] = seen
+            self.stats[kind] += 1
+            self._since_kept += 1
+            return True
+
+        if len(self._recent) == self.horizon:
+            _, old_digest, old_metadata = self._recent[0]
+            if self._by_digest.get(old_digest) is old_metadata:
+                del self._by_digest[old_digest]
+            self._counted_until.pop(id(old_metadata), None)
+        self._recent.append((simhash, digest, metadata))
+        self._by_digest[digest] = metadata
+        if metadata.get("end_line") is not None:
+            self._counted_until[id(metadata)] = metadata["end_line"]
+        self.stats["unique"] += 1
+        self._since_kept = 0
+        self._last_duplicate = None
+        return False
+
+    def finish(self) -> Optional[Chunk]:
+        """
+        Call at the end of a stream. If the final chunk was suppressed, its duplicate record
+        is undone and it is returned so it can be indexed: with sliding windows the newest
+        lines of a file only appear in its final windows.
+        """
+        if self._last_duplicate is None:
+            return None
+        chunk, canonical, kind, previous_last_seen, previous_counted_until, counted = self._last_duplicate
+        if counted:
+            canonical["occurrences"] -= 1
+            if previous_counted_until is not None:
+                self._counted_until[id(canonical)] = previous_counted_until
+        canonical["last_seen"] = previous_last_seen
+        self.stats[kind] -= 1
+        self.stats["unique"] += 1
+        self._last_duplicate = None
+        return chunk
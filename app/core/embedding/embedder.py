@@ -1,16 +1,127 @@
-from sentence_transformers import SentenceTransformer
-import torch
+from typing_extensions import Optional, Sequence, Any
+import threading
+import os
 
 DEFAULT_MODEL = 'sentence-transformers/all-MiniLM-L6-v2'
+BACKENDS = ('auto', 'cuda', 'cpu', 'cpu-int8')
+
+# Heuristic: log text averages well under 8 characters per word piece, so cutting the
+# raw string at max_seq_length * 8 spares the tokenizer the rest of a 200 line window
+# and rarely drops tokens the model would have seen. Text with longer pieces (long
+# hex ids, base64 blobs) can lose a few tokens at the end.
+_CHARS_PER_TOKEN_BOUND = 8
 
 class Embedder:
     """
     Embedder Class for generating embeddings
     Uses sentence transformers
     """
-    def __init__(self, model : str = DEFAULT_MODEL) -> None:
-        self.device = 'cuda' if torch.cuda.is_available() else 'cpu'
+    def __init__(self,
+                 model : str = DEFAULT_MODEL,
+                 backend : str = 'auto',
+                 num_threads : Optional[int] = None,
+                 max_seq_length : Optional[int] = None,
+                 batch_size : int = 32) -> None:
+        """
+        Args:
+            model : sentence-transformers model name or path
+            backend : 'auto' (cuda when available, else cpu), 'cuda', 'cpu' or
+                      'cpu-int8' (dynamic int8 quantization of the transformer linear layers)
+            num_threads : torch intra-op threads for cpu backends (default: torch default)
+            max_seq_length : token limit per document (default: the model's own limit)
+            batch_size : documents per forward pass in embed_batch
+        """
+        if backend not in BACKENDS:
+            raise ValueError(f"Unknown embedder backend: {backend}. Choose one of {BACKENDS}")
+
+        # torch / sentence-transformers take seconds to import, so only pay for them when a model is built
+        from sentence_transformers import SentenceTransformer
+        import torch
+
+        if backend == 'auto':
+            backend = 'cuda' if torch.cuda.is_available() else 'cpu'
+        self.backend = backend
+        self.device = 'cuda' if backend == 'cuda' else 'cpu'
+        self.batch_size = batch_size
+
+        if num_threads and self.device == 'cpu':
+            # Process wide setting, the ingest node runs nothing else torch-bound
+            torch.set_num_threads(num_threads)
+
         self._model : SentenceTransformer = SentenceTransformer(model, device=self.device)
+        if max_seq_length:
+            self._model.max_seq_length = min(max_seq_length, self._model.max_seq_length or max_seq_length)
+        if backend == 'cpu-int8':
+            self._model.eval()
+            torch.ao.quantization.quantize_dynamic(self._model, {torch.nn.Linear}, dtype=torch.qint8, inplace=True)
+
+        self._max_chars = (self._model.max_seq_length or 0) * _CHARS_PER_TOKEN_BOUND or None
+
+    def _truncate(self, document : str) -> str:
+        if self._max_chars and len(document) > self._max_chars:
+            return document[:self._max_chars]
+        return document
 
     def embed(self, document : str):
-        return self._model.encode(document, convert_to_numpy=True)
\ No newline at end of file
+        return self._model.encode(self._truncate(document), convert_to_numpy=True)
+
+    def embed_batch(self, documents : Sequence[str]):
+        """
+        Embeds many documents in batched forward passes.
+        sentence-transformers sorts the inputs by length before batching, so each
+        batch is padded only to its own longest member (length bucketing).
+        Returns:
+            2D numpy array, one row per document, in input order
+        """
+        return self._model.encode([self._truncate(d) for d in documents],
+                                  batch_size=self.batch_size, convert_to_numpy=True)
+
+
+def embedder_options_from_env() -> dict[str, Any]:
+    """
+    Embedder options from the environment:
+        EMBEDDER_BACKEND : auto | cuda | cpu | cpu-int8
+        EMBEDDER_THREADS : torch intra-op threads
+        EMBEDDER_MAX_SEQ_LENGTH : token limit per document
+        EMBEDDER_BATCH_SIZE : documents per forward pass
+    """
+    options : dict[str, Any] = {'backend': os.getenv('EMBEDDER_BACKEND', 'auto')}
+    for env_name, option in (('EMBEDDER_THREADS', 'num_threads'),
+                             ('EMBEDDER_MAX_SEQ_LENGTH', 'max_seq_length'),
+                             ('EMBEDDER_BATCH_SIZE', 'batch_size')):
+        value = os.getenv(env_name)
+        if value:
+            options[option] = int(value)
+    return options
+
+
+_shared_embedders : dict[str, Embedder] = {}
+_shared_lock = threading.Lock()
+
+def get_shared_embedder(model : str = DEFAULT_MODEL) -> Embedder:
+    """
+    Returns the process wide Embedder for a model, loading it on first use
+    with the options from the environment (see embedder_options_from_env).
+    Callers arriving while the model is loading wait for it instead of loading a second copy.
+    """
+    with _shared_lock:
+        if model not in _shared_embedders:
+            _shared_embedders[model] = Embedder(model, **embedder_options_from_env())
+        return _shared_embedders[model]
+
+def warm_up(model : str = DEFAULT_MODEL) -> threading.Thread:
+    """
+    Starts loading the shared Embedder in a daemon thread
+    Returns:
+        The started thread
+    """
+    def _load():
+        try:
+            get_shared_embedder(model)
+        except Exception as e:
+            # The foreground retries (and reports) on first real use
+            print(f"[Embedder] Background warm-up failed: {e}")
+
+    thread = threading.Thread(target=_load, name="embedder-warmup", daemon=True)
+    thread.start()
+    return thread
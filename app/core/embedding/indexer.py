@@ -1,99 +1,473 @@
 import faiss
 import numpy as np
-from typing import List, Dict, Optional
+from typing import List, Dict, Iterable, Optional, Sequence, Any
+from datetime import datetime
 import pickle
+import os
+import threading
+
+from .text_store import Document, LogTextStore
+
+COMPRESSIONS = {
+    None: "Flat",       # raw float32, 4 bytes per dimension
+    "fp16": "SQfp16",   # 2 bytes per dimension, no training
+    "int8": "SQ8",      # 1 byte per dimension, per-dimension ranges trained at build time
+}
+
+def overlaps_time_range(chunk_start: Optional[datetime], chunk_end: Optional[datetime],
+                        start: Optional[datetime], end: Optional[datetime]) -> bool:
+    """
+    True when [chunk_start, chunk_end] overlaps [start, end].
+    Missing bounds on either side are treated as open, so undated chunks always match.
+    """
+    chunk_end = chunk_end or chunk_start
+    if start is not None and chunk_end is not None and chunk_end < start:
+        return False
+    if end is not None and chunk_start is not None and chunk_start > end:
+        return False
+    return True
+
+def matches_filters(metadata: Dict, start: Optional[datetime] = None, end: Optional[datetime] = None,
+                    service: Optional[str] = None) -> bool:
+    """
+    True when a chunk's metadata passes the query filters (time range overlap and service)
+    """
+    if service is not None and metadata.get("service") != service:
+        return False
+    return overlaps_time_range(metadata.get("start_timestamp"), metadata.get("end_timestamp"), start, end)
+
+def within_time_range(metadata: Dict, start: Optional[datetime], end: Optional[datetime]) -> bool:
+    """
+    True when a chunk lies entirely inside [start, end] (open bounds when None).
+    Undated chunks are never inside a range, so time based deletion keeps them.
+    """
+    chunk_start = metadata.get("start_timestamp")
+    chunk_end = metadata.get("end_timestamp") or chunk_start
+    if chunk_start is None:
+        return False
+    return (start is None or chunk_start >= start) and (end is None or chunk_end <= end)
+
+def _wrap_with_ids(index: faiss.Index, first_id: int = 0) -> faiss.IndexIDMap2:
+    """
+    Puts an index saved before stable ids under an IndexIDMap2, its row numbers (+ first_id) become the ids
+    """
+    if isinstance(index, faiss.IndexIDMap2):
+        return index
+    wrapped = faiss.IndexIDMap2(faiss.IndexFlatL2(index.d))
+    # IndexIDMap2 only accepts an empty index, swap the filled one in afterwards
+    wrapped.index = index
+    wrapped.referenced_objects = [index]
+    wrapped.ntotal = index.ntotal
+    wrapped.is_trained = index.is_trained
+    faiss.copy_array_to_vector(np.arange(first_id, first_id + index.ntotal, dtype="int64"), wrapped.id_map)
+    wrapped.construct_rev_map()
+    return wrapped
 
 class InMemoryIndexer:
-    def __init__(self, dim: Optional[int] = None) -> None:
+    """
+    FAISS index with documents and metadata stored by chunk id.
+    Ids are stable (IndexIDMap2): deleting chunks only tombstones their vectors,
+    compact() removes the tombstoned vectors from the index in one pass.
+    """
+    def __init__(self, dim: Optional[int] = None, compression: Optional[str] = None,
+                 pca_dim: Optional[int] = None, train_size: int = 1024,
+                 text_store: Optional[LogTextStore] = None) -> None:
         """
         dim: embedding dimension (pass from model or infer on first insert)
+        compression: vector storage, None (float32), 'fp16' or 'int8' scalar quantization
+        pca_dim: reduce vectors to this many dimensions with a PCA trained at build time
+        train_size: vectors buffered before training when the index needs training (int8 / PCA),
+                    searched by brute force until then
+        text_store: resolves documents stored as ChunkRef (file offsets) to text, shared between shards
         """
+        if compression not in COMPRESSIONS:
+            raise ValueError(f"Unknown compression: {compression}. Choose one of {list(COMPRESSIONS)}")
         self.dim = dim
-        self._index: Optional[faiss.IndexFlatL2] = None
-        self._documents: List[str] = []
-        self._metadata: List[Dict] = []
+        self.compression = compression
+        self.pca_dim = pca_dim
+        self.train_size = train_size
+        self._index: Optional[faiss.IndexIDMap2] = None
+        # chunk id -> document / metadata, deleted chunks are removed right away
+        self._documents: Dict[int, Document] = {}
+        self._metadata: Dict[int, Dict] = {}
+        self._next_id = 0
+        # ids still in the faiss index but deleted, dropped by compact()
+        self._tombstones: set = set()
+        self.text_store = text_store if text_store is not None else LogTextStore()
+        # (vectors, ids) waiting for the index to be trained, their documents are already stored
+        self._pending: List[tuple] = []
+        # (vectors, ids) added while compact() rebuilds a copy of the index, replayed into the copy before the swap
+        self._compacting: Optional[List[tuple]] = None
+        self._lock = threading.RLock()
+
+    def _factory_spec(self, pca: bool = True) -> str:
+        spec = COMPRESSIONS[self.compression]
+        if pca and self.pca_dim and self.pca_dim < self.dim:
+            spec = f"PCA{self.pca_dim},{spec}"
+        return spec
 
     def _init_index(self, dim: int):
         self.dim = dim
-        self._index = faiss.IndexFlatL2(dim)
+        self._index = faiss.IndexIDMap2(faiss.index_factory(dim, self._factory_spec()))
+
+    def _flush(self, force: bool = False):
+        """
+        Trains the index once enough vectors are buffered (or when forced) and adds the buffer.
+        Only add_batch flushes: searching or reporting must not train the quantizer / PCA on a few vectors.
+        """
+        if not self._pending:
+            return
+        pending = sum(len(block) for block, _ in self._pending)
+        if not self._index.is_trained:
+            if pending < self.train_size and not force:
+                return
+            vectors = np.concatenate([block for block, _ in self._pending])
+            if self.pca_dim and len(vectors) < self.pca_dim:
+                # PCA cannot produce more components than training vectors, keep the full dimension
+                print(f"[Indexer] Only {len(vectors)} vectors, skipping PCA{self.pca_dim}")
+                self._index = faiss.IndexIDMap2(faiss.index_factory(self.dim, self._factory_spec(pca=False)))
+            self._index.train(vectors)
+        self._add_to_index(np.concatenate([block for block, _ in self._pending]),
+                           np.concatenate([ids for _, ids in self._pending]))
+        self._pending = []
+
+    def _add_to_index(self, vectors: np.ndarray, ids: np.ndarray):
+        self._index.add_with_ids(vectors, ids)
+        if self._compacting is not None:
+            self._compacting.append((vectors, ids))
 
-    def add(self, embedding: np.ndarray, document: str, metadata: Dict):
+    def add(self, embedding: np.ndarray, document: Document, metadata: Dict) -> int:
         """
         Add single vector and store doc + metadata
+        document: the chunk text or a ChunkRef into a file registered in text_store
+        Returns:
+            The chunk id
         """
-        embedding = embedding.astype('float32')
+        return self.add_batch(np.array([embedding]), [document], [metadata])[0]
 
-        if self._index is None:
-            self._init_index(len(embedding))
+    def add_batch(self, embeddings: np.ndarray, documents: Sequence[Document], metadatas: Sequence[Dict],
+                  ids: Optional[Sequence[int]] = None) -> List[int]:
+        """
+        Add a 2D array of vectors with one doc + metadata per row
+        ids: chunk ids to use (e.g. assigned by a ShardedIndexer), default the next free ids
+        Returns:
+            The chunk ids of the rows
+        """
+        embeddings = np.asarray(embeddings, dtype='float32')
+        if len(embeddings) == 0:
+            return []
+
+        with self._lock:
+            if self._index is None:
+                self._init_index(embeddings.shape[1])
+            if ids is None:
+                ids = np.arange(self._next_id, self._next_id + len(embeddings), dtype='int64')
+            else:
+                ids = np.asarray(ids, dtype='int64')
+            self._next_id = max(self._next_id, int(ids.max()) + 1)
+
+            if self._index.is_trained and not self._pending:
+                self._add_to_index(embeddings, ids)
+            else:
+                self._pending.append((embeddings, ids))
+                self._flush()
+            for chunk_id, document, metadata in zip(ids.tolist(), documents, metadatas):
+                self._documents[chunk_id] = document
+                self._metadata[chunk_id] = metadata
+            return ids.tolist()
 
-        self._index.add(np.array([embedding]))
-        self._documents.append(document)
-        self._metadata.append(metadata)
+    def __len__(self) -> int:
+        return len(self._documents)
 
-    def search(self, query_embedding: np.ndarray, k: int = 3):
+    def reserve_ids(self, n: int) -> List[int]:
         """
-        Returns top-k results with doc + metadata + distance
+        Reserves n chunk ids for rows added later with add_batch(ids=...)
         """
-        query_embedding = query_embedding.astype('float32')
-        distances, ids = self._index.search(np.array([query_embedding]), k)
+        with self._lock:
+            ids = list(range(self._next_id, self._next_id + n))
+            self._next_id += n
+            return ids
 
-        results = []
-        for rank, idx in enumerate(ids[0]):
-            results.append({
-                "document": self._documents[idx],
-                "metadata": self._metadata[idx],
-                "distance": float(distances[0][rank])
-            })
-        return results
+    def delete(self, ids: Iterable[int]) -> int:
+        """
+        Deletes chunks by id, unknown ids are ignored. The vectors are tombstoned until compact().
+        Returns:
+            The number of chunks deleted
+        """
+        with self._lock:
+            deleted = 0
+            for chunk_id in ids:
+                if self._documents.pop(chunk_id, None) is not None:
+                    del self._metadata[chunk_id]
+                    self._tombstones.add(chunk_id)
+                    deleted += 1
+            return deleted
 
-class PersistentFaissIndexer:
-    def __init__(self, dim: Optional[int] = None):
-        self._index: Optional[faiss.IndexFlatL2] = None
-        self.dim = dim
-        self._documents: List[str] = []
-        self._metadata: List[Dict] = []
+    def delete_range(self, start: Optional[datetime] = None, end: Optional[datetime] = None,
+                     service: Optional[str] = None) -> int:
+        """
+        Deletes the chunks lying entirely inside [start, end] (open bounds when None), optionally of one service.
+        delete_range(end=cutoff) drops everything older than cutoff.
+        """
+        with self._lock:
+            ids = [chunk_id for chunk_id, metadata in self._metadata.items()
+                   if (service is None or metadata.get("service") == service) and within_time_range(metadata, start, end)]
+            return self.delete(ids)
 
-    def _init_index(self, dim: int):
-        self.dim = dim
-        self._index = faiss.IndexFlatL2(dim)
+    def newest_timestamp(self) -> Optional[datetime]:
+        with self._lock:
+            return max((m.get("end_timestamp") or m.get("start_timestamp") for m in self._metadata.values()
+                        if m.get("end_timestamp") or m.get("start_timestamp")), default=None)
+
+    def apply_retention(self, policy, compact: bool = True) -> int:
+        """
+        Deletes what the RetentionPolicy does not keep: chunks older than max_age (log time, from the
+        newest chunk), then the oldest chunks beyond max_vectors / max_bytes.
+        compact: compact right away, leave it False when a BackgroundCompactor runs
+        Returns:
+            The number of chunks deleted
+        """
+        with self._lock:
+            deleted = 0
+            if policy.max_age is not None:
+                newest = self.newest_timestamp()
+                if newest is not None:
+                    deleted += self.delete_range(end=newest - policy.max_age)
+            limit = len(self._documents)
+            if policy.max_vectors is not None:
+                limit = min(limit, policy.max_vectors)
+            if policy.max_bytes is not None:
+                limit = min(limit, policy.max_bytes // max(1, self.bytes_per_chunk()))
+            if limit < len(self._documents):
+                # ids grow with insertion, the lowest are the oldest chunks
+                deleted += self.delete(sorted(self._documents)[:len(self._documents) - limit])
+            if deleted and compact:
+                self.compact()
+            return deleted
 
-    def add(self, embedding: np.ndarray, document: str, metadata: Dict):
-        embedding = embedding.astype("float32")
+    def bytes_per_chunk(self) -> int:
+        """
+        Approximate storage of one chunk: its vector code, id and document
+        """
+        with self._lock:
+            if not self._documents:
+                return 0
+            report = self.memory_report()
+            sample = list(self._documents.values())[:256]
+            document_bytes = sum(len(d) if isinstance(d, str) else 24 for d in sample) / len(sample)
+            return int(report["bytes_per_vector"] + 8 + document_bytes)
 
-        if self._index is None:
-            self._init_index(len(embedding))
+    @property
+    def tombstones(self) -> int:
+        return len(self._tombstones)
 
-        self._index.add(np.array([embedding]))
-        self._documents.append(document)
-        self._metadata.append(metadata)
+    def compact(self) -> int:
+        """
+        Removes the tombstoned vectors from the faiss index and rebuilds the document / metadata stores
+        (dicts keep their size after deletions).
+        The vectors are removed from a copy of the index outside the lock, searches and inserts go on
+        against the current index meanwhile (inserts are replayed into the copy) and the copy is swapped
+        in at the end. The copy needs as much memory as the index while it is built.
+        Returns:
+            The number of vectors removed
+        """
+        compacted = None
+        with self._lock:
+            if not self._tombstones or self._index is None or self._compacting is not None:
+                return 0
+            removing = set(self._tombstones)
+            tombstones = np.fromiter(removing, dtype='int64')
+            removed = 0
+            if self._pending:
+                kept = []
+                for block, ids in self._pending:
+                    alive = ~np.isin(ids, tombstones)
+                    removed += int(len(ids) - alive.sum())
+                    if alive.any():
+                        kept.append((block[alive], ids[alive]))
+                self._pending = kept
+            index = self._index
+            if index.ntotal:
+                compacted = faiss.clone_index(index)
+                self._compacting = []
+        if compacted is not None:
+            try:
+                removed += compacted.remove_ids(faiss.IDSelectorBatch(tombstones))
+            except Exception:
+                with self._lock:
+                    self._compacting = None
+                raise
+        with self._lock:
+            added, self._compacting = self._compacting, None
+            if compacted is not None and self._index is index:
+                for vectors, ids in added:
+                    compacted.add_with_ids(vectors, ids)
+                self._index = compacted
+            # chunks deleted during the rebuild stay tombstoned for the next compaction
+            self._tombstones -= removing
+            self._documents = dict(self._documents)
+            self._metadata = dict(self._metadata)
+            return int(removed)
 
-    def search(self, embedding: np.ndarray, k: int = 3):
-        embedding = embedding.astype("float32")
-        distances, ids = self._index.search(np.array([embedding]), k)
+    def search(self, query_embedding: np.ndarray, k: int = 3,
+               start: Optional[datetime] = None, end: Optional[datetime] = None, service: Optional[str] = None):
+        """
+        Returns top-k results with doc + metadata + distance
+        Args:
+            query_embedding : query vector
+            k : number of results
+            start, end : optional time range, chunks outside it are excluded
+            service : optional service name, chunks from other services are excluded
+        """
+        with self._lock:
+            if self._index is None:
+                return []
+            if not self._index.is_trained:
+                # nothing is in the index before training, the buffered vectors are all there is
+                return self._search_pending(query_embedding, k, start, end, service)
+            query = np.array([query_embedding.astype('float32')])
+            filtered = start is not None or end is not None or service is not None
+            ntotal = self._index.ntotal
+            # with filters or deleted chunks, widen the search until k chunks match or the index is exhausted
+            fetch = min(k * 4, ntotal) if filtered else min(k + len(self._tombstones), ntotal)
+            while True:
+                distances, ids = self._index.search(query, max(1, fetch))
+                results = []
+                for rank, idx in enumerate(ids[0].tolist()):
+                    metadata = self._metadata.get(idx)
+                    if metadata is None:
+                        # fewer than k vectors in the index (-1) or a deleted chunk
+                        continue
+                    if filtered and not matches_filters(metadata, start, end, service):
+                        continue
+                    results.append({
+                        "id": idx,
+                        # file backed documents are only read for the hits returned
+                        "document": self.text_store.resolve(self._documents[idx]),
+                        "metadata": metadata,
+                        "distance": float(distances[0][rank])
+                    })
+                    if len(results) == k:
+                        return results
+                if not filtered or fetch >= ntotal:
+                    return results
+                fetch = min(fetch * 4, ntotal)
+
+    def _search_pending(self, query_embedding: np.ndarray, k: int, start: Optional[datetime],
+                        end: Optional[datetime], service: Optional[str]) -> List[Dict[str, Any]]:
+        """
+        Exact L2 search of the vectors waiting for training (fewer than train_size, like DeltaBuffer.search)
+        """
+        if not self._pending:
+            return []
+        vectors = np.concatenate([block for block, _ in self._pending])
+        ids = np.concatenate([ids for _, ids in self._pending])
+        distances = ((vectors - np.asarray(query_embedding, dtype='float32')) ** 2).sum(axis=1)
+        filtered = start is not None or end is not None or service is not None
         results = []
-        for rank, idx in enumerate(ids[0]):
-            results.append({
-                "document": self._documents[idx],
-                "metadata": self._metadata[idx],
-                "distance": float(distances[0][rank])
-            })
+        for row in np.argsort(distances):
+            chunk_id = int(ids[row])
+            metadata = self._metadata.get(chunk_id)
+            if metadata is None or (filtered and not matches_filters(metadata, start, end, service)):
+                continue
+            results.append({"id": chunk_id, "document": self.text_store.resolve(self._documents[chunk_id]),
+                            "metadata": metadata, "distance": float(distances[row])})
+            if len(results) == k:
+                break
         return results
 
+    def memory_report(self) -> Dict[str, Any]:
+        """
+        Vector storage size compared with raw float32 vectors. Vectors waiting for training are
+        counted as float32 (pending) and do not train the index.
+        Returns:
+            dict with vectors, pending, tombstones, raw_bytes, index_bytes, bytes_per_vector and saved_ratio
+        """
+        with self._lock:
+            if self._index is None:
+                return {"vectors": 0, "pending": 0, "raw_bytes": 0, "index_bytes": 0, "bytes_per_vector": 0,
+                        "saved_ratio": 0.0, "tombstones": 0}
+            pending = sum(len(block) for block, _ in self._pending)
+            n = self._index.ntotal
+            trained = self._index.is_trained
+            tombstones = len(self._tombstones)
+            index = faiss.downcast_index(self._index.index)
+        raw_bytes = (n + pending) * (self.dim or 0) * 4
+
+        extra = 0
+        if isinstance(index, faiss.IndexPreTransform):
+            if trained:
+                # the PCA matrix is stored once, d_in * d_out floats
+                extra = self.dim * self.pca_dim * 4
+            index = faiss.downcast_index(index.index)
+        code_size = getattr(index, "code_size", (self.dim or 0) * 4)
+        # codes plus the id map (8 bytes per vector, twice with the reverse map), buffered vectors and their ids
+        index_bytes = n * (code_size + 16) + pending * ((self.dim or 0) * 4 + 8) + extra
+        return {
+            "vectors": n + pending - tombstones,
+            "pending": pending,
+            "tombstones": tombstones,
+            "raw_bytes": raw_bytes,
+            "index_bytes": index_bytes,
+            "bytes_per_vector": code_size,
+            "saved_ratio": 1 - index_bytes / raw_bytes if raw_bytes else 0.0,
+        }
+
+def indexer_options_from_env() -> Dict[str, Any]:
+    """
+    Indexer options from the environment:
+        INDEX_COMPRESSION : fp16 | int8 (unset for float32)
+        INDEX_PCA_DIM : PCA output dimension
+    """
+    options: Dict[str, Any] = {"compression": os.getenv("INDEX_COMPRESSION") or None}
+    if os.getenv("INDEX_PCA_DIM"):
+        options["pca_dim"] = int(os.getenv("INDEX_PCA_DIM"))
+    return options
+
+class PersistentFaissIndexer(InMemoryIndexer):
+    """
+    InMemoryIndexer that can be saved to / loaded from disk.
+    The faiss index file keeps the trained compression (PCA / scalar quantizer).
+    """
     def save(self, faiss_path="faiss.index", store_path="store.pkl"):
-        faiss.write_index(self._index, faiss_path)
-        with open(store_path, "wb") as f:
-            pickle.dump({
-                "documents": self._documents,
-                "metadata": self._metadata,
-                "dim": self.dim
-            }, f)
-
-    def load(self, faiss_path="faiss.index", store_path="store.pkl"):
-        self._index = faiss.read_index(faiss_path)
+        with self._lock:
+            # tombstones are never written to disk
+            self.compact()
+            # vectors still waiting for training are saved in the store and trained on once train_size is reached
+            faiss.write_index(self._index, faiss_path)
+            with open(store_path, "wb") as f:
+                pickle.dump({
+                    "documents": self._documents,
+                    "metadata": self._metadata,
+                    "next_id": self._next_id,
+                    "dim": self.dim,
+                    "compression": self.compression,
+                    "pca_dim": self.pca_dim,
+                    "files": self.text_store.paths,
+                    "pending": self._pending,
+                }, f)
+
+    def load(self, faiss_path="faiss.index", store_path="store.pkl", first_id: int = 0):
+        """
+        first_id: id of the first chunk of a store saved before stable ids (they are positional)
+        """
+        index = _wrap_with_ids(faiss.read_index(faiss_path), first_id)
         with open(store_path, "rb") as f:
             store = pickle.load(f)
-        self._documents = store["documents"]
-        self._metadata = store["metadata"]
+        documents, metadata = store["documents"], store["metadata"]
+        if isinstance(documents, list):
+            documents, metadata = dict(enumerate(documents, first_id)), dict(enumerate(metadata, first_id))
+        self._index = index
+        self._documents = documents
+        self._metadata = metadata
+        self._next_id = store.get("next_id", max(documents, default=-1) + 1)
+        self._tombstones = set()
         self.dim = store["dim"]
+        # stores written before compression support are plain float32
+        self.compression = store.get("compression")
+        self.pca_dim = store.get("pca_dim")
+        self.text_store = LogTextStore(store.get("files"))
+        self._pending = store.get("pending", [])
 
-__all__ = ['InMemoryIndexer', 'PersistentFaissIndexer']
\ No newline at end of file
+__all__ = ['InMemoryIndexer', 'PersistentFaissIndexer', 'COMPRESSIONS', 'indexer_options_from_env', 'overlaps_time_range',
+           'matches_filters', 'within_time_range']
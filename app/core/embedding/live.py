@@ -0,0 +1,282 @@
+from datetime import datetime
+from typing_extensions import Any, Dict, List, Optional, Sequence, Tuple
+import heapq
+import os
+import threading
+import time
+
+import numpy as np
+
+from .indexer import matches_filters
+from .log_chunker import LogChunker
+from .sources import is_gzip, service_from_path
+from .templates import template_of
+from .types import Chunk, Log
+
+class DeltaBuffer:
+    """
+    Immutable snapshot of the chunks published since the last fold into the main index.
+    Publishing builds a new buffer and swaps the pipeline's reference, so a query holding a
+    buffer never sees it change. Searched exactly (brute force L2, like IndexFlatL2) as it stays small.
+    """
+    def __init__(self, ids : Sequence[int] = (), embeddings : Optional[np.ndarray] = None,
+                 documents : Sequence[str] = (), metadatas : Sequence[Dict] = ()) -> None:
+        self.ids = np.asarray(ids, dtype="int64")
+        self.embeddings = embeddings if embeddings is not None else np.empty((0, 0), dtype="float32")
+        self.documents = tuple(documents)
+        self.metadatas = tuple(metadatas)
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def extended(self, ids : Sequence[int], embeddings : np.ndarray, documents : Sequence[str],
+                 metadatas : Sequence[Dict]) -> "DeltaBuffer":
+        embeddings = np.asarray(embeddings, dtype="float32")
+        if len(self):
+            embeddings = np.concatenate([self.embeddings, embeddings])
+        return DeltaBuffer(np.concatenate([self.ids, np.asarray(ids, dtype="int64")]), embeddings,
+                           self.documents + tuple(documents), self.metadatas + tuple(metadatas))
+
+    def search(self, query_embedding : np.ndarray, k : int = 3, start : Optional[datetime] = None,
+               end : Optional[datetime] = None, service : Optional[str] = None) -> List[Dict[str, Any]]:
+        if not len(self):
+            return []
+        distances = ((self.embeddings - np.asarray(query_embedding, dtype="float32")) ** 2).sum(axis=1)
+        filtered = start is not None or end is not None or service is not None
+        results = []
+        for row in np.argsort(distances):
+            metadata = self.metadatas[row]
+            if filtered and not matches_filters(metadata, start, end, service):
+                continue
+            results.append({"id": int(self.ids[row]), "document": self.documents[row], "metadata": metadata,
+                            "distance": float(distances[row])})
+            if len(results) == k:
+                break
+        return results
+
+def top_k_hits(k : int, *hit_lists : List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Top-k of several hit lists by distance, a chunk found in more than one (same id) counts once
+    """
+    seen = set()
+    merged = []
+    for hit in heapq.merge(*hit_lists, key=lambda hit: hit["distance"]):
+        if hit.get("id") is not None:
+            if hit["id"] in seen:
+                continue
+            seen.add(hit["id"])
+        merged.append(hit)
+        if len(merged) == k:
+            break
+    return merged
+
+def _count_lines(file_path : str, end : int) -> int:
+    count = 0
+    with open(file_path, "rb") as f:
+        while f.tell() < end:
+            block = f.read(min(1 << 20, end - f.tell()))
+            if not block:
+                break
+            count += block.count(b"\n")
+    return count
+
+def _rotated_path(directory : str, inode : int) -> Optional[str]:
+    """Where a rotated file went (app.log -> app.log.1), found by its inode"""
+    try:
+        with os.scandir(directory) as entries:
+            for entry in entries:
+                if entry.is_file() and entry.inode() == inode:
+                    return entry.path
+    except OSError:
+        pass
+    return None
+
+class LogTailer:
+    """
+    Follows a growing log file in a background thread and makes new lines searchable:
+        - polls every poll_interval seconds, only complete lines are read
+        - rotation (the path now is another file) drains the old file first, truncation restarts at 0
+        - new lines are cut into chunks of up to window_size lines, embedded in one batch and published
+          to the pipeline's delta buffer (VectorPipeline.publish), queries never wait for this
+        - rollups, columns and the time index are updated with the same lines
+    Tailed chunks keep their text. Chunks create_db stored as byte ranges (ChunkRef) are re-pointed
+    to the rotated file on rotation, like the columns and the time index.
+    """
+    def __init__(self, pipeline, file_path : str, service : Optional[str] = None, poll_interval : float = 1.0,
+                 window_size : int = 200, max_batch_lines : int = 5000, from_start : bool = False) -> None:
+        """
+        Args:
+            pipeline : the VectorPipeline to publish to
+            file_path : plain text log file (gzip files never grow)
+            service : service tag of the chunks (default: derived from the file name)
+            poll_interval : seconds between polls
+            window_size : maximum lines per chunk
+            max_batch_lines : lines read per batch, a backlog is worked off in several batches
+            from_start : read the file from the start instead of after what the pipeline already ingested
+        """
+        if is_gzip(file_path):
+            raise ValueError(f"Cannot tail a gzip file: {file_path}")
+        self.pipeline = pipeline
+        self.file_path = file_path
+        self.service = service or service_from_path(file_path)
+        self.poll_interval = poll_interval
+        self.window_size = window_size
+        self.max_batch_lines = max_batch_lines
+        self._chunker = LogChunker()
+        self._file = None
+        self._inode : Optional[int] = None
+        self._offset = 0
+        self._line = 0
+        self._partial = b""
+        self._stop = threading.Event()
+        self._thread : Optional[threading.Thread] = None
+        self._rollup = None
+        self._columns = None
+        self._times = None
+        # timestamp of the last dated line read, the year of year-less syslog lines is taken from it
+        self._reference : Optional[datetime] = None
+        self.stats = {"lines": 0, "chunks": 0, "batches": 0, "rotations": 0, "last_publish_s": 0.0, "lag_s": 0.0}
+        self._open(from_start)
+
+    def _open(self, from_start : bool):
+        self._file = open(self.file_path, "rb")
+        self._inode = os.fstat(self._file.fileno()).st_ino
+        ingested = self.pipeline.ingested.get(self.file_path)
+        if from_start:
+            self._offset, self._line = 0, 0
+        elif ingested is not None:
+            self._offset, self._line = ingested
+        else:
+            self._offset = os.fstat(self._file.fileno()).st_size
+            self._line = _count_lines(self.file_path, self._offset)
+        self._file.seek(self._offset)
+        self._partial = b""
+        self._rollup = self.pipeline.rollups.observer(self.file_path, self.service)
+        self._columns = self.pipeline.columns.observer(self.file_path, self.service, first_line=self._line)
+        self._times = self.pipeline.time_index.observer(self.file_path, self.service, first_line=self._line)
+
+    def start(self) -> "LogTailer":
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name=f"tail-{self.service}", daemon=True)
+            self._thread.start()
+        return self
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                read = self.poll_once()
+            except Exception as e:
+                print(f"[Tailer] {self.file_path}: {e}")
+                read = 0
+            # a backlog is read again right away
+            if read < self.max_batch_lines:
+                self._stop.wait(self.poll_interval)
+
+    def _read_lines(self) -> Tuple[List[str], List[int]]:
+        lines, offsets = [], []
+        while len(lines) < self.max_batch_lines:
+            raw = self._file.readline()
+            if not raw:
+                break
+            if not raw.endswith(b"\n"):
+                # the writer is mid line, keep it until the newline arrives
+                self._partial += raw
+                break
+            raw = self._partial + raw
+            self._partial = b""
+            lines.append(raw.decode("utf-8", errors="replace"))
+            offsets.append(self._offset)
+            self._offset += len(raw)
+        return lines, offsets
+
+    def _check_rotation(self) -> Optional[str]:
+        """
+        Returns:
+            'rotated' when the path is now another file, 'truncated' when the file shrank, else None
+        """
+        try:
+            stat = os.stat(self.file_path)
+        except FileNotFoundError:
+            # moved away and not recreated yet, keep reading the old file
+            return None
+        if stat.st_ino != self._inode:
+            return "rotated"
+        if stat.st_size < self._offset:
+            return "truncated"
+        return None
+
+    def poll_once(self) -> int:
+        """
+        Reads, chunks, embeds and publishes the lines appended since the last poll
+        Returns:
+            The number of lines read
+        """
+        rotation = self._check_rotation()
+        lines, offsets = self._read_lines()
+        read = self._publish(lines, offsets)
+        if rotation is not None and len(lines) < self.max_batch_lines:
+            # the old file is drained, continue with the new one from its start
+            if rotation == "rotated":
+                moved_to = _rotated_path(os.path.dirname(os.path.abspath(self.file_path)), self._inode)
+                if moved_to is not None:
+                    self.pipeline.columns.rename_source(self.file_path, moved_to)
+                    self.pipeline.time_index.rename_source(self.file_path, moved_to)
+                    if self.pipeline.text_store is not None:
+                        self.pipeline.text_store.rename_source(self.file_path, moved_to)
+            print(f"[Tailer] {self.file_path} {rotation}, following the new file")
+            self.stats["rotations"] += 1
+            self._file.close()
+            self._open(from_start=True)
+            read += self.poll_once()
+        return read
+
+    def _publish(self, lines : List[str], offsets : List[int]) -> int:
+        if not lines:
+            return 0
+        started = time.perf_counter()
+        rollup, columns, times = self._rollup, self._columns, self._times
+
+        def observe(log : Log, offset : int):
+            template = template_of(log['message'])
+            rollup.add(log, template)
+            columns.add(log, offset, template)
+            times.add(log, offset)
+
+        chunks : List[Chunk] = []
+        for i in range(0, len(lines), self.window_size):
+            window = lines[i:i + self.window_size]
+            window_offsets = offsets[i:i + self.window_size]
+            end_offset = offsets[i + len(window)] if i + len(window) < len(offsets) else self._offset
+            chunks.append(self._chunker.chunk_lines(window, window_offsets, end_offset, self._line + i,
+                                                    source=self.file_path, service=self.service, line_observer=observe,
+                                                    reference=self._reference))
+            self._reference = chunks[-1]['metadata']['end_timestamp'] or self._reference
+        embeddings = self.pipeline.embedder.embed_batch([chunk['text'] for chunk in chunks])
+        self.pipeline.publish(chunks, embeddings)
+        self.pipeline.rollups.merge(rollup)
+        self.pipeline.columns.merge(columns)
+        self.pipeline.time_index.merge(times)
+        self._rollup, self._columns, self._times = rollup.next_batch(), columns.next_batch(), times.next_batch()
+        self._line += len(lines)
+        self.pipeline.ingested[self.file_path] = (self._offset, self._line)
+
+        newest = chunks[-1]['metadata']['end_timestamp']
+        self.stats["lines"] += len(lines)
+        self.stats["chunks"] += len(chunks)
+        self.stats["batches"] += 1
+        self.stats["last_publish_s"] = round(time.perf_counter() - started, 3)
+        if newest is not None:
+            # how far the newest searchable line is behind the wall clock (log clock permitting)
+            self.stats["lag_s"] = round((datetime.now() - newest).total_seconds(), 1)
+        return len(lines)
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.poll_interval + 30)
+            self._thread = None
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+__all__ = ['LogTailer', 'DeltaBuffer', 'top_k_hits']
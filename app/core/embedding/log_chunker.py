@@ -1,6 +1,42 @@
+from collections import deque
 from datetime import datetime
+import os
 import re
 from .types import Log, Chunk, ChunkMetaData
+from .sources import open_log
+from typing_extensions import Callable, Deque, List, Optional
+
+def with_inferred_year(timestamp_str : str, reference : Optional[datetime] = None) -> datetime:
+    """
+    Dates a year-less syslog timestamp ('Oct 05 14:03:12') in the year that puts it closest to reference,
+    so a file crossing new year moves on to the next year instead of jumping back
+    Args:
+        timestamp_str : the '%b %d %H:%M:%S' text
+        reference : a time near the line, the previous dated line of the file or else its modification time
+                    (default: now)
+    Raises:
+        ValueError when the text is not a valid date in any candidate year
+    """
+    reference = reference or datetime.now()
+    candidates = []
+    for year in (reference.year - 1, reference.year, reference.year + 1):
+        try:
+            candidates.append(datetime.strptime(f"{year} {timestamp_str}", "%Y %b %d %H:%M:%S"))
+        except ValueError:
+            # Feb 29 only exists in leap years
+            continue
+    if not candidates:
+        raise ValueError(f"Invalid syslog timestamp: {timestamp_str}")
+    return min(candidates, key=lambda candidate: abs(candidate - reference))
+
+def file_time(file_path : str) -> datetime:
+    """
+    Modification time of a log file, the year reference of its first year-less lines (now when it is unreadable)
+    """
+    try:
+        return datetime.fromtimestamp(os.path.getmtime(file_path))
+    except OSError:
+        return datetime.now()
 
 class LogChunker:
     def __init__(self) -> None:
@@ -8,28 +44,39 @@ class LogChunker:
 
     @staticmethod
     def _create_sliding_window(file_path: str, window_size: int):
-        """Generator that yields sliding windows of lines from the file."""
-        lines = []
-        with open(file_path, 'r') as f:
-            for _ in range(window_size):
-                line = f.readline()
-                if not line: 
-                    break
-                lines.append(line)
-            
-            if lines: 
-                yield lines[:]
-            
-            for line in f:
-                lines.pop(0) 
-                lines.append(line)
-                yield lines[:]
+        """
+        Generator that yields sliding windows of lines from the file (plain or .gz).
+        Yields:
+            (lines, line_offsets, end_offset, start_line) : the lines of the window, the byte offset
+            of each line and the end of the last one in the (decompressed) file and the 0-based
+            index of the first line
+        """
+        lines = deque()
+        offsets = deque()
+        offset = 0
+        line_count = 0
+        with open_log(file_path, binary=True) as f:
+            for raw in f:
+                lines.append(raw.decode('utf-8', errors='replace'))
+                offsets.append(offset)
+                offset += len(raw)
+                line_count += 1
+                if len(lines) > window_size:
+                    lines.popleft()
+                    offsets.popleft()
+                if len(lines) == window_size:
+                    yield list(lines), list(offsets), offset, line_count - window_size
+
+            if 0 < len(lines) < window_size:
+                yield list(lines), list(offsets), offset, 0
 
-    def _parse_log_line(self, line: str) -> Log:
+    def _parse_log_line(self, line: str, reference: Optional[datetime] = None) -> Log:
         """
         Parse a log line to extract timestamp and check for errors. 
         Args:
             line : the log line
+            reference : the previous dated line's timestamp (else the file's modification time),
+                        year-less syslog timestamps get their year from it (see with_inferred_year)
         Returns:
             An Object of Log
         """
@@ -50,8 +97,8 @@ class LogChunker:
                         result["timestamp"] = datetime.strptime(timestamp_str, "%Y-%m-%d %H:%M:%S.%f")
                     elif "/" in timestamp_str:  # Has forward slashes
                         result["timestamp"] = datetime.strptime(timestamp_str, "%Y/%m/%d %H:%M:%S")
-                    elif len(timestamp_str) < 19:  # Short format
-                        result["timestamp"] = datetime.strptime(timestamp_str, "%b %d %H:%M:%S")
+                    elif len(timestamp_str) < 19:  # Short format, syslog has no year
+                        result["timestamp"] = with_inferred_year(timestamp_str, reference)
                     else:  # Standard format
                         result["timestamp"] = datetime.strptime(timestamp_str, "%Y-%m-%d %H:%M:%S")
                     break
@@ -75,34 +122,75 @@ class LogChunker:
         
         return result
 
-    def invoke(self, file_path: str, window_size: int = 100):
+    def invoke(self, file_path: str, window_size: int = 100, source: Optional[str] = None, service: Optional[str] = None,
+               line_observer: Optional[Callable[[Log, int], None]] = None):
         """
         Creates a chunk iterator of window size over the the given log file
         Args:
-            file_path : Path of the file
+            file_path : Path of the file (plain text or .gz)
             window_size : number of log lines to include in a chunk (default: 100)
+            source : source tag stored in the chunk metadata (default: file_path)
+            service : service name stored in the chunk metadata
+            line_observer : called once with every parsed line and its byte offset, in file order (e.g. to build rollups)
         Returns:
             Chunk : Generator Object of Chunks 
         """
         if not file_path:
             raise ValueError("file_path is required")
-        
-        for window in self._create_sliding_window(file_path, window_size):
-            chunk = Chunk(text="", metadata=ChunkMetaData(start_timestamp=None, end_timestamp=None, has_error=False))
-
-            parsed_firstline = self._parse_log_line(window[0].strip())
-            parsed_lastline = self._parse_log_line(window[-1].strip())
+        source = source or file_path
 
-            chunk['metadata']['start_timestamp'] = parsed_firstline['timestamp']
-            chunk['metadata']['end_timestamp'] = parsed_lastline['timestamp']
+        # every line is parsed once when it enters the window, not once per window it is part of
+        parsed: Deque[Log] = deque()
+        error_count = 0
+        next_line = 0
+        reference = file_time(file_path)
+        for window, line_offsets, end_offset, start_line in self._create_sliding_window(file_path, window_size):
+            for i in range(max(next_line, start_line), start_line + len(window)):
+                parsed_line = self._parse_log_line(window[i - start_line].strip(), reference)
+                reference = parsed_line['timestamp'] or reference
+                parsed.append(parsed_line)
+                error_count += parsed_line['is_error']
+                if line_observer is not None:
+                    line_observer(parsed_line, line_offsets[i - start_line])
+                next_line = i + 1
+            while len(parsed) > len(window):
+                error_count -= parsed.popleft()['is_error']
 
-            for line in window:
-                parsed_line = self._parse_log_line(line.strip())
-                chunk['text'] += f"{parsed_line['message']}\n"
-                chunk['metadata']['has_error'] = chunk['metadata']["has_error"] | parsed_line['is_error'] 
-                
+            chunk = Chunk(text="".join(f"{parsed_line['message']}\n" for parsed_line in parsed),
+                          metadata=ChunkMetaData(start_timestamp=parsed[0]['timestamp'], end_timestamp=parsed[-1]['timestamp'],
+                                                 has_error=error_count > 0,
+                                                 source=source, service=service, occurrences=1, last_seen=None,
+                                                 start_offset=line_offsets[0], end_offset=end_offset,
+                                                 start_line=start_line, end_line=start_line + len(window) - 1))
             yield chunk
 
+    def chunk_lines(self, lines: List[str], line_offsets: List[int], end_offset: int, start_line: int,
+                    source: Optional[str] = None, service: Optional[str] = None,
+                    line_observer: Optional[Callable[[Log, int], None]] = None,
+                    reference: Optional[datetime] = None) -> Chunk:
+        """
+        One chunk of consecutive lines (e.g. lines appended to a tailed file), each line parsed once
+        Args:
+            lines, line_offsets : the raw lines and the byte offset of each
+            end_offset : byte offset after the last line
+            start_line : 0-based index of the first line in its file
+            source, service, line_observer : as for invoke
+            reference : timestamp of the dated line before these (default: now), see _parse_log_line
+        """
+        parsed = []
+        for line in lines:
+            parsed.append(self._parse_log_line(line.strip(), reference))
+            reference = parsed[-1]['timestamp'] or reference
+        if line_observer is not None:
+            for parsed_line, offset in zip(parsed, line_offsets):
+                line_observer(parsed_line, offset)
+        return Chunk(text="".join(f"{parsed_line['message']}\n" for parsed_line in parsed),
+                     metadata=ChunkMetaData(start_timestamp=next((p['timestamp'] for p in parsed if p['timestamp']), None),
+                                            end_timestamp=next((p['timestamp'] for p in reversed(parsed) if p['timestamp']), None),
+                                            has_error=any(p['is_error'] for p in parsed),
+                                            source=source, service=service, occurrences=1, last_seen=None,
+                                            start_offset=line_offsets[0], end_offset=end_offset,
+                                            start_line=start_line, end_line=start_line + len(lines) - 1))
 
 
 if __name__ == "__main__":
@@ -1,44 +1,342 @@
-from .embedder import Embedder
+from .embedder import Embedder, get_shared_embedder
 from .log_chunker import LogChunker
-from .indexer import InMemoryIndexer, PersistentFaissIndexer
+from .indexer import InMemoryIndexer, PersistentFaissIndexer, indexer_options_from_env
+from .sharding import ShardedIndexer
+from .sources import is_gzip, resolve_log_files, service_from_path
+from .text_store import ChunkRef, LogTextStore
+from .dedup import ChunkDeduplicator
+from .rollups import LogRollups, rollups_path
+from .columns import LogColumns, columns_path
+from .time_index import LogTimeIndex, time_index_path
+from .templates import template_of
+from .retention import RetentionPolicy, BackgroundCompactor
+from .sampling import SamplingPolicy
+from .live import DeltaBuffer, top_k_hits
+from .rerank import LineReranker, LineEmbeddingCache, LineHit, coarse_candidates
+from .types import Log
+from .types import Chunk
 
-from typing_extensions import Union, Optional, Any
+from typing_extensions import Union, Optional, Any, Dict, Tuple
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+import hashlib
 import os
+import threading
+
+Indexer = Union[InMemoryIndexer, PersistentFaissIndexer, ShardedIndexer]
+
+WINDOW_SIZE = 200
+# chunks kept in the delta buffer before they are folded into the main index
+FOLD_SIZE = 2048
 
 class VectorPipeline:
     """
     A class to chunk, embed and index the log files
     """
-    def __init__(self, indexer : Union[type[InMemoryIndexer], type[PersistentFaissIndexer]]) -> None:
+    def __init__(self, indexer : Union[type[Indexer], Indexer], embedder : Optional[Embedder] = None, dedup : bool = True,
+                 lazy_text : bool = True, retention : Optional[RetentionPolicy] = None, compact_interval : Optional[float] = None,
+                 fold_size : int = FOLD_SIZE, line_cache_size : int = 100_000, sampling : Optional[SamplingPolicy] = None) -> None:
+        """
+        Args:
+            indexer : indexer class or instance
+            embedder : embedder instance, defaults to the process wide shared Embedder
+            dedup : skip exact / near duplicate chunks, counting them on their canonical chunk instead
+            lazy_text : store chunks as byte ranges of the log file instead of their text
+                        (plain files only, .gz chunks keep their text)
+            retention : applied after every ingested file, max_age also trims the rollups, columns and time index
+            compact_interval : seconds between background compactions of deleted chunks,
+                               None compacts inline when chunks are deleted by the retention policy
+            fold_size : published chunks (see publish) buffered before they are added to the main index
+            line_cache_size : line embeddings kept for query_lines
+            sampling : embed error / warning / rare windows and only a sample of routine ones (default: every window),
+                       used without dedup only, which already keeps one window in every WINDOW_SIZE - 1
+        """
         self._chunker = LogChunker()
-        self._embedder = Embedder()
-        self._indexer: Optional[Union[InMemoryIndexer, PersistentFaissIndexer]] = None
+        self._embedder = embedder if embedder is not None else get_shared_embedder()
+        self._indexer: Optional[Indexer] = None
         self._indexer = self._init_indexer(indexer)
+        self._index_lock = threading.Lock()
+        self._dedup = dedup
+        self._lazy_text = lazy_text
+        # per-minute line counts of everything ingested, see LogRollups
+        self.rollups = LogRollups()
+        # every ingested line as NumPy columns, for the analytics engine
+        self.columns = LogColumns()
+        # sparse timestamp -> byte offset samples of every ingested file, for read_range
+        self.time_index = LogTimeIndex()
+        self.retention = retention
+        self.sampling = sampling
+        # file -> sampling stats of its last ingest (windows kept per reason, routine rate), see AdaptiveSampler
+        self.sampled : Dict[str, Dict[str, Any]] = {}
+        # file -> (byte offset, line count) ingested so far, where a LogTailer picks up
+        self.ingested : Dict[str, Tuple[int, int]] = {}
+        # chunks published by a tailer and not yet in the main index, swapped as a whole (never mutated)
+        self._delta = DeltaBuffer()
+        self._publish_lock = threading.Lock()
+        self.fold_size = fold_size
+        # second level of query_lines, its line embedding cache lives as long as the pipeline
+        self.reranker = LineReranker(self._embedder, LineEmbeddingCache(line_cache_size))
+        self._compactor : Optional[BackgroundCompactor] = None
+        if compact_interval and hasattr(self._indexer, 'compact'):
+            self._compactor = BackgroundCompactor(self._indexer, interval=compact_interval).start()
+
+    @property
+    def embedder(self) -> Embedder:
+        return self._embedder
+
+    @property
+    def text_store(self) -> Optional[LogTextStore]:
+        """
+        Files the indexer's ChunkRefs point into, None for indexers without one
+        """
+        return getattr(self._indexer, 'text_store', None)
+
+    def fingerprint(self) -> str:
+        """
+        Short hash identifying the indexed data: the ingested files with their size and modification
+        time plus the number of indexed lines and vectors. Changes whenever the index or its logs change.
+        """
+        parts = [str(len(self.columns)), str(len(self._delta)), str(len(self._indexer))]
+        for path in sorted(self.columns.vocabulary("source")):
+            try:
+                stat = os.stat(path)
+                parts.append(f"{path}:{stat.st_size}:{int(stat.st_mtime)}")
+            except OSError:
+                parts.append(f"{path}:missing")
+        return hashlib.blake2b("|".join(parts).encode(), digest_size=8).hexdigest()
 
-    def _init_indexer(self, indexer : Union[type[InMemoryIndexer], type[PersistentFaissIndexer]]):
+    def memory_report(self) -> dict:
+        """
+        Index storage (see the indexer's memory_report) plus the columns' row count, the unfolded delta size
+        and the cached line embeddings
+        """
+        report = dict(self._indexer.memory_report()) if hasattr(self._indexer, 'memory_report') else {}
+        report.update({"rows": len(self.columns), "delta": len(self._delta), "line_cache": len(self.reranker.cache)})
+        return report
+
+    def _init_indexer(self, indexer : Union[type[Indexer], Indexer]):
         if isinstance(indexer, type):
             return indexer()
         else:
             return indexer
 
-    def create_db(self, file_path : str):
-        if not file_path or not os.path.exists(file_path):
+    def create_db(self, file_path : str, batch_size : Optional[int] = None, max_workers : Optional[int] = None,
+                  service : Optional[str] = None):
+        """
+        Chunk, embed and index log files into one merged index
+        Args:
+            file_path : a log file, a directory or a glob pattern, plain or .gz files
+            batch_size : number of chunks embedded per forward pass (default: the embedder's batch_size, else 32)
+            max_workers : files ingested in parallel (default: up to 4)
+            service : service tag for every file (default: derived from each file name)
+        """
+        files = resolve_log_files(file_path)
+        if not files:
             raise FileNotFoundError(f"File not found on path : {file_path}")
-        
-        for chunk in self._chunker.invoke(file_path=file_path, window_size=200):
-            emb = self._embedder.embed(chunk['text'])
-            self._indexer.add(emb, chunk['text'], metadata=chunk['metadata'])
+        if batch_size is None:
+            # remote and stub embedders have no batch size of their own
+            batch_size = getattr(self._embedder, 'batch_size', 32)
+
+        if len(files) == 1:
+            self._ingest_file(files[0], batch_size, service)
+            return
+        # Chunking is python-bound but embedding and faiss release the GIL, so files overlap well in threads
+        with ThreadPoolExecutor(max_workers=max_workers or min(4, len(files)), thread_name_prefix="ingest") as pool:
+            futures = [pool.submit(self._ingest_file, path, batch_size, service) for path in files]
+            for future in futures:
+                future.result()
+
+    def _ingest_file(self, file_path : str, batch_size : int, service : Optional[str]):
+        service = service or service_from_path(file_path)
+        # one horizon per file, duplicates are only folded within the same source
+        dedup = ChunkDeduplicator(max_gap=WINDOW_SIZE - 1) if self._dedup else None
+        text_store = self.text_store
+        file_id = None
+        if self._lazy_text and text_store is not None and not is_gzip(file_path):
+            file_id = text_store.register(file_path)
+        rollup = self.rollups.observer(file_path, service)
+        columns = self.columns.observer(file_path, service)
+        times = self.time_index.observer(file_path, service)
+        # what dedup keeps is never sampled away: duplicates are counted on the canonical chunks and the windows
+        # kept for max_gap hold lines no other indexed chunk has, so only windows of a file without dedup are sampled
+        sampler = self.sampling.sampler(service) if self.sampling is not None and dedup is None else None
+
+        def observe(log : Log, offset : int):
+            template = template_of(log['message'])
+            rollup.add(log, template)
+            columns.add(log, offset, template)
+            times.add(log, offset)
+            if sampler is not None:
+                sampler.observe(log, template)
+
+        batch : list[Chunk] = []
+        ingested = (0, 0)
+        for chunk in self._chunker.invoke(file_path=file_path, window_size=WINDOW_SIZE, source=file_path, service=service,
+                                          line_observer=observe):
+            ingested = (chunk['metadata']['end_offset'], chunk['metadata']['end_line'] + 1)
+            if dedup is not None and dedup.is_duplicate(chunk):
+                continue
+            if sampler is not None and not sampler.keep(chunk):
+                continue
+            batch.append(chunk)
+            if len(batch) >= batch_size:
+                self._index_batch(batch, file_id)
+                batch = []
+        if dedup is not None:
+            tail = dedup.finish()
+            if tail is not None:
+                batch.append(tail)
+        if batch:
+            self._index_batch(batch, file_id)
+        self.rollups.merge(rollup)
+        self.columns.merge(columns)
+        self.time_index.merge(times)
+        self.ingested[file_path] = ingested
+        if dedup is not None:
+            stats = dedup.stats
+            print(f"[Pipeline] {file_path}: indexed {stats['unique']}/{stats['chunks']} chunks "
+                  f"({stats['exact']} exact, {stats['near']} near duplicates skipped)")
+        if sampler is not None:
+            stats = self.sampled[file_path] = dict(sampler.stats)
+            print(f"[Pipeline] {file_path}: sampled {stats['windows'] - stats['skipped']}/{stats['windows']} windows "
+                  f"({stats['important']} error / warning, {stats['rare']} rare, {stats['sampled']} routine at rate {stats['rate']:g})")
+        if self.retention is not None:
+            self.enforce_retention()
+
+    def publish(self, chunks : list[Chunk], embeddings):
+        """
+        Makes chunks searchable right away (used by LogTailer): they go into a new delta buffer snapshot
+        that replaces the current one in a single assignment, queries keep searching the snapshot they
+        started with. Once the delta holds fold_size chunks it is added to the main index.
+        """
+        if not chunks:
+            return
+        with self._publish_lock:
+            # ids are reserved now, so a chunk seen in both the delta and the main index is merged by id
+            ids = self._indexer.reserve_ids(len(chunks))
+            self._delta = self._delta.extended(ids, embeddings, [chunk['text'] for chunk in chunks],
+                                               [chunk['metadata'] for chunk in chunks])
+            if len(self._delta) >= self.fold_size:
+                self._fold()
+        if self.retention is not None and not len(self._delta):
+            self.enforce_retention()
+
+    def _fold(self):
+        delta = self._delta
+        if not len(delta):
+            return
+        with self._index_lock:
+            self._indexer.add_batch(delta.embeddings, list(delta.documents), list(delta.metadatas), ids=delta.ids.tolist())
+        # only dropped once the main index has the chunks
+        self._delta = DeltaBuffer()
+
+    def flush(self):
+        """
+        Folds the published chunks into the main index
+        """
+        with self._publish_lock:
+            self._fold()
 
-    def query(self, text: str, k=3) -> list[Any]:
+    def enforce_retention(self) -> int:
+        """
+        Applies the retention policy to the index, and its max_age to the rollups, columns and time index
+        Returns:
+            The number of chunks deleted from the index
+        """
+        if self.retention is None or not hasattr(self._indexer, 'apply_retention'):
+            return 0
+        with self._index_lock:
+            deleted = self._indexer.apply_retention(self.retention, compact=self._compactor is None)
+            newest = self._indexer.newest_timestamp()
+        if self.retention.max_age is not None and newest is not None:
+            cutoff = newest - self.retention.max_age
+            self.rollups.drop_before(cutoff)
+            self.columns.drop_before(cutoff)
+            self.time_index.drop_before(cutoff)
+        if deleted:
+            print(f"[Pipeline] Retention removed {deleted} chunks ({self.retention})")
+        return deleted
+
+    def delete(self, ids : list[int]) -> int:
+        """
+        Deletes chunks by id (the ids returned with search hits)
+        """
+        with self._index_lock:
+            return self._indexer.delete(ids)
+
+    def delete_range(self, start : Optional[datetime] = None, end : Optional[datetime] = None,
+                     service : Optional[str] = None) -> int:
+        """
+        Deletes the chunks lying entirely inside [start, end], optionally of one service
+        """
+        with self._index_lock:
+            return self._indexer.delete_range(start, end, service)
+
+    def close(self):
+        """
+        Stops the background compactor
+        """
+        if self._compactor is not None:
+            self._compactor.stop()
+            self._compactor = None
+
+    def _index_batch(self, chunks : list[Chunk], file_id : Optional[int] = None):
+        embeddings = self._embedder.embed_batch([chunk['text'] for chunk in chunks])
+        if file_id is None:
+            documents = [chunk['text'] for chunk in chunks]
+        else:
+            documents = [ChunkRef(file_id, chunk['metadata']['start_offset'], chunk['metadata']['end_offset']) for chunk in chunks]
+        with self._index_lock:
+            self._indexer.add_batch(embeddings, documents, [chunk['metadata'] for chunk in chunks])
+
+    def query(self, text: str, k=3, start : Optional[datetime] = None, end : Optional[datetime] = None,
+              service : Optional[str] = None) -> list[Any]:
         """
         Query the the vector Database
         Args:
             text : the query text to perform search
+            k : number of documents to retrieve
+            start, end : optional time range the chunks must overlap
+            service : optional service name the chunks must come from
         Returns:
             A list of similar documents
         """
+        return self._search(self._embedder.embed(text), k, start, end, service)
+
+    def _search(self, q_emb, k : int, start : Optional[datetime], end : Optional[datetime], service : Optional[str]) -> list[Any]:
+        filters = {name: value for name, value in (('start', start), ('end', end), ('service', service)) if value is not None}
+        # the delta snapshot is taken before searching the index: a chunk folded meanwhile is found in both, never in neither
+        delta = self._delta
+        hits = self._indexer.search(q_emb, k, **filters)
+        if not len(delta):
+            return hits
+        return top_k_hits(k, hits, delta.search(q_emb, k, **filters))
+
+    def query_lines(self, text : str, k : int = 5, candidates : Optional[int] = None, context : Optional[int] = None,
+                    start : Optional[datetime] = None, end : Optional[datetime] = None,
+                    service : Optional[str] = None) -> list[LineHit]:
+        """
+        Two level search: the chunk index narrows the search to a few candidate chunks, then every
+        line of those chunks is embedded (cached per line text) and scored against the query
+        Args:
+            text : the query text
+            k : number of lines to return
+            candidates : chunks searched by the coarse pass (default: see coarse_candidates)
+            context : lines of context before and after each line (default: 2)
+            start, end, service : filters as for query, the time range also applies to the lines
+        Returns:
+            The k closest lines with their file, line number, distance and context
+        """
         q_emb = self._embedder.embed(text)
-        return self._indexer.search(q_emb, k)
+        hits = self._search(q_emb, candidates or coarse_candidates(k), start, end, service)
+        return self.reranker.rerank(q_emb, hits, k, start=start, end=end, context=context)
+
+    def read_range(self, start : Optional[datetime] = None, end : Optional[datetime] = None,
+                   service : Optional[str] = None, max_lines : int = 200, cursor : Optional[dict] = None) -> Dict[str, Any]:
+        """
+        The raw log lines between start and end, read from the files through the time index (see LogTimeIndex.read_range)
+        """
+        return self.time_index.read_range(start=start, end=end, service=service, max_lines=max_lines, cursor=cursor)
 
     def save(self, faiss_path="faiss.index", store_path="store.pkl"):
         """
@@ -49,7 +347,11 @@ class VectorPipeline:
         """
         if not hasattr(self._indexer, 'save'):
             raise AttributeError('Indexer does not have save method')
+        self.flush()
         self._indexer.save(faiss_path, store_path)
+        self.rollups.save(rollups_path(store_path))
+        self.columns.save(columns_path(store_path))
+        self.time_index.save(time_index_path(store_path))
 
     def load(self, faiss_path="faiss.index", store_path="store.pkl"):
         """
@@ -61,6 +363,60 @@ class VectorPipeline:
         if not hasattr(self._indexer, 'load'):
             raise AttributeError('Indexer does not have load method')
         self._indexer.load(faiss_path, store_path)
+        # stores saved before rollups / columns / the time index existed have no such file, they then only cover new ingests
+        if os.path.exists(rollups_path(store_path)):
+            self.rollups.load(rollups_path(store_path))
+        if os.path.exists(columns_path(store_path)):
+            self.columns.load(columns_path(store_path))
+        if os.path.exists(time_index_path(store_path)):
+            self.time_index.load(time_index_path(store_path))
+
+def indexer_from_env(persistent : bool) -> Indexer:
+    """
+    Builds the indexer from the environment, INDEX_PARTITION (hour / day) selects time sharding
+    """
+    options = indexer_options_from_env()
+    partition = os.getenv('INDEX_PARTITION')
+    if partition:
+        return ShardedIndexer(partition=partition, **options)
+    return PersistentFaissIndexer(**options) if persistent else InMemoryIndexer(**options)
+
+def pipeline_options_from_env() -> dict:
+    """
+    Retention (INDEX_RETENTION_HOURS, INDEX_MAX_VECTORS, INDEX_MAX_BYTES), INDEX_COMPACT_INTERVAL (seconds),
+    LINE_CACHE_SIZE (line embeddings cached for query_lines), INDEX_DEDUP (0 turns deduplication off)
+    and sampling (see SamplingPolicy.from_env)
+    """
+    interval = os.getenv('INDEX_COMPACT_INTERVAL')
+    return {"retention": RetentionPolicy.from_env(), "compact_interval": float(interval) if interval else None,
+            "line_cache_size": int(os.getenv('LINE_CACHE_SIZE', 100_000)), "dedup": os.getenv('INDEX_DEDUP', '1') != '0',
+            "sampling": SamplingPolicy.from_env()}
+
+def open_pipeline(db_type : str, log_file_path : Optional[str] = None, faiss_path : Optional[str] = None,
+                  store_path : Optional[str] = None, embedder : Optional[Embedder] = None) -> VectorPipeline:
+    """
+    Builds a pipeline configured from the environment
+    Args:
+        db_type : 'memory' indexes log_file_path, 'persistent' loads faiss_path / store_path
+                  (after indexing log_file_path when given)
+        embedder : defaults to the process wide shared Embedder
+    """
+    if db_type == 'memory':
+        if not log_file_path or not resolve_log_files(log_file_path):
+            raise FileExistsError('log_file_path does not exists')
+        pipe = VectorPipeline(indexer_from_env(persistent=False), embedder=embedder, **pipeline_options_from_env())
+        pipe.create_db(log_file_path)
+        return pipe
+
+    if not faiss_path:
+        raise ValueError('Provide faiss_path for persistent indexer')
+    if not store_path:
+        raise ValueError('Provide store_path for persistent indexer')
+    pipe = VectorPipeline(indexer_from_env(persistent=True), embedder=embedder, **pipeline_options_from_env())
+    if log_file_path:
+        pipe.create_db(log_file_path)
+    pipe.load(faiss_path, store_path)
+    return pipe
 
 if __name__ == "__main__":
     pipeline = VectorPipeline(PersistentFaissIndexer)
@@ -0,0 +1,173 @@
+from collections import OrderedDict
+from datetime import datetime
+from typing_extensions import Any, Dict, List, Optional, Sequence, Tuple, TypedDict
+import threading
+
+import numpy as np
+
+from .indexer import overlaps_time_range
+from .log_chunker import LogChunker
+
+# chunks searched by the coarse pass per line asked for, at least MIN_CANDIDATES
+CANDIDATES_PER_LINE = 1
+MIN_CANDIDATES = 5
+
+class LineHit(TypedDict):
+    source : Optional[str]
+    service : Optional[str]
+    # 0-based line number in its file, None for chunks stored without line numbers
+    line : Optional[int]
+    text : str
+    distance : float
+    # surrounding lines of the same chunk as (line number, text), the hit included
+    context : List[Tuple[Optional[int], str]]
+    chunk_id : Optional[int]
+
+class LineEmbeddingCache:
+    """
+    LRU cache of line embeddings keyed by the line text. Lines repeat a lot in logs (heartbeats,
+    retries) and neighbouring chunks share most of their lines, so reranking a query's candidates
+    usually embeds only a few new lines.
+    """
+    def __init__(self, max_entries : int = 100_000) -> None:
+        self.max_entries = max_entries
+        self._entries : "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0}
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def embed(self, embedder, lines : Sequence[str]) -> np.ndarray:
+        """
+        Embeddings of lines (unique texts), the missing ones computed in one embed_batch call
+        Returns:
+            2D float32 array, one row per line, in input order
+        """
+        vectors : List[Optional[np.ndarray]] = []
+        missing : List[str] = []
+        with self._lock:
+            for line in lines:
+                vector = self._entries.get(line)
+                if vector is not None:
+                    self._entries.move_to_end(line)
+                else:
+                    missing.append(line)
+                vectors.append(vector)
+            self.stats["hits"] += len(lines) - len(missing)
+            self.stats["misses"] += len(missing)
+        if missing:
+            computed = dict(zip(missing, np.asarray(embedder.embed_batch(missing), dtype="float32")))
+            with self._lock:
+                for line, vector in computed.items():
+                    self._entries[line] = vector
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+            vectors = [vector if vector is not None else computed[line] for line, vector in zip(lines, vectors)]
+        return np.stack(vectors) if vectors else np.empty((0, 0), dtype="float32")
+
+class LineReranker:
+    """
+    Second level of a hierarchical search: the lines of the chunks found by the coarse chunk search
+    are embedded (through a LineEmbeddingCache) and scored against the query, the closest lines are
+    returned with a few lines of context instead of whole windows.
+    """
+    def __init__(self, embedder, cache : Optional[LineEmbeddingCache] = None, context : int = 2) -> None:
+        """
+        Args:
+            embedder : the embedder of the coarse index, so line and chunk scores share one space
+            cache : line embedding cache (default: a new one)
+            context : lines kept before and after each hit
+        """
+        self._embedder = embedder
+        self.cache = cache if cache is not None else LineEmbeddingCache()
+        self.context = context
+        self._parser = LogChunker()
+
+    def rerank(self, query_embedding : np.ndarray, hits : List[Dict[str, Any]], k : int = 5,
+               start : Optional[datetime] = None, end : Optional[datetime] = None,
+               context : Optional[int] = None) -> List[LineHit]:
+        """
+        Args:
+            query_embedding : embedding of the query text
+            hits : chunk hits of the coarse search (VectorPipeline.query)
+            k : number of lines returned
+            start, end : optional time range, lines with a timestamp outside it are skipped
+            context : lines of context around each hit (default: the reranker's)
+        Returns:
+            The k lines closest to the query (squared L2 like the index), one entry per file line
+        """
+        context = self.context if context is None else context
+        # (source, line number) -> (hit index, position in its chunk), overlapping chunks share lines
+        candidates : Dict[Tuple, Tuple[int, int]] = {}
+        chunk_lines : List[List[str]] = []
+        # source -> line number -> text over all candidate chunks, context may cross a chunk's edge
+        file_lines : Dict[Optional[str], Dict[int, str]] = {}
+        for h, hit in enumerate(hits):
+            metadata = hit.get("metadata") or {}
+            lines = [line.rstrip() for line in hit["document"].splitlines()]
+            chunk_lines.append(lines)
+            first = metadata.get("start_line")
+            if first is not None:
+                known = file_lines.setdefault(metadata.get("source"), {})
+                for i, line in enumerate(lines):
+                    known.setdefault(first + i, line)
+            for i, line in enumerate(lines):
+                if not line.strip():
+                    continue
+                key = (metadata.get("source"), first + i) if first is not None else (metadata.get("source"), None, line)
+                if key in candidates:
+                    continue
+                if (start is not None or end is not None) and not self._in_range(line, start, end,
+                                                                                 metadata.get("start_timestamp")):
+                    continue
+                candidates[key] = (h, i)
+        if not candidates:
+            return []
+
+        positions = list(candidates.values())
+        texts = [chunk_lines[h][i] for h, i in positions]
+        unique = list(dict.fromkeys(texts))
+        vectors = self.cache.embed(self._embedder, unique)
+        distances = ((vectors - np.asarray(query_embedding, dtype="float32")) ** 2).sum(axis=1)
+        by_text = dict(zip(unique, distances.tolist()))
+
+        results : List[LineHit] = []
+        for p in sorted(range(len(positions)), key=lambda p: by_text[texts[p]])[:k]:
+            h, i = positions[p]
+            hit, lines = hits[h], chunk_lines[h]
+            metadata = hit.get("metadata") or {}
+            first = metadata.get("start_line")
+            if first is None:
+                around = [(None, lines[j]) for j in range(max(0, i - context), min(len(lines), i + context + 1))]
+            else:
+                known = file_lines[metadata.get("source")]
+                around = [(n, known[n]) for n in range(first + i - context, first + i + context + 1) if n in known]
+            results.append(LineHit(source=metadata.get("source"), service=metadata.get("service"),
+                                   line=first + i if first is not None else None, text=lines[i],
+                                   distance=by_text[texts[p]], context=around, chunk_id=hit.get("id")))
+        return results
+
+    def distances(self, query_embedding : np.ndarray, lines : Sequence[str]) -> List[float]:
+        """
+        Squared L2 distance of each line to the query, through the line embedding cache
+        """
+        if not lines:
+            return []
+        unique = list(dict.fromkeys(lines))
+        vectors = self.cache.embed(self._embedder, unique)
+        by_text = dict(zip(unique, ((vectors - np.asarray(query_embedding, dtype="float32")) ** 2).sum(axis=1).tolist()))
+        return [by_text[line] for line in lines]
+
+    def _in_range(self, line : str, start : Optional[datetime], end : Optional[datetime],
+                  reference : Optional[datetime] = None) -> bool:
+        # undated lines (stack traces...) pass, they continue a line of a chunk that matched;
+        # the chunk's start dates year-less syslog lines like ingest did
+        timestamp = self._parser._parse_log_line(line, reference)['timestamp']
+        return overlaps_time_range(timestamp, timestamp, start, end)
+
+def coarse_candidates(k : int) -> int:
+    """Chunks searched by the coarse pass to rerank k lines"""
+    return max(MIN_CANDIDATES, k * CANDIDATES_PER_LINE)
+
+__all__ = ['LineReranker', 'LineEmbeddingCache', 'LineHit', 'coarse_candidates']
@@ -0,0 +1,83 @@
+from datetime import timedelta
+from typing_extensions import Any, Callable, Optional
+import os
+import threading
+
+class RetentionPolicy:
+    """
+    What a long-running index keeps: chunks younger than max_age (log time, measured from the
+    newest chunk), at most max_vectors chunks and about max_bytes of vectors + documents.
+    The oldest chunks go first. Any limit left at None is not enforced.
+    """
+    def __init__(self, max_age : Optional[timedelta] = None, max_vectors : Optional[int] = None,
+                 max_bytes : Optional[int] = None) -> None:
+        self.max_age = max_age
+        self.max_vectors = max_vectors
+        self.max_bytes = max_bytes
+
+    @classmethod
+    def from_env(cls) -> Optional["RetentionPolicy"]:
+        """
+        Reads INDEX_RETENTION_HOURS, INDEX_MAX_VECTORS and INDEX_MAX_BYTES, None when none is set
+        """
+        hours = os.getenv('INDEX_RETENTION_HOURS')
+        vectors = os.getenv('INDEX_MAX_VECTORS')
+        size = os.getenv('INDEX_MAX_BYTES')
+        if not (hours or vectors or size):
+            return None
+        return cls(max_age=timedelta(hours=float(hours)) if hours else None,
+                   max_vectors=int(vectors) if vectors else None,
+                   max_bytes=int(size) if size else None)
+
+    def __repr__(self) -> str:
+        return f"RetentionPolicy(max_age={self.max_age}, max_vectors={self.max_vectors}, max_bytes={self.max_bytes})"
+
+class BackgroundCompactor:
+    """
+    Daemon thread compacting an indexer (InMemoryIndexer / ShardedIndexer) every interval seconds
+    once its tombstones reach min_ratio of the stored vectors, so deletions never pile up in the index.
+    on_compact (e.g. a save) runs after each compaction that removed something.
+    """
+    def __init__(self, indexer, interval : float = 60.0, min_ratio : float = 0.1,
+                 on_compact : Optional[Callable[[int], Any]] = None) -> None:
+        self._indexer = indexer
+        self.interval = interval
+        self.min_ratio = min_ratio
+        self._on_compact = on_compact
+        self._stop = threading.Event()
+        self._thread : Optional[threading.Thread] = None
+        self.compactions = 0
+
+    def start(self) -> "BackgroundCompactor":
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="index-compactor", daemon=True)
+            self._thread.start()
+        return self
+
+    def run_once(self) -> int:
+        report = self._indexer.memory_report()
+        stored = report["vectors"] + report["tombstones"]
+        if not report["tombstones"] or report["tombstones"] < self.min_ratio * stored:
+            return 0
+        removed = self._indexer.compact()
+        if removed:
+            self.compactions += 1
+            print(f"[Compactor] Removed {removed} deleted vectors, {report['vectors']} left")
+            if self._on_compact is not None:
+                self._on_compact(removed)
+        return removed
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.run_once()
+            except Exception as e:
+                print(f"[Compactor] Compaction failed: {e}")
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.interval + 5)
+            self._thread = None
+
+__all__ = ['RetentionPolicy', 'BackgroundCompactor']
@@ -0,0 +1,218 @@
+from collections import Counter
+from datetime import datetime, timedelta
+from typing_extensions import Any, Dict, List, Optional, Tuple
+import os
+import pickle
+import threading
+
+from .types import Log
+
+BUCKETS = {
+    "minute": timedelta(minutes=1),
+    "hour": timedelta(hours=1),
+    "day": timedelta(days=1),
+}
+# templates kept per minute bucket, the least frequent are trimmed beyond twice this (top-N stays approximate)
+MAX_TEMPLATES = 20
+# series longer than this are cut, the caller should pick a wider bucket or a narrower range
+MAX_SERIES = 500
+UNKNOWN_LEVEL = "UNKNOWN"
+ERROR_LEVELS = ("ERROR", "CRITICAL")
+
+def _new_bucket() -> Dict[str, Any]:
+    return {"lines": 0, "errors": 0, "levels": Counter(), "templates": Counter(), "error_templates": Counter()}
+
+def _trim(counter: Counter):
+    if len(counter) > 2 * MAX_TEMPLATES:
+        kept = counter.most_common(MAX_TEMPLATES)
+        counter.clear()
+        counter.update(dict(kept))
+
+def _floor(timestamp: datetime, bucket: str) -> datetime:
+    if bucket == "day":
+        return timestamp.replace(hour=0, minute=0, second=0, microsecond=0)
+    if bucket == "hour":
+        return timestamp.replace(minute=0, second=0, microsecond=0)
+    return timestamp.replace(second=0, microsecond=0)
+
+class RollupObserver:
+    """
+    Accumulates one file's per-minute rollups from its parsed lines (see LogChunker.invoke's line_observer).
+    Lines without a timestamp (stack traces, continuation lines) count in the minute
+    of the last timestamped line before them.
+    """
+    def __init__(self, source: str, service: Optional[str]) -> None:
+        self.source = source
+        self.service = service
+        self.buckets: Dict[Optional[datetime], Dict[str, Any]] = {}
+        self._minute: Optional[datetime] = None
+
+    def next_batch(self) -> "RollupObserver":
+        """
+        Empty observer continuing this one (carried minute), for files ingested in batches
+        """
+        observer = RollupObserver(self.source, self.service)
+        observer._minute = self._minute
+        return observer
+
+    def add(self, log: Log, template: str):
+        """
+        Args:
+            log : the parsed line
+            template : template_of the line's message
+        """
+        if not log["message"]:
+            return
+        if log["timestamp"] is not None:
+            self._minute = _floor(log["timestamp"], "minute")
+        bucket = self.buckets.get(self._minute)
+        if bucket is None:
+            bucket = self.buckets[self._minute] = _new_bucket()
+        bucket["lines"] += 1
+        bucket["levels"][log["level"] or UNKNOWN_LEVEL] += 1
+        bucket["templates"][template] += 1
+        _trim(bucket["templates"])
+        if log["is_error"]:
+            bucket["errors"] += 1
+            bucket["error_templates"][template] += 1
+            _trim(bucket["error_templates"])
+
+class LogRollups:
+    """
+    Per-minute, per-source aggregates of every ingested line: line and error counts,
+    counts by level and the most frequent line templates. Built during ingest (one
+    RollupObserver per file, merged when the file is done) so count / rate / top-N
+    questions are answered without reading the logs again.
+    """
+    def __init__(self) -> None:
+        # (minute or None for undated lines, source) -> bucket
+        self._buckets: Dict[Tuple[Optional[datetime], str], Dict[str, Any]] = {}
+        self._services: Dict[str, Optional[str]] = {}
+        self._lock = threading.Lock()
+
+    def observer(self, source: str, service: Optional[str] = None) -> RollupObserver:
+        return RollupObserver(source, service)
+
+    def merge(self, observer: RollupObserver):
+        with self._lock:
+            self._services[observer.source] = observer.service
+            for minute, bucket in observer.buckets.items():
+                target = self._buckets.get((minute, observer.source))
+                if target is None:
+                    self._buckets[(minute, observer.source)] = bucket
+                    continue
+                target["lines"] += bucket["lines"]
+                target["errors"] += bucket["errors"]
+                for key in ("levels", "templates", "error_templates"):
+                    target[key].update(bucket[key])
+                _trim(target["templates"])
+                _trim(target["error_templates"])
+
+    def services(self) -> List[str]:
+        with self._lock:
+            return sorted({service for service in self._services.values() if service})
+
+    def query(self, start: Optional[datetime] = None, end: Optional[datetime] = None, service: Optional[str] = None,
+              level: Optional[str] = None, bucket: str = "hour", top: int = 5) -> Dict[str, Any]:
+        """
+        Aggregates the rollups over a time range (minute precision)
+        Args:
+            start, end : optional time range, undated lines are only counted without one
+            service : only count this service's files
+            level : only count lines of this level (ERROR, WARNING...), series and totals use it
+            bucket : width of the returned time series, 'minute', 'hour' or 'day'
+            top : number of most frequent templates returned
+        Returns:
+            totals, counts by level / service, error count, lines per minute, the time series and top templates
+        """
+        if bucket not in BUCKETS:
+            raise ValueError(f"Unknown bucket: {bucket}. Choose one of {list(BUCKETS)}")
+        level = level.upper() if level else None
+        start_minute = _floor(start, "minute") if start else None
+
+        by_level: Counter = Counter()
+        by_service: Counter = Counter()
+        templates: Counter = Counter()
+        error_templates: Counter = Counter()
+        series: Dict[datetime, Counter] = {}
+        total = errors = 0
+        first = last = None
+        with self._lock:
+            for (minute, source), data in self._buckets.items():
+                if service is not None and self._services.get(source) != service:
+                    continue
+                if minute is None:
+                    if start is not None or end is not None:
+                        continue
+                elif (start_minute is not None and minute < start_minute) or (end is not None and minute > end):
+                    continue
+                lines = data["levels"][level] if level else data["lines"]
+                if not lines:
+                    continue
+                # with a level filter the error flag is not split by level, the level decides
+                bucket_errors = data["errors"] if not level else (lines if level in ERROR_LEVELS else 0)
+                total += lines
+                errors += bucket_errors
+                by_level.update(data["levels"] if not level else {level: lines})
+                by_service[self._services.get(source) or source] += lines
+                if not level:
+                    templates.update(data["templates"])
+                error_templates.update(data["error_templates"])
+                if minute is not None:
+                    first = minute if first is None or minute < first else first
+                    last = minute if last is None or minute > last else last
+                    point = series.setdefault(_floor(minute, bucket), Counter())
+                    point["lines"] += lines
+                    point["errors"] += bucket_errors
+
+        minutes = int((last - first) / BUCKETS["minute"]) + 1 if first is not None else 0
+        points = [{"bucket": key.isoformat(sep=" "), **dict(value)} for key, value in sorted(series.items())]
+        result = {
+            "total_lines": total,
+            "error_lines": errors,
+            "first_minute": first.isoformat(sep=" ") if first else None,
+            "last_minute": last.isoformat(sep=" ") if last else None,
+            "lines_per_minute": round(total / minutes, 3) if minutes else None,
+            "by_level": dict(by_level.most_common()),
+            "by_service": dict(by_service.most_common()),
+            "series": points[:MAX_SERIES],
+            "top_error_templates": error_templates.most_common(top),
+        }
+        if not level:
+            result["top_templates"] = templates.most_common(top)
+        if len(points) > MAX_SERIES:
+            result["note"] = f"series cut to {MAX_SERIES} of {len(points)} {bucket} buckets, use a wider bucket or a narrower range"
+        return result
+
+    def drop_before(self, cutoff: datetime) -> int:
+        """
+        Drops the minute buckets before cutoff (undated buckets are kept)
+        Returns:
+            The number of buckets dropped
+        """
+        with self._lock:
+            expired = [key for key in self._buckets if key[0] is not None and key[0] < _floor(cutoff, "minute")]
+            for key in expired:
+                del self._buckets[key]
+            return len(expired)
+
+    def save(self, path: str):
+        with self._lock:
+            with open(path, "wb") as f:
+                pickle.dump({"buckets": self._buckets, "services": self._services}, f)
+
+    def load(self, path: str):
+        with open(path, "rb") as f:
+            state = pickle.load(f)
+        with self._lock:
+            self._buckets = state["buckets"]
+            self._services = state["services"]
+
+def rollups_path(store_path: str) -> str:
+    """
+    Rollups are saved next to the index store: data/store.pkl -> data/store.rollups.pkl
+    """
+    root, _ = os.path.splitext(store_path)
+    return f"{root}.rollups.pkl"
+
+__all__ = ['LogRollups', 'RollupObserver', 'rollups_path', 'BUCKETS']
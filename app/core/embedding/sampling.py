@@ -0,0 +1,141 @@
+from typing_extensions import Dict, Optional
+import os
+
+from .types import Chunk, Log
+
+# levels whose windows are always indexed, besides lines flagged is_error
+IMPORTANT_LEVELS = ("WARNING", "ERROR", "CRITICAL")
+
+class SamplingPolicy:
+    """
+    What ingestion embeds: windows holding an error / warning line (or up to context_lines after one),
+    so that each such line is indexed with context_lines of context, one window for each line of a rare
+    template (seen at most rare_count times in its file so far) no kept window holds yet, and a share of
+    `rate` of the remaining routine windows. Rates can differ per service.
+    """
+    def __init__(self, rate : float = 0.1, context_lines : int = 50, rare_count : int = 1,
+                 service_rates : Optional[Dict[str, float]] = None) -> None:
+        """
+        Args:
+            rate : share of routine windows embedded (1 embeds everything)
+            context_lines : lines of context an important line keeps on both sides
+            rare_count : a template counts as rare until seen more often than this (1: only its first line),
+                         0 disables the boost
+            service_rates : rate overrides per service
+        """
+        if not 0 < rate <= 1:
+            raise ValueError(f"Sample rate must be in (0, 1], got {rate}")
+        self.rate = rate
+        self.context_lines = context_lines
+        self.rare_count = rare_count
+        self.service_rates = dict(service_rates or {})
+
+    @classmethod
+    def from_env(cls) -> Optional["SamplingPolicy"]:
+        """
+        Reads INDEX_SAMPLE_RATE (e.g. 0.1), INDEX_SAMPLE_RATES (per service, e.g. 'api=0.05,billing=0.5'),
+        INDEX_SAMPLE_CONTEXT (lines) and INDEX_RARE_TEMPLATE_COUNT. None (embed everything) when no rate is set
+        """
+        rate = os.getenv('INDEX_SAMPLE_RATE')
+        rates = os.getenv('INDEX_SAMPLE_RATES')
+        if not (rate or rates):
+            return None
+        service_rates = {}
+        for pair in filter(None, (rates or "").split(",")):
+            service, _, value = pair.partition("=")
+            service_rates[service.strip()] = float(value)
+        return cls(rate=float(rate) if rate else 1.0,
+                   context_lines=int(os.getenv('INDEX_SAMPLE_CONTEXT', 50)),
+                   rare_count=int(os.getenv('INDEX_RARE_TEMPLATE_COUNT', 1)),
+                   service_rates=service_rates)
+
+    def rate_for(self, service : Optional[str]) -> float:
+        return self.service_rates.get(service, self.rate) if service is not None else self.rate
+
+    def sampler(self, service : Optional[str] = None) -> "AdaptiveSampler":
+        return AdaptiveSampler(self, service)
+
+    def __repr__(self) -> str:
+        return (f"SamplingPolicy(rate={self.rate}, context_lines={self.context_lines}, rare_count={self.rare_count}, "
+                f"service_rates={self.service_rates})")
+
+class AdaptiveSampler:
+    """
+    Sampling state of one file. observe() must see every line (in file order, before the windows holding
+    it are offered to keep()), as the pipeline's line observer does.
+    Sliding windows overlap almost entirely, so windows around important lines are kept every
+    window length - 2 * context_lines lines (each important line then sits in a kept window with
+    context_lines on both sides) and routine windows once every 1 / rate. A skipped window is counted
+    on the last kept window's sample_weight (in place, the indexer holds the same metadata dict, like
+    ChunkDeduplicator's occurrences) when it starts after the lines already credited, so like occurrences
+    the weight counts repetitions (non overlapping windows), not one per window shifted by a line.
+    """
+    def __init__(self, policy : SamplingPolicy, service : Optional[str] = None) -> None:
+        self.policy = policy
+        self.rate = policy.rate_for(service)
+        self._line = -1
+        self._last_important = -1
+        self._last_rare = -1
+        # last line of the last kept window, important / rare lines up to it are in the index
+        self._covered = -1
+        # last line credited to a kept window's sample_weight
+        self._credited = -1
+        self._important_start : Optional[int] = None
+        self._last_kept : Optional[Dict] = None
+        self._templates : Dict[str, int] = {}
+        self._credit = 1.0
+        self.stats = {"windows": 0, "important": 0, "rare": 0, "sampled": 0, "skipped": 0, "rate": self.rate}
+
+    def observe(self, log : Log, template : str):
+        self._line += 1
+        if log['is_error'] or log['level'] in IMPORTANT_LEVELS:
+            self._last_important = self._line
+        if self.policy.rare_count:
+            seen = self._templates.get(template, 0) + 1
+            self._templates[template] = seen
+            if seen <= self.policy.rare_count:
+                self._last_rare = self._line
+
+    def keep(self, chunk : Chunk) -> bool:
+        """
+        Returns:
+            True when the window should be embedded, its metadata then holds its sample_weight
+        """
+        metadata = chunk['metadata']
+        self.stats["windows"] += 1
+        start = metadata['start_line'] if metadata.get('start_line') is not None else 0
+        length = metadata['end_line'] - start + 1 if metadata.get('end_line') is not None else 1
+        # lines up to the window's last one have been observed, so the last important line tells
+        # whether the window holds one (or follows one closely)
+        if self._last_important >= 0 and self._last_important >= start - self.policy.context_lines:
+            stride = max(1, length - 2 * self.policy.context_lines)
+            if (self._last_important > self._covered or self._important_start is None
+                    or start - self._important_start >= stride):
+                self.stats["important"] += 1
+                self._important_start = start
+                return self._kept(metadata)
+        # the newest rare line is in the window and no kept window holds it yet
+        elif self._last_rare >= max(start, self._covered + 1):
+            self.stats["rare"] += 1
+            return self._kept(metadata)
+        else:
+            self._credit += self.rate
+            if self._credit >= 1.0:
+                self._credit -= 1.0
+                self.stats["sampled"] += 1
+                return self._kept(metadata)
+        self.stats["skipped"] += 1
+        if self._last_kept is not None and metadata.get('end_line') is not None and start > self._credited:
+            self._last_kept['sample_weight'] += 1.0
+            self._credited = metadata['end_line']
+        return False
+
+    def _kept(self, metadata : Dict) -> bool:
+        metadata['sample_weight'] = 1.0
+        self._last_kept = metadata
+        if metadata.get('end_line') is not None:
+            self._covered = max(self._covered, metadata['end_line'])
+            self._credited = max(self._credited, metadata['end_line'])
+        return True
+
+__all__ = ['SamplingPolicy', 'AdaptiveSampler']
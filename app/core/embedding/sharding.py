@@ -0,0 +1,340 @@
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+import heapq
+import os
+import pickle
+import re
+import threading
+
+import numpy as np
+
+from .indexer import PersistentFaissIndexer, overlaps_time_range, within_time_range
+from .text_store import Document, LogTextStore
+
+PARTITIONS = {
+    "hour": "%Y%m%dT%H",
+    "day": "%Y%m%d",
+}
+UNDATED_SHARD = "undated"
+
+
+def _safe_name(service: str) -> str:
+    return re.sub(r"[^A-Za-z0-9_-]", "_", service)
+
+
+class ShardedIndexer:
+    """
+    Vector store partitioned into time shards (one faiss index per service and hour / day).
+    Queries with a time range or service only search the matching shards, the
+    remaining shards are searched in parallel threads and the top-k merged.
+    Whole shards can be dropped for retention without rebuilding anything.
+    Chunk ids are unique over all shards, so delete(ids) works without knowing the shard.
+    """
+    def __init__(self, partition: str = "day", max_workers: Optional[int] = None, **indexer_options) -> None:
+        """
+        partition: shard width, 'hour' or 'day'
+        max_workers: threads used for the fan-out search (default: ThreadPoolExecutor default)
+        indexer_options: passed to each shard's PersistentFaissIndexer (compression, pca_dim...)
+        """
+        if partition not in PARTITIONS:
+            raise ValueError(f"Unknown partition: {partition}. Choose one of {list(PARTITIONS)}")
+        self.partition = partition
+        self._indexer_options = indexer_options
+        self._shards: Dict[str, PersistentFaissIndexer] = {}
+        # shard key -> (earliest chunk start, latest chunk end)
+        self._ranges: Dict[str, Tuple[Optional[datetime], Optional[datetime]]] = {}
+        # shard key -> service of its chunks
+        self._services: Dict[str, Optional[str]] = {}
+        self._dropped: List[str] = []
+        self._next_id = 0
+        # one file registry for all shards so ChunkRef file ids agree
+        self.text_store = LogTextStore()
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="shard-search")
+
+    def _shard_key(self, metadata: Dict) -> str:
+        timestamp = metadata.get("start_timestamp") or metadata.get("end_timestamp")
+        key = UNDATED_SHARD if timestamp is None else timestamp.strftime(PARTITIONS[self.partition])
+        service = metadata.get("service")
+        return f"{_safe_name(service)}.{key}" if service else key
+
+    def _extend_range(self, key: str, metadata: Dict):
+        start, end = self._ranges.get(key, (None, None))
+        chunk_start = metadata.get("start_timestamp")
+        chunk_end = metadata.get("end_timestamp") or chunk_start
+        if chunk_start is not None and (start is None or chunk_start < start):
+            start = chunk_start
+        if chunk_end is not None and (end is None or chunk_end > end):
+            end = chunk_end
+        self._ranges[key] = (start, end)
+
+    def add(self, embedding: np.ndarray, document: Document, metadata: Dict) -> int:
+        return self.add_batch(np.array([embedding]), [document], [metadata])[0]
+
+    def reserve_ids(self, n: int) -> List[int]:
+        """
+        Reserves n chunk ids for rows added later with add_batch(ids=...)
+        """
+        with self._lock:
+            ids = list(range(self._next_id, self._next_id + n))
+            self._next_id += n
+            return ids
+
+    def add_batch(self, embeddings: np.ndarray, documents: Sequence[Document], metadatas: Sequence[Dict],
+                  ids: Optional[Sequence[int]] = None) -> List[int]:
+        """
+        Add a 2D array of vectors, each row goes to the shard of its chunk's start timestamp
+        ids: chunk ids from reserve_ids, default the next free ids
+        Returns:
+            The chunk ids of the rows
+        """
+        rows_by_shard: Dict[str, List[int]] = {}
+        for row, metadata in enumerate(metadatas):
+            rows_by_shard.setdefault(self._shard_key(metadata), []).append(row)
+
+        embeddings = np.asarray(embeddings, dtype="float32")
+        with self._lock:
+            if ids is None:
+                ids = list(range(self._next_id, self._next_id + len(embeddings)))
+            ids = [int(chunk_id) for chunk_id in ids]
+            self._next_id = max([self._next_id] + [chunk_id + 1 for chunk_id in ids])
+            for key, rows in rows_by_shard.items():
+                shard = self._shards.get(key)
+                if shard is None:
+                    shard = self._shards[key] = PersistentFaissIndexer(text_store=self.text_store, **self._indexer_options)
+                    self._services[key] = metadatas[rows[0]].get("service")
+                shard.add_batch(embeddings[rows], [documents[r] for r in rows], [metadatas[r] for r in rows],
+                                ids=[ids[r] for r in rows])
+                for r in rows:
+                    self._extend_range(key, metadatas[r])
+        return ids
+
+    def _select_shards(self, start: Optional[datetime], end: Optional[datetime], service: Optional[str]) -> List[PersistentFaissIndexer]:
+        with self._lock:
+            selected = []
+            for key, shard in self._shards.items():
+                if service is not None and self._services.get(key) != service:
+                    continue
+                # undated shards have no range and always overlap
+                shard_start, shard_end = self._ranges.get(key, (None, None))
+                if overlaps_time_range(shard_start, shard_end, start, end):
+                    selected.append(shard)
+            return selected
+
+    def services(self) -> List[str]:
+        with self._lock:
+            return sorted({service for service in self._services.values() if service})
+
+    def search(self, embedding: np.ndarray, k: int = 3, start: Optional[datetime] = None,
+               end: Optional[datetime] = None, service: Optional[str] = None):
+        """
+        Returns top-k results with doc + metadata + distance over the shards matching the filters
+        Args:
+            embedding : query vector
+            k : number of results
+            start, end : optional time range, chunks outside it are excluded
+            service : optional service name, other services' shards are not searched
+        """
+        shards = self._select_shards(start, end, service)
+        if not shards:
+            return []
+        if len(shards) == 1:
+            return shards[0].search(embedding, k, start=start, end=end, service=service)
+
+        futures = [self._executor.submit(shard.search, embedding, k, start, end, service) for shard in shards]
+        hits = [hit for future in futures for hit in future.result()]
+        return heapq.nsmallest(k, hits, key=lambda hit: hit["distance"])
+
+    def _drop(self, keys: Iterable[str]):
+        for key in keys:
+            self._shards.pop(key, None)
+            self._ranges.pop(key, None)
+            self._services.pop(key, None)
+            self._dropped.append(key)
+
+    def drop_before(self, cutoff: datetime) -> List[str]:
+        """
+        Drops every shard whose newest chunk ends before cutoff
+        Returns:
+            The dropped shard keys
+        """
+        with self._lock:
+            expired = [key for key, (_, end) in self._ranges.items() if end is not None and end < cutoff]
+            self._drop(expired)
+        return expired
+
+    def __len__(self) -> int:
+        with self._lock:
+            return sum(len(shard) for shard in self._shards.values())
+
+    def delete(self, ids: Iterable[int]) -> int:
+        """
+        Deletes chunks by id in whichever shard holds them, the vectors are tombstoned until compact()
+        """
+        ids = list(ids)
+        with self._lock:
+            return sum(shard.delete(ids) for shard in self._shards.values())
+
+    def delete_range(self, start: Optional[datetime] = None, end: Optional[datetime] = None,
+                     service: Optional[str] = None) -> int:
+        """
+        Deletes the chunks lying entirely inside [start, end], shards entirely inside are dropped whole
+        """
+        with self._lock:
+            deleted = 0
+            inside = []
+            for key, shard in self._shards.items():
+                if service is not None and self._services.get(key) != service:
+                    continue
+                shard_start, shard_end = self._ranges.get(key, (None, None))
+                if not overlaps_time_range(shard_start, shard_end, start, end):
+                    continue
+                if within_time_range({"start_timestamp": shard_start, "end_timestamp": shard_end}, start, end):
+                    inside.append(key)
+                    deleted += len(shard)
+                else:
+                    deleted += shard.delete_range(start, end, service)
+            self._drop(inside)
+            return deleted
+
+    def newest_timestamp(self) -> Optional[datetime]:
+        with self._lock:
+            return max((end for _, end in self._ranges.values() if end is not None), default=None)
+
+    def apply_retention(self, policy, compact: bool = True) -> int:
+        """
+        Applies a RetentionPolicy: chunks older than max_age (from the newest chunk) are deleted, then the
+        oldest shards (partially for the last one) until max_vectors / max_bytes hold.
+        compact: compact right away, leave it False when a BackgroundCompactor runs
+        Returns:
+            The number of chunks deleted
+        """
+        deleted = 0
+        if policy.max_age is not None:
+            newest = self.newest_timestamp()
+            if newest is not None:
+                deleted += self.delete_range(end=newest - policy.max_age)
+        with self._lock:
+            total = sum(len(shard) for shard in self._shards.values())
+            limit = total
+            if policy.max_vectors is not None:
+                limit = min(limit, policy.max_vectors)
+            if policy.max_bytes is not None and total:
+                per_chunk = max(1, next(shard.bytes_per_chunk() for shard in self._shards.values() if len(shard)))
+                limit = min(limit, policy.max_bytes // per_chunk)
+            excess = total - limit
+            # oldest first, undated shards last
+            by_age = sorted(self._shards, key=lambda key: (self._ranges[key][0] is None, self._ranges[key][0] or datetime.min))
+            for key in by_age:
+                if excess <= 0:
+                    break
+                shard = self._shards[key]
+                if len(shard) <= excess:
+                    excess -= len(shard)
+                    deleted += len(shard)
+                    self._drop([key])
+                else:
+                    deleted += shard.delete(sorted(shard._documents)[:excess])
+                    excess = 0
+        if deleted and compact:
+            self.compact()
+        return deleted
+
+    def compact(self) -> int:
+        """
+        Compacts every shard (see InMemoryIndexer.compact), shards left empty are dropped.
+        Shards compact outside the sharded lock, so searches and inserts are not held up.
+        """
+        with self._lock:
+            shards = list(self._shards.values())
+        removed = sum(shard.compact() for shard in shards)
+        with self._lock:
+            self._drop([key for key, shard in self._shards.items() if not len(shard)])
+        return removed
+
+    def drop_older_than(self, max_age: timedelta) -> List[str]:
+        """
+        Drops shards older than max_age, measured from the newest timestamp in the store
+        (log time, not wall clock, so replayed or archived logs behave the same)
+        """
+        newest = max((end for _, end in self._ranges.values() if end is not None), default=None)
+        if newest is None:
+            return []
+        return self.drop_before(newest - max_age)
+
+    def shard_stats(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            return [{
+                "shard": key,
+                "service": self._services.get(key),
+                "start": self._ranges[key][0],
+                "end": self._ranges[key][1],
+                "vectors": len(shard),
+            } for key, shard in sorted(self._shards.items())]
+
+    def memory_report(self) -> Dict[str, Any]:
+        with self._lock:
+            reports = [shard.memory_report() for shard in self._shards.values()]
+        raw = sum(r["raw_bytes"] for r in reports)
+        index = sum(r["index_bytes"] for r in reports)
+        return {
+            "shards": len(reports),
+            "vectors": sum(r["vectors"] for r in reports),
+            "pending": sum(r["pending"] for r in reports),
+            "tombstones": sum(r["tombstones"] for r in reports),
+            "raw_bytes": raw,
+            "index_bytes": index,
+            "saved_ratio": 1 - index / raw if raw else 0.0,
+        }
+
+    def save(self, faiss_path="faiss_shards", store_path="store.pkl"):
+        """
+        Saves one faiss index + store per shard into the faiss_path directory
+        and the shard manifest to store_path
+        """
+        os.makedirs(faiss_path, exist_ok=True)
+        with self._lock:
+            for key, shard in self._shards.items():
+                shard.save(os.path.join(faiss_path, f"{key}.index"), os.path.join(faiss_path, f"{key}.pkl"))
+            for key in self._dropped:
+                for ext in (".index", ".pkl"):
+                    path = os.path.join(faiss_path, f"{key}{ext}")
+                    if os.path.exists(path) and key not in self._shards:
+                        os.remove(path)
+            self._dropped = []
+            with open(store_path, "wb") as f:
+                pickle.dump({
+                    "partition": self.partition,
+                    "indexer_options": self._indexer_options,
+                    "ranges": self._ranges,
+                    "services": self._services,
+                    "next_id": self._next_id,
+                    "files": self.text_store.paths,
+                }, f)
+
+    def load(self, faiss_path="faiss_shards", store_path="store.pkl"):
+        with open(store_path, "rb") as f:
+            manifest = pickle.load(f)
+        text_store = LogTextStore(manifest.get("files"))
+        shards = {}
+        next_id = 0
+        for key in manifest["ranges"]:
+            shard = PersistentFaissIndexer(**manifest["indexer_options"])
+            # shards saved before global ids are numbered from 0, give them consecutive id ranges
+            shard.load(os.path.join(faiss_path, f"{key}.index"), os.path.join(faiss_path, f"{key}.pkl"),
+                       first_id=0 if "next_id" in manifest else next_id)
+            shard.text_store = text_store
+            shards[key] = shard
+            next_id = max(next_id, shard._next_id)
+        with self._lock:
+            self.partition = manifest["partition"]
+            self._indexer_options = manifest["indexer_options"]
+            self._ranges = manifest["ranges"]
+            self._services = manifest.get("services", {})
+            self.text_store = text_store
+            self._shards = shards
+            self._next_id = manifest.get("next_id", next_id)
+            self._dropped = []
+
+__all__ = ['ShardedIndexer', 'PARTITIONS']
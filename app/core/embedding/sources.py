@@ -0,0 +1,74 @@
+from typing_extensions import IO, List, Optional
+import glob
+import gzip
+import os
+import re
+
+# extensions that are never log text
+_SKIP_EXTENSIONS = ('.index', '.pkl', '.zip', '.tar', '.bz2', '.xz')
+# rotation suffixes: app.log.1, app.log.2.gz, app-20251005.log, app.log.2025-10-05
+_ROTATION_RE = re.compile(r"([.-]\d{4}-?\d{2}-?\d{2})|(\.\d+)$")
+
+def is_gzip(file_path : str) -> bool:
+    return file_path.endswith('.gz')
+
+def open_log(file_path : str, binary : bool = False) -> IO:
+    """
+    Opens a plain or gzip compressed log file for streaming reads.
+    .gz files are decompressed on the fly, nothing is written to disk.
+    Args:
+        file_path : path of the log file
+        binary : read bytes (to track byte offsets) instead of text
+    """
+    if is_gzip(file_path):
+        return gzip.open(file_path, 'rb') if binary else gzip.open(file_path, 'rt', errors='replace')
+    return open(file_path, 'rb') if binary else open(file_path, 'r', errors='replace')
+
+def resolve_log_files(path : str) -> List[str]:
+    """
+    Expands a log source into the list of files to ingest
+    Args:
+        path : a file, a directory (walked recursively) or a glob pattern (** supported)
+    Returns:
+        Sorted list of file paths
+    """
+    if not path:
+        return []
+    if glob.has_magic(path):
+        candidates = glob.glob(path, recursive=True)
+    elif os.path.isdir(path):
+        candidates = [os.path.join(root, name) for root, _, names in os.walk(path) for name in names]
+    elif os.path.exists(path):
+        return [path]
+    else:
+        return []
+    return sorted(p for p in candidates
+                  if os.path.isfile(p) and not p.endswith(_SKIP_EXTENSIONS) and not os.path.basename(p).startswith('.'))
+
+def analysis_file(path : str) -> Optional[str]:
+    """
+    The one file given to tools that read a single log (the sandboxed python analyzer) for a log source:
+    the file itself, or the most recently modified plain file of a directory / glob
+    (a .gz file only when there is no plain one, the sandbox then mounts it decompressed)
+    Returns:
+        The file path, None when the source has no files
+    """
+    files = resolve_log_files(path)
+    if not files:
+        return None
+    return max([f for f in files if not is_gzip(f)] or files, key=os.path.getmtime)
+
+def service_from_path(file_path : str) -> str:
+    """
+    Service name of a log file: its file name without compression,
+    rotation suffixes and extension (e.g. /var/log/billing.log.3.gz -> billing)
+    """
+    name = os.path.basename(file_path)
+    if is_gzip(name):
+        name = name[:-3]
+    previous: Optional[str] = None
+    while previous != name:
+        previous = name
+        name = _ROTATION_RE.sub('', name)
+        name = os.path.splitext(name)[0] if name.endswith(('.log', '.txt', '.out')) else name
+    return name or os.path.basename(file_path)
@@ -0,0 +1,28 @@
+import re
+
+# Order matters: timestamps before plain numbers, hex/uuids before digits
+_MASKS = [
+    (re.compile(r"\d{4}[-/]\d{2}[-/]\d{2}[ T]\d{2}:\d{2}:\d{2}(?:[.,]\d+)?"), "<TS>"),
+    (re.compile(r"\b\w{3} +\d{1,2} \d{2}:\d{2}:\d{2}\b"), "<TS>"),
+    (re.compile(r"\b[0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12}\b"), "<UUID>"),
+    (re.compile(r"\b\d{1,3}(?:\.\d{1,3}){3}(?::\d+)?\b"), "<IP>"),
+    (re.compile(r"\b0x[0-9a-fA-F]+\b"), "<HEX>"),
+    (re.compile(r"\b[0-9a-fA-F]{12,}\b"), "<HEX>"),
+    (re.compile(r"(['\"]).*?\1"), "<STR>"),
+    (re.compile(r"\d+"), "<N>"),
+]
+
+def mask_variables(text: str) -> str:
+    """
+    Replaces the variable parts of a log message (timestamps, ids, numbers, ips, quoted strings)
+    with placeholders, e.g. "2025-10-05 10:00:01 [INFO] user 42 logged in" -> "<TS> [INFO] user <N> logged in"
+    """
+    for pattern, placeholder in _MASKS:
+        text = pattern.sub(placeholder, text)
+    return text
+
+def template_of(line: str) -> str:
+    """
+    Template of a single log line: variables masked, surrounding whitespace removed
+    """
+    return mask_variables(line.strip())
@@ -0,0 +1,93 @@
+from typing_extensions import Dict, List, NamedTuple, Optional, Union
+import mmap
+import os
+import threading
+
+class ChunkRef(NamedTuple):
+    """
+    Location of a chunk's text in its log file, stored instead of the text itself
+    """
+    file_id : int
+    start : int
+    end : int
+
+Document = Union[str, ChunkRef]
+
+class LogTextStore:
+    """
+    Registry of the log files referenced by ChunkRefs.
+    Chunk text is read on demand through a shared read-only mmap per file,
+    so only the chunks actually returned by a search are ever materialized.
+    """
+    def __init__(self, paths : Optional[List[str]] = None) -> None:
+        self.paths : List[str] = list(paths or [])
+        self._ids : Dict[str, int] = {path: i for i, path in enumerate(self.paths)}
+        self._maps : Dict[int, mmap.mmap] = {}
+        self._lock = threading.Lock()
+
+    def register(self, file_path : str) -> int:
+        """
+        Returns:
+            The file id of file_path, registering it on first use
+        """
+        file_path = os.path.abspath(file_path)
+        with self._lock:
+            if file_path not in self._ids:
+                self._ids[file_path] = len(self.paths)
+                self.paths.append(file_path)
+            return self._ids[file_path]
+
+    def rename_source(self, old : str, new : str):
+        """
+        Points the chunks of a rotated file (app.log -> app.log.1) to its new path, the path
+        itself is a new file by then and its offsets would not match
+        """
+        old, new = os.path.abspath(old), os.path.abspath(new)
+        with self._lock:
+            file_id = self._ids.pop(old, None)
+            if file_id is None:
+                return
+            self.paths[file_id] = new
+            self._ids.setdefault(new, file_id)
+            mapped = self._maps.pop(file_id, None)
+            if mapped is not None:
+                mapped.close()
+
+    def _map(self, file_id : int, min_size : int) -> mmap.mmap:
+        mapped = self._maps.get(file_id)
+        if mapped is None or len(mapped) < min_size:
+            # (re)map, the file may have grown since it was mapped
+            if mapped is not None:
+                mapped.close()
+            with open(self.paths[file_id], 'rb') as f:
+                mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            self._maps[file_id] = mapped
+        return mapped
+
+    def read(self, ref : ChunkRef) -> str:
+        with self._lock:
+            try:
+                mapped = self._map(ref.file_id, ref.end)
+            except (OSError, ValueError, IndexError) as e:
+                return f"<log text unavailable: {e}>"
+            return mapped[ref.start:ref.end].decode('utf-8', errors='replace')
+
+    def resolve(self, document : Document) -> str:
+        """
+        Text of a stored document, reading it from the log file when it is a ChunkRef
+        """
+        if isinstance(document, ChunkRef):
+            return self.read(document)
+        return document
+
+    def close(self):
+        with self._lock:
+            for mapped in self._maps.values():
+                mapped.close()
+            self._maps = {}
+
+    def __getstate__(self):
+        return {"paths": self.paths}
+
+    def __setstate__(self, state):
+        self.__init__(state["paths"])
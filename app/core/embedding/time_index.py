@@ -0,0 +1,258 @@
+from array import array
+from bisect import bisect_left
+from datetime import datetime, timedelta
+from typing_extensions import Any, Dict, Iterator, List, Optional, Tuple
+import heapq
+import mmap
+import os
+import pickle
+import threading
+
+from .columns import to_millis, from_millis, MISSING_TIME
+from .log_chunker import LogChunker, file_time
+from .sources import is_gzip, open_log
+from .types import Log
+
+# one (timestamp, offset, line) sample every this many lines, a lookup scans at most that many lines before the range
+SAMPLE_EVERY = int(os.getenv('TIME_INDEX_EVERY', 256))
+# a range is read until a line this far past its end, lines logged a little out of order
+# (second precision timestamps next to millisecond ones, several writers) are still found
+MAX_DISORDER = timedelta(seconds=2)
+
+class _FileIndex:
+    """
+    Samples of one file. times holds the highest timestamp seen up to each sample (a high-water mark),
+    so it never decreases even when lines are slightly out of order and can be binary searched.
+    """
+    def __init__(self, service : Optional[str]) -> None:
+        self.service = service
+        self.times = array("q")
+        self.offsets = array("q")
+        self.lines = array("q")
+
+class TimeIndexObserver:
+    """
+    Records a sample of one file's lines (see LogChunker.invoke's line_observer): the first timestamped
+    line and then the first timestamped line after every `every` lines.
+    """
+    def __init__(self, source : str, service : Optional[str], every : int = SAMPLE_EVERY, first_line : int = 0) -> None:
+        self.source = source
+        self.service = service
+        self.every = every
+        self.samples = _FileIndex(service)
+        self._line = first_line
+        self._last_sample = -every
+        self._high = MISSING_TIME
+
+    def next_batch(self) -> "TimeIndexObserver":
+        """
+        Empty observer continuing this one, for files ingested in batches
+        """
+        observer = TimeIndexObserver(self.source, self.service, self.every, first_line=self._line)
+        observer._last_sample = self._last_sample
+        observer._high = self._high
+        return observer
+
+    def add(self, log : Log, offset : int):
+        line = self._line
+        self._line += 1
+        if log["timestamp"] is None:
+            return
+        self._high = max(self._high, to_millis(log["timestamp"]))
+        if line - self._last_sample >= self.every:
+            self.samples.times.append(self._high)
+            self.samples.offsets.append(offset)
+            self.samples.lines.append(line)
+            self._last_sample = line
+
+class LogTimeIndex:
+    """
+    Sparse timestamp -> byte offset index of every ingested file. A time range is read by binary
+    searching the samples for the last one before the range and scanning the file from there
+    (mmap for plain files), so a lookup costs O(log n) plus at most `every` lines plus the answer.
+    """
+    def __init__(self, every : int = SAMPLE_EVERY, disorder : timedelta = MAX_DISORDER) -> None:
+        self.every = every
+        self.disorder = disorder
+        self._files : Dict[str, _FileIndex] = {}
+        self._lock = threading.Lock()
+        self._parser = LogChunker()
+
+    def observer(self, source : str, service : Optional[str] = None, first_line : int = 0) -> TimeIndexObserver:
+        return TimeIndexObserver(source, service, self.every, first_line)
+
+    def merge(self, observer : TimeIndexObserver):
+        with self._lock:
+            target = self._files.get(observer.source)
+            # a file ingested again from its start replaces its samples, they must stay in file order
+            if target is None or (len(observer.samples.lines) and len(target.lines)
+                                  and observer.samples.lines[0] <= target.lines[-1]):
+                self._files[observer.source] = observer.samples
+                return
+            target.times.extend(observer.samples.times)
+            target.offsets.extend(observer.samples.offsets)
+            target.lines.extend(observer.samples.lines)
+
+    def rename_source(self, old : str, new : str):
+        """
+        Moves the samples of a rotated file to its new path (app.log -> app.log.1)
+        """
+        with self._lock:
+            if old in self._files:
+                self._files[new] = self._files.pop(old)
+
+    def __len__(self) -> int:
+        return sum(len(samples.times) for samples in self._files.values())
+
+    def drop_before(self, cutoff : datetime) -> int:
+        """
+        Drops the samples before cutoff, the last one before it is kept as the entry point of later lines
+        Returns:
+            The number of samples dropped
+        """
+        cutoff_ms = to_millis(cutoff)
+        dropped = 0
+        with self._lock:
+            for samples in self._files.values():
+                keep_from = max(0, bisect_left(samples.times, cutoff_ms) - 1)
+                if keep_from:
+                    for column in (samples.times, samples.offsets, samples.lines):
+                        del column[:keep_from]
+                    dropped += keep_from
+        return dropped
+
+    def _entry(self, samples : _FileIndex, start : Optional[datetime]) -> Tuple[int, int, Optional[datetime]]:
+        """
+        (offset, line, time) to scan from: the last sample whose high-water mark is before start, its time
+        dates the year-less lines after it like ingest did (None from the file's start)
+        """
+        if start is None:
+            return 0, 0, None
+        i = bisect_left(samples.times, to_millis(start)) - 1
+        if i < 0:
+            return 0, 0, None
+        return samples.offsets[i], samples.lines[i], from_millis(samples.times[i])
+
+    @staticmethod
+    def _read_lines(path : str, offset : int) -> Iterator[Tuple[int, bytes]]:
+        if is_gzip(path):
+            # gzip seeks by decompressing up to the offset, still no parsing of the skipped part
+            with open_log(path, binary=True) as f:
+                f.seek(offset)
+                for raw in f:
+                    yield offset, raw
+                    offset += len(raw)
+            return
+        with open(path, "rb") as f:
+            if os.fstat(f.fileno()).st_size <= offset:
+                return
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                size = len(mapped)
+                while offset < size:
+                    end = mapped.find(b"\n", offset)
+                    end = size if end < 0 else end + 1
+                    yield offset, mapped[offset:end]
+                    offset = end
+
+    def _scan(self, path : str, samples : _FileIndex, start : Optional[datetime], end : Optional[datetime],
+              limit : int, resume : Optional[Tuple[int, int, int]] = None) -> Tuple[List[Dict[str, Any]], Optional[Tuple], int]:
+        """
+        Lines of one file inside [start, end], undated lines follow the timestamp before them
+        Args:
+            resume : (offset, line, timestamp ms) of a cursor to continue from instead of the index's entry point
+        Returns:
+            (up to limit lines, each with its own resume position under "_resume"; the resume position of the
+            next line in the range or None when the file has no more; lines scanned)
+        """
+        if resume is not None:
+            offset, line, carried = resume
+            timestamp = from_millis(carried)
+            reference = timestamp
+        else:
+            offset, line, reference = self._entry(samples, start)
+            timestamp = None
+        # year-less syslog lines get their year as during ingest: from the dated line before, else the file's mtime
+        reference = reference or file_time(path)
+        results : List[Dict[str, Any]] = []
+        scanned = 0
+        for position, raw in self._read_lines(path, offset):
+            scanned += 1
+            text = raw.decode("utf-8", errors="replace").rstrip()
+            parsed = self._parser._parse_log_line(text, reference)["timestamp"] if text else None
+            if parsed is not None:
+                timestamp = reference = parsed
+            line += 1
+            if end is not None and timestamp is not None and timestamp > end:
+                if timestamp > end + self.disorder:
+                    break
+                continue
+            if not text or (start is not None and (timestamp is None or timestamp < start)):
+                continue
+            here = (position, line - 1, to_millis(timestamp) if timestamp is not None else MISSING_TIME)
+            if len(results) == limit:
+                return results, here, scanned
+            results.append({"source": path, "service": samples.service, "line": line, "timestamp": timestamp,
+                            "text": text, "_resume": here})
+        return results, None, scanned
+
+    def read_range(self, start : Optional[datetime] = None, end : Optional[datetime] = None,
+                   service : Optional[str] = None, max_lines : int = 200,
+                   cursor : Optional[Dict[str, List[int]]] = None) -> Dict[str, Any]:
+        """
+        Reads the logged lines inside [start, end] from every indexed file (optionally of one service)
+        Args:
+            start, end : the time range, open when None
+            service : only this service's files
+            max_lines : lines returned at most, earliest first
+            cursor : the cursor of a truncated result, continues right after its last line (same range and service)
+        Returns:
+            dict with lines (source, service, 1-based line like LogColumns.read_rows, timestamp, text; in file order,
+            files interleaved by time), truncated (more lines are in the range), cursor (where the next call
+            continues, None when nothing is left) and scanned (lines read from the files)
+        """
+        with self._lock:
+            files = [(path, samples) for path, samples in self._files.items()
+                     if (service is None or samples.service == service) and (cursor is None or path in cursor)]
+        per_file = []
+        pending : Dict[str, Tuple] = {}
+        scanned = 0
+        for path, samples in files:
+            try:
+                lines, more, read = self._scan(path, samples, start, end, max_lines,
+                                               tuple(cursor[path]) if cursor is not None else None)
+            except OSError as e:
+                print(f"[TimeIndex] Cannot read {path}: {e}")
+                continue
+            per_file.append(lines)
+            if more is not None:
+                pending[path] = more
+            scanned += read
+        merged = list(heapq.merge(*per_file, key=lambda line: line["timestamp"] or datetime.min))
+        # a file continues at its first line not returned, or after its last scanned line
+        for line in reversed(merged[max_lines:]):
+            pending[line["source"]] = line["_resume"]
+        for line in merged:
+            del line["_resume"]
+        return {"lines": merged[:max_lines], "truncated": bool(pending),
+                "cursor": {path: list(position) for path, position in pending.items()} or None, "scanned": scanned}
+
+    def save(self, path : str):
+        with self._lock:
+            with open(path, "wb") as f:
+                pickle.dump({"every": self.every, "files": self._files}, f)
+
+    def load(self, path : str):
+        with open(path, "rb") as f:
+            state = pickle.load(f)
+        with self._lock:
+            self.every = state["every"]
+            self._files = state["files"]
+
+def time_index_path(store_path : str) -> str:
+    """
+    The time index is saved next to the index store: data/store.pkl -> data/store.times.pkl
+    """
+    root, _ = os.path.splitext(store_path)
+    return f"{root}.times.pkl"
+
+__all__ = ['LogTimeIndex', 'TimeIndexObserver', 'time_index_path']
@@ -1,4 +1,4 @@
-from typing_extensions import Optional, TypedDict
+from typing_extensions import NotRequired, Optional, TypedDict
 from datetime import datetime
 
 class Log(TypedDict):
@@ -11,6 +11,16 @@ class ChunkMetaData(TypedDict):
     start_timestamp : Optional[datetime]
     end_timestamp : Optional[datetime]
     has_error : bool
+    source : Optional[str]
+    service : Optional[str]
+    occurrences : int
+    last_seen : Optional[datetime]
+    start_offset : Optional[int]
+    end_offset : Optional[int]
+    start_line : Optional[int]
+    end_line : Optional[int]
+    # windows this chunk stands for when ingestion sampled routine windows (see SamplingPolicy)
+    sample_weight : NotRequired[float]
 
 class Chunk(TypedDict):
     text : str
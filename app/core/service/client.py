@@ -0,0 +1,172 @@
+from datetime import datetime
+from http.client import HTTPConnection
+from typing_extensions import Any, Dict, List, Optional, Sequence
+from urllib.parse import urlparse
+import json
+import os
+import socket
+
+import numpy as np
+
+# metadata keys sent as ISO strings and turned back into datetimes
+_TIMESTAMP_KEYS = ("start_timestamp", "end_timestamp", "last_seen")
+
+class ServiceUnavailable(Exception):
+    """Raised when the index service cannot be reached"""
+
+class _UnixHTTPConnection(HTTPConnection):
+    def __init__(self, path : str, timeout : float) -> None:
+        super().__init__("localhost", timeout=timeout)
+        self._path = path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(self.timeout)
+        self.sock.connect(self._path)
+
+class ServiceClient:
+    """
+    JSON over HTTP client of the index service (see app.core.service.server)
+    """
+    def __init__(self, url : str, timeout : float = 600, token : Optional[str] = None) -> None:
+        """
+        Args:
+            url : http://host:port or unix:///path/to.sock
+            timeout : seconds per request (opening a dataset indexes it on first use)
+            token : the service token (default INDEX_SERVICE_TOKEN)
+        """
+        self.url = url
+        self.timeout = timeout
+        self.token = token if token is not None else os.getenv('INDEX_SERVICE_TOKEN') or None
+        self._parsed = urlparse(url)
+
+    def _connection(self) -> HTTPConnection:
+        if self._parsed.scheme == "unix":
+            return _UnixHTTPConnection(self._parsed.path, self.timeout)
+        return HTTPConnection(self._parsed.hostname or "127.0.0.1", self._parsed.port or 8765, timeout=self.timeout)
+
+    def post(self, route : str, payload : Optional[Dict[str, Any]] = None):
+        connection = self._connection()
+        try:
+            headers = {"Content-Type": "application/json"}
+            if self.token:
+                headers["Authorization"] = f"Bearer {self.token}"
+            connection.request("POST", route, body=json.dumps(payload or {}), headers=headers)
+            response = connection.getresponse()
+            body = json.loads(response.read() or b"{}")
+        except (OSError, ValueError) as e:
+            raise ServiceUnavailable(f"{self.url}{route}: {e}") from e
+        finally:
+            connection.close()
+        if response.status == 400:
+            raise ValueError(body.get("error"))
+        if response.status == 403:
+            raise PermissionError(f"Index service refused {route}: {body.get('error')}")
+        if response.status != 200:
+            raise RuntimeError(f"Index service {route} failed: {body.get('error')}")
+        return body
+
+class RemoteEmbedder:
+    """Embedder calling the service, its model is loaded once for the whole host"""
+    def __init__(self, client : ServiceClient) -> None:
+        self._client = client
+
+    def embed(self, document : str):
+        return np.asarray(self._client.post("/embed", {"texts": [document]})[0], dtype="float32")
+
+    def embed_batch(self, documents : Sequence[str]):
+        return np.asarray(self._client.post("/embed", {"texts": list(documents)}), dtype="float32")
+
+class _RemoteRollups:
+    def __init__(self, client : ServiceClient, dataset : str) -> None:
+        self._client = client
+        self._dataset = dataset
+
+    def query(self, start : Optional[datetime] = None, end : Optional[datetime] = None, **query) -> Dict[str, Any]:
+        query.update({key: value.isoformat() for key, value in (("start", start), ("end", end)) if value is not None})
+        return self._client.post("/stats", {"dataset": self._dataset, **query})
+
+class RemoteQueryEngine:
+    """LogQueryEngine counterpart running the spec on the service's columns"""
+    def __init__(self, client : ServiceClient, dataset : str) -> None:
+        self._client = client
+        self._dataset = dataset
+
+    def run(self, spec) -> Dict[str, Any]:
+        return self._client.post("/analytics", {"dataset": self._dataset, "spec": spec.model_dump()})
+
+class RemotePipeline:
+    """
+    Client side stand-in for a VectorPipeline served by the index service: query, rollups,
+    analytics, embedder and fingerprint behave like the local ones, but the model and the
+    index live once in the service for every agent on the host.
+    """
+    def __init__(self, client : ServiceClient, dataset : str) -> None:
+        self._client = client
+        self.dataset = dataset
+        self.embedder = RemoteEmbedder(client)
+        self.rollups = _RemoteRollups(client, dataset)
+        self.query_engine = RemoteQueryEngine(client, dataset)
+
+    @classmethod
+    def connect(cls, url : str, db_type : str, log_file_path : Optional[str] = None, faiss_path : Optional[str] = None,
+                store_path : Optional[str] = None) -> "RemotePipeline":
+        """
+        Opens (or joins) the service's dataset for these paths, indexing it there on first use
+        Raises:
+            ServiceUnavailable : the service is not running
+        """
+        client = ServiceClient(url)
+        dataset = client.post("/open", {"db_type": db_type, "log_file_path": log_file_path,
+                                        "faiss_path": faiss_path, "store_path": store_path})["dataset"]
+        print(f"[RemotePipeline] Using dataset {dataset} of the index service at {url}")
+        return cls(client, dataset)
+
+    def query(self, text : str, k : int = 3, start : Optional[datetime] = None, end : Optional[datetime] = None,
+              service : Optional[str] = None) -> List[Dict[str, Any]]:
+        hits = self._client.post("/search", {"dataset": self.dataset, "text": text, "k": k, "service": service,
+                                             "start": start.isoformat() if start else None,
+                                             "end": end.isoformat() if end else None})
+        for hit in hits:
+            metadata = hit.get("metadata") or {}
+            for key in _TIMESTAMP_KEYS:
+                if isinstance(metadata.get(key), str):
+                    metadata[key] = datetime.fromisoformat(metadata[key])
+        return hits
+
+    def query_lines(self, text : str, k : int = 5, candidates : Optional[int] = None, context : Optional[int] = None,
+                    start : Optional[datetime] = None, end : Optional[datetime] = None,
+                    service : Optional[str] = None) -> List[Dict[str, Any]]:
+        hits = self._client.post("/search_lines", {"dataset": self.dataset, "text": text, "k": k, "candidates": candidates,
+                                                   "context": context, "service": service,
+                                                   "start": start.isoformat() if start else None,
+                                                   "end": end.isoformat() if end else None})
+        for hit in hits:
+            hit["context"] = [tuple(line) for line in hit["context"]]
+        return hits
+
+    def read_range(self, start : Optional[datetime] = None, end : Optional[datetime] = None,
+                   service : Optional[str] = None, max_lines : int = 200,
+                   cursor : Optional[Dict[str, List[int]]] = None) -> Dict[str, Any]:
+        result = self._client.post("/range", {"dataset": self.dataset, "service": service, "max_lines": max_lines,
+                                              "cursor": cursor,
+                                              "start": start.isoformat() if start else None,
+                                              "end": end.isoformat() if end else None})
+        for line in result["lines"]:
+            if isinstance(line.get("timestamp"), str):
+                line["timestamp"] = datetime.fromisoformat(line["timestamp"])
+        return result
+
+    def fingerprint(self) -> str:
+        return self._client.post("/fingerprint", {"dataset": self.dataset})["fingerprint"]
+
+    def create_db(self, file_path : str, **_):
+        self._client.post("/ingest", {"dataset": self.dataset, "path": file_path})
+
+    def start_tail(self, file_path : str) -> List[str]:
+        return self._client.post("/tail", {"dataset": self.dataset, "path": file_path})["tailed"]
+
+    def memory_report(self) -> Dict[str, Any]:
+        return self._client.post("/metrics")["datasets"].get(self.dataset, {})
+
+__all__ = ['RemotePipeline', 'RemoteEmbedder', 'RemoteQueryEngine', 'ServiceClient', 'ServiceUnavailable']
@@ -0,0 +1,369 @@
+from concurrent.futures import Future
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from socketserver import ThreadingMixIn, UnixStreamServer
+from typing_extensions import Any, Callable, Dict, List, Optional, Sequence
+from urllib.parse import urlparse
+import argparse
+import hashlib
+import hmac
+import json
+import os
+import socket
+import tempfile
+import threading
+import time
+
+import numpy as np
+
+from app.core.embedding.embedder import get_shared_embedder
+from app.core.embedding.pipeline import VectorPipeline, open_pipeline
+from app.core.embedding.live import LogTailer
+from app.core.embedding.sources import is_gzip, resolve_log_files
+from app.core.analytics.engine import LogQueryEngine
+from app.core.analytics.spec import LogQuerySpec
+
+# a unix socket by default: file permissions decide who may connect, see serve()
+DEFAULT_URL = (f"unix://{os.path.join(tempfile.gettempdir(), 'log-index.sock')}" if hasattr(socket, "AF_UNIX")
+               else "http://127.0.0.1:8765")
+
+class EmbedBatcher:
+    """
+    Embedder wrapper that coalesces concurrent embed() calls: texts arriving within max_delay
+    seconds of each other are embedded in one embed_batch forward pass, and a text already
+    queued or being embedded is not embedded twice. embed_batch (ingest) goes straight through.
+    """
+    def __init__(self, embedder, max_batch : int = 64, max_delay : float = 0.005) -> None:
+        self._embedder = embedder
+        # ingest batches follow the wrapped embedder (see VectorPipeline.create_db)
+        self.batch_size = getattr(embedder, 'batch_size', 32)
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self._queue : List[str] = []
+        self._inflight : Dict[str, Future] = {}
+        self._cond = threading.Condition()
+        self.stats = {"texts": 0, "coalesced": 0, "batches": 0}
+        threading.Thread(target=self._run, name="embed-batcher", daemon=True).start()
+
+    def embed(self, document : str):
+        with self._cond:
+            self.stats["texts"] += 1
+            future = self._inflight.get(document)
+            if future is None:
+                future = self._inflight[document] = Future()
+                self._queue.append(document)
+                self._cond.notify()
+            else:
+                self.stats["coalesced"] += 1
+        return future.result()
+
+    def embed_batch(self, documents : Sequence[str]):
+        return self._embedder.embed_batch(documents)
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._queue:
+                    self._cond.wait()
+            # give concurrent callers a moment to join the batch
+            time.sleep(self.max_delay)
+            with self._cond:
+                batch, self._queue = self._queue[:self.max_batch], self._queue[self.max_batch:]
+            try:
+                vectors = self._embedder.embed_batch(batch)
+            except Exception as e:
+                vectors = e
+            with self._cond:
+                self.stats["batches"] += 1
+                for i, document in enumerate(batch):
+                    future = self._inflight.pop(document)
+                    if isinstance(vectors, Exception):
+                        future.set_exception(vectors)
+                    else:
+                        future.set_result(vectors[i])
+
+class SingleFlight:
+    """Concurrent calls with the same key share one execution and its result"""
+    def __init__(self) -> None:
+        self._inflight : Dict[Any, Future] = {}
+        self._lock = threading.Lock()
+        self.coalesced = 0
+
+    def do(self, key, fn : Callable[[], Any]):
+        with self._lock:
+            future = self._inflight.get(key)
+            leader = future is None
+            if leader:
+                future = self._inflight[key] = Future()
+            else:
+                self.coalesced += 1
+        if not leader:
+            return future.result()
+        try:
+            future.set_result(fn())
+        except Exception as e:
+            future.set_exception(e)
+        finally:
+            with self._lock:
+                del self._inflight[key]
+        return future.result()
+
+def dataset_id(db_type : str, log_file_path : Optional[str], faiss_path : Optional[str], store_path : Optional[str]) -> str:
+    paths = [os.path.abspath(path) if path else "" for path in (log_file_path, faiss_path, store_path)]
+    return hashlib.blake2b("|".join([db_type] + paths).encode(), digest_size=8).hexdigest()
+
+class IndexService:
+    """
+    Owns the embedder and one pipeline per dataset (log file / persisted store) for every client on the host.
+    Opening a dataset another client already opened is free, concurrent opens build it once.
+    Clients can only open, ingest and tail files under the allowed roots, the service reads them with its owner's rights.
+    """
+    def __init__(self, embedder=None, roots : Optional[Sequence[str]] = None) -> None:
+        """
+        Args:
+            embedder : embedder shared by every dataset (default: the process wide one)
+            roots : directories clients may read logs and stores from
+                    (default: INDEX_SERVICE_ROOTS, os.pathsep separated, else the working directory)
+        """
+        if roots is None:
+            roots = [root for root in os.getenv('INDEX_SERVICE_ROOTS', '').split(os.pathsep) if root] or [os.getcwd()]
+        self.roots = [os.path.realpath(root) for root in roots]
+        self.embedder = EmbedBatcher(embedder if embedder is not None else get_shared_embedder())
+        self._datasets : Dict[str, VectorPipeline] = {}
+        self._engines : Dict[str, LogQueryEngine] = {}
+        self._tailers : Dict[str, LogTailer] = {}
+        self._lock = threading.Lock()
+        self._opens = SingleFlight()
+        self._searches = SingleFlight()
+        self.requests : Dict[str, int] = {}
+
+    def _pipeline(self, dataset : str) -> VectorPipeline:
+        pipe = self._datasets.get(dataset)
+        if pipe is None:
+            raise KeyError(f"Unknown dataset {dataset}, open it first")
+        return pipe
+
+    def _check_path(self, path : str):
+        """
+        Raises:
+            PermissionError when path (or a file it resolves to, for directories and globs) is outside the allowed roots
+        """
+        for file_path in resolve_log_files(path) or [path]:
+            real = os.path.realpath(file_path)
+            if not any(real == root or real.startswith(root + os.sep) for root in self.roots):
+                raise PermissionError(f"{path} is outside the directories this service serves")
+
+    def open(self, db_type : str, log_file_path : Optional[str] = None, faiss_path : Optional[str] = None,
+             store_path : Optional[str] = None) -> Dict[str, Any]:
+        for path in (log_file_path, faiss_path, store_path):
+            if path:
+                self._check_path(path)
+        dataset = dataset_id(db_type, log_file_path, faiss_path, store_path)
+        if dataset not in self._datasets:
+            def build():
+                if dataset not in self._datasets:
+                    started = time.perf_counter()
+                    pipe = open_pipeline(db_type, log_file_path, faiss_path, store_path, embedder=self.embedder)
+                    with self._lock:
+                        self._datasets[dataset] = pipe
+                        self._engines[dataset] = LogQueryEngine(pipe.columns)
+                    print(f"[Service] Opened dataset {dataset} ({db_type}, {log_file_path or store_path}) in {time.perf_counter() - started:.1f}s")
+            self._opens.do(dataset, build)
+        return {"dataset": dataset}
+
+    def search(self, dataset : str, text : str, k : int = 3, start : Optional[str] = None, end : Optional[str] = None,
+               service : Optional[str] = None) -> List[Dict[str, Any]]:
+        pipe = self._pipeline(dataset)
+        key = (dataset, text, k, start, end, service)
+        return self._searches.do(key, lambda: pipe.query(text, k, start=datetime.fromisoformat(start) if start else None,
+                                                         end=datetime.fromisoformat(end) if end else None, service=service))
+
+    def search_lines(self, dataset : str, text : str, k : int = 5, candidates : Optional[int] = None,
+                     context : Optional[int] = None, start : Optional[str] = None, end : Optional[str] = None,
+                     service : Optional[str] = None) -> List[Dict[str, Any]]:
+        pipe = self._pipeline(dataset)
+        key = ("lines", dataset, text, k, candidates, context, start, end, service)
+        return self._searches.do(key, lambda: pipe.query_lines(text, k, candidates, context,
+                                                               start=datetime.fromisoformat(start) if start else None,
+                                                               end=datetime.fromisoformat(end) if end else None,
+                                                               service=service))
+
+    def read_range(self, dataset : str, start : Optional[str] = None, end : Optional[str] = None,
+                   service : Optional[str] = None, max_lines : int = 200,
+                   cursor : Optional[Dict[str, List[int]]] = None) -> Dict[str, Any]:
+        return self._pipeline(dataset).read_range(start=datetime.fromisoformat(start) if start else None,
+                                                  end=datetime.fromisoformat(end) if end else None,
+                                                  service=service, max_lines=max_lines, cursor=cursor)
+
+    def embed(self, texts : List[str]) -> List[List[float]]:
+        if len(texts) == 1:
+            return [self.embedder.embed(texts[0]).tolist()]
+        return np.asarray(self.embedder.embed_batch(texts)).tolist()
+
+    def stats(self, dataset : str, **query) -> Dict[str, Any]:
+        for key in ("start", "end"):
+            if query.get(key):
+                query[key] = datetime.fromisoformat(query[key])
+        return self._pipeline(dataset).rollups.query(**query)
+
+    def analytics(self, dataset : str, spec : Dict[str, Any]) -> Dict[str, Any]:
+        self._pipeline(dataset)
+        return self._engines[dataset].run(LogQuerySpec(**spec))
+
+    def fingerprint(self, dataset : str) -> Dict[str, Any]:
+        return {"fingerprint": self._pipeline(dataset).fingerprint()}
+
+    def ingest(self, dataset : str, path : str) -> Dict[str, Any]:
+        pipe = self._pipeline(dataset)
+        self._check_path(path)
+        self._opens.do((dataset, "ingest", os.path.abspath(path)), lambda: pipe.create_db(path))
+        return {"fingerprint": pipe.fingerprint()}
+
+    def tail(self, dataset : str, path : str, poll_interval : float = 1.0) -> Dict[str, Any]:
+        pipe = self._pipeline(dataset)
+        self._check_path(path)
+        tailed = []
+        with self._lock:
+            for file_path in resolve_log_files(path):
+                if is_gzip(file_path):
+                    continue
+                key = f"{dataset}|{os.path.abspath(file_path)}"
+                if key not in self._tailers:
+                    self._tailers[key] = LogTailer(pipe, file_path, poll_interval=poll_interval).start()
+                tailed.append(file_path)
+        return {"tailed": tailed}
+
+    def close(self):
+        """
+        Stops every tailer and every dataset's background compactor
+        """
+        with self._lock:
+            tailers, self._tailers = list(self._tailers.values()), {}
+            pipes = list(self._datasets.values())
+        for tailer in tailers:
+            tailer.stop()
+        for pipe in pipes:
+            pipe.close()
+
+    def metrics(self) -> Dict[str, Any]:
+        return {
+            "datasets": {dataset: pipe.memory_report() for dataset, pipe in self._datasets.items()},
+            "requests": dict(self.requests),
+            "embed": dict(self.embedder.stats),
+            "coalesced_searches": self._searches.coalesced,
+            "tailers": {key.split("|", 1)[1]: tailer.stats for key, tailer in self._tailers.items()},
+        }
+
+    def handle(self, route : str, payload : Dict[str, Any]):
+        handlers = {
+            "/open": self.open, "/search": self.search, "/search_lines": self.search_lines, "/embed": self.embed,
+            "/stats": self.stats, "/analytics": self.analytics, "/fingerprint": self.fingerprint, "/ingest": self.ingest,
+            "/tail": self.tail, "/range": self.read_range, "/metrics": self.metrics,
+        }
+        if route not in handlers:
+            raise LookupError(route)
+        self.requests[route] = self.requests.get(route, 0) + 1
+        return handlers[route](**payload)
+
+def _encode(value):
+    if isinstance(value, datetime):
+        return value.isoformat(sep=" ")
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    return str(value)
+
+def make_handler(service : IndexService, token : Optional[str] = None):
+    expected = f"Bearer {token}".encode() if token else None
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            try:
+                if expected is not None and not hmac.compare_digest(self.headers.get("Authorization", "").encode(), expected):
+                    raise PermissionError("Missing or wrong service token")
+                length = int(self.headers.get("Content-Length") or 0)
+                payload = json.loads(self.rfile.read(length) or b"{}")
+                body, status = service.handle(urlparse(self.path).path, payload), 200
+            except PermissionError as e:
+                body, status = {"error": str(e)}, 403
+            except LookupError as e:
+                body, status = {"error": f"Not found: {e}"}, 404
+            except (ValueError, TypeError) as e:
+                body, status = {"error": str(e)}, 400
+            except Exception as e:
+                body, status = {"error": f"{type(e).__name__}: {e}"}, 500
+            data = json.dumps(body, default=_encode).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def address_string(self):
+            # unix socket peers have no address
+            return self.client_address[0] if self.client_address else "unix"
+
+        def log_message(self, format, *args):
+            pass
+    return Handler
+
+class UnixHTTPServer(ThreadingMixIn, UnixStreamServer):
+    daemon_threads = True
+    # a full unix socket backlog fails connects right away (EAGAIN) instead of queueing them
+    request_queue_size = 128
+
+class LocalHTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 128
+
+def serve(url : str = DEFAULT_URL, service : Optional[IndexService] = None, token : Optional[str] = None,
+          group : Optional[str] = None):
+    """
+    Serves an IndexService on unix:///path/to.sock or http://host:port
+    Args:
+        url : where to listen
+        service : the service (default: a new one)
+        token : clients must send it as 'Authorization: Bearer <token>' (default INDEX_SERVICE_TOKEN), required over HTTP
+                as any local user can reach a TCP port
+        group : group allowed to use the unix socket (default INDEX_SERVICE_GROUP, else the owner's group)
+    Returns:
+        The server, call serve_forever() on it
+    """
+    token = token if token is not None else os.getenv('INDEX_SERVICE_TOKEN') or None
+    group = group if group is not None else os.getenv('INDEX_SERVICE_GROUP') or None
+    service = service or IndexService()
+    parsed = urlparse(url)
+    if parsed.scheme == "unix":
+        if os.path.exists(parsed.path):
+            os.remove(parsed.path)
+        server = UnixHTTPServer(parsed.path, make_handler(service, token))
+        if group:
+            import grp
+            os.chown(parsed.path, -1, grp.getgrnam(group).gr_gid)
+        # the owner and the team's group may connect, nobody else
+        os.chmod(parsed.path, 0o660)
+    else:
+        if not token:
+            raise ValueError("Serving over HTTP needs a token (INDEX_SERVICE_TOKEN), or use a unix:// socket")
+        server = LocalHTTPServer((parsed.hostname or "127.0.0.1", parsed.port or 8765), make_handler(service, token))
+    return server
+
+def main():
+    parser = argparse.ArgumentParser(description="Shared embedding / index service for the log analysis agents")
+    parser.add_argument("--url", default=os.getenv("INDEX_SERVICE_URL", DEFAULT_URL),
+                        help=f"unix:///path/to.sock (default {DEFAULT_URL}) or http://127.0.0.1:8765 with INDEX_SERVICE_TOKEN")
+    args = parser.parse_args()
+    service = IndexService()
+    server = serve(args.url, service)
+    print(f"[Service] Listening on {args.url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        service.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+"""
+Benchmark entry point
+
+    python -m benchmarks --lines 2000
+    python -m benchmarks --only chunking embedding --compare benchmarks/results/<commit>.json
+    python -m benchmarks --model sentence-transformers/all-MiniLM-L6-v2
+"""
+import argparse
+import tempfile
+
+from .harness import format_table, load_results, save_results
+from .log_generator import TIMESTAMP_FORMATS
+from .stub_model import StubEmbedder
+from .suite import BENCHMARKS, make_context, run_suite
+
+
+def _build_embedder(model: str):
+    if model == "stub":
+        return StubEmbedder()
+    from app.core.embedding.embedder import Embedder
+    return Embedder(model)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Log analysis engine benchmarks")
+    parser.add_argument("--lines", type=int, default=2000, help="Number of synthetic log lines (default: 2000)")
+    parser.add_argument("--window", type=int, default=200, help="Chunk window size (default: 200, as in create_db)")
+    parser.add_argument("--queries", type=int, default=200, help="Number of search queries (default: 200)")
+    parser.add_argument("--seed", type=int, default=42, help="Generator seed (default: 42)")
+    parser.add_argument("--error-rate", type=float, default=0.02, help="Fraction of error lines (default: 0.02)")
+    parser.add_argument("--templates", type=int, default=50, help="Distinct message templates (default: 50)")
+    parser.add_argument("--formats", nargs="+", choices=list(TIMESTAMP_FORMATS), help="Timestamp formats, several are mixed line by line (default: iso)")
+    parser.add_argument("--model", default="stub", help="'stub' for the offline stub embedder or a sentence-transformers model name")
+    parser.add_argument("--only", nargs="+", choices=list(BENCHMARKS), help="Run only these benchmarks")
+    parser.add_argument("--no-memory", action="store_true", help="Skip the tracemalloc peak memory pass")
+    parser.add_argument("--out", help="Results file (default: benchmarks/results/<commit>.json)")
+    parser.add_argument("--compare", help="Previous results file to compare throughput against")
+    args = parser.parse_args()
+
+    config = vars(args).copy()
+    with tempfile.TemporaryDirectory() as work_dir:
+        ctx = make_context(
+            work_dir,
+            n_lines=args.lines,
+            window_size=args.window,
+            n_queries=args.queries,
+            embedder=_build_embedder(args.model),
+            seed=args.seed,
+            error_rate=args.error_rate,
+            templates=args.templates,
+            formats=args.formats,
+        )
+        results = run_suite(ctx, args.only, measure_memory=not args.no_memory)
+
+    baseline = load_results(args.compare) if args.compare else None
+    print(format_table(results, baseline))
+    print(f"\nResults saved to {save_results(results, config, args.out)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""
+Vector compression report: index memory saved and recall lost against the float32 IndexFlatL2
+
+    python -m benchmarks.compression --lines 5000
+    python -m benchmarks.compression --model sentence-transformers/all-MiniLM-L6-v2 --k 10
+"""
+import argparse
+import json
+import os
+import tempfile
+
+import numpy as np
+
+from app.core.embedding.indexer import InMemoryIndexer
+from app.core.embedding.log_chunker import LogChunker
+
+from .harness import RESULTS_DIR, git_commit
+from .log_generator import SyntheticLogGenerator
+from .stub_model import StubEmbedder
+from .suite import QUERIES
+
+# (label, compression, pca_dim)
+CONFIGS = [
+    ("fp16", "fp16", None),
+    ("int8", "int8", None),
+    ("pca128", None, 128),
+    ("pca128+int8", "int8", 128),
+    ("pca64+int8", "int8", 64),
+]
+
+
+def build(vectors: np.ndarray, compression, pca_dim) -> InMemoryIndexer:
+    # train on every vector: below train_size the indexer searches its buffer uncompressed
+    indexer = InMemoryIndexer(compression=compression, pca_dim=pca_dim, train_size=len(vectors))
+    indexer.add_batch(vectors, [""] * len(vectors), [{"row": row} for row in range(len(vectors))])
+    return indexer
+
+
+def top_rows(indexer: InMemoryIndexer, queries: np.ndarray, k: int) -> list[set]:
+    return [{hit["metadata"]["row"] for hit in indexer.search(q, k)} for q in queries]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Index compression memory / recall report")
+    parser.add_argument("--lines", type=int, default=5000)
+    parser.add_argument("--window", type=int, default=20, help="Chunk window (small windows give more vectors)")
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--model", default="stub", help="'stub' or a sentence-transformers model name")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        log_path = SyntheticLogGenerator(seed=args.seed).write(os.path.join(work_dir, "synthetic.log"), args.lines)
+        texts = [chunk['text'] for chunk in LogChunker().invoke(log_path, window_size=args.window)]
+
+    if args.model == "stub":
+        embedder = StubEmbedder()
+    else:
+        from app.core.embedding.embedder import Embedder
+        embedder = Embedder(args.model)
+    vectors = np.asarray(embedder.embed_batch(texts), dtype='float32')
+    # chunk texts double as queries so recall is measured on in-distribution vectors too
+    rng = np.random.default_rng(args.seed)
+    queries = np.concatenate([embedder.embed_batch(QUERIES), vectors[rng.choice(len(vectors), 50)]])
+
+    reference = build(vectors, None, None)
+    expected = top_rows(reference, queries, args.k)
+    report = {"float32": {**reference.memory_report(), "recall": 1.0}}
+    for label, compression, pca_dim in CONFIGS:
+        indexer = build(vectors, compression, pca_dim)
+        found = top_rows(indexer, queries, args.k)
+        recall = float(np.mean([len(e & f) / len(e) for e, f in zip(expected, found)]))
+        report[label] = {**indexer.memory_report(), "recall": recall}
+
+    print(f"{'config':<14}{'vectors':>9}{'bytes/vec':>11}{'index MB':>10}{'saved':>8}{f'recall@{args.k}':>11}")
+    for label, row in report.items():
+        print(f"{label:<14}{row['vectors']:>9}{row['bytes_per_vector']:>11}{row['index_bytes'] / 2**20:>10.2f}"
+              f"{row['saved_ratio']:>8.1%}{row['recall']:>11.1%}")
+
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    out_path = os.path.join(RESULTS_DIR, f"{git_commit()}-compression.json")
+    with open(out_path, "w", encoding="utf-8") as f:
+        json.dump({"config": vars(args), "report": report}, f, indent=2)
+    print(f"\nResults saved to {out_path}")
+
+
+if __name__ == "__main__":
+    main()
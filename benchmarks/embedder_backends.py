@@ -0,0 +1,92 @@
+"""
+Embedder backend comparison: throughput and retrieval overlap against the fp32 cpu model
+
+    python -m benchmarks.embedder_backends --lines 2000
+    python -m benchmarks.embedder_backends --backends cpu-int8 --threads 4 --max-seq-length 128
+"""
+import argparse
+import os
+import tempfile
+
+import faiss
+import numpy as np
+
+from app.core.embedding.embedder import BACKENDS, DEFAULT_MODEL, Embedder
+from app.core.embedding.log_chunker import LogChunker
+
+from .harness import BenchResult, Timer, format_table, run_benchmark, save_results
+from .log_generator import SyntheticLogGenerator
+from .suite import QUERIES
+
+
+def retrieval_overlap(reference: np.ndarray, candidate: np.ndarray, ref_queries: np.ndarray, cand_queries: np.ndarray, k: int) -> float:
+    """
+    Mean fraction of the reference top-k chunk ids also returned by the candidate embeddings
+    """
+    def top_k(vectors: np.ndarray, queries: np.ndarray) -> np.ndarray:
+        index = faiss.IndexFlatL2(vectors.shape[1])
+        index.add(vectors.astype('float32'))
+        return index.search(queries.astype('float32'), k)[1]
+
+    ref_ids, cand_ids = top_k(reference, ref_queries), top_k(candidate, cand_queries)
+    overlaps = [len(set(r) & set(c)) / k for r, c in zip(ref_ids, cand_ids)]
+    return float(np.mean(overlaps))
+
+
+def bench_backend(embedder: Embedder, texts: list[str], batch_size: int) -> tuple[BenchResult, np.ndarray]:
+    vectors: list[np.ndarray] = []
+
+    def body(timer: Timer) -> int:
+        vectors.clear()
+        for start in range(0, len(texts), batch_size):
+            with timer:
+                vectors.append(embedder.embed_batch(texts[start:start + batch_size]))
+        return len(texts)
+
+    result = run_benchmark(f"embed[{embedder.backend}]", body, unit="chunks", measure_memory=False)
+    return result, np.concatenate(vectors)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare Embedder backends")
+    parser.add_argument("--model", default=DEFAULT_MODEL)
+    parser.add_argument("--backends", nargs="+", default=["cpu-int8"], choices=[b for b in BACKENDS if b != 'auto'],
+                        help="Backends compared against the fp32 'cpu' reference (default: cpu-int8)")
+    parser.add_argument("--threads", type=int, help="torch intra-op threads for the candidates")
+    parser.add_argument("--max-seq-length", type=int, help="Token limit for the candidates")
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--lines", type=int, default=2000)
+    parser.add_argument("--window", type=int, default=200)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--out", help="Results file (default: benchmarks/results/<commit>-embedder.json)")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        log_path = SyntheticLogGenerator(seed=args.seed).write(os.path.join(work_dir, "synthetic.log"), args.lines)
+        texts = [chunk['text'] for chunk in LogChunker().invoke(log_path, window_size=args.window)]
+
+    reference = Embedder(args.model, backend='cpu', batch_size=args.batch_size)
+    ref_result, ref_vectors = bench_backend(reference, texts, args.batch_size)
+    ref_queries = reference.embed_batch(QUERIES)
+    results = [ref_result]
+    overlaps: dict[str, float] = {}
+
+    for backend in args.backends:
+        candidate = Embedder(args.model, backend=backend, num_threads=args.threads,
+                             max_seq_length=args.max_seq_length, batch_size=args.batch_size)
+        result, vectors = bench_backend(candidate, texts, args.batch_size)
+        overlaps[result["name"]] = retrieval_overlap(ref_vectors, vectors, ref_queries, candidate.embed_batch(QUERIES), args.k)
+        results.append(result)
+
+    print(format_table(results))
+    for name, overlap in overlaps.items():
+        print(f"{name}: top-{args.k} retrieval overlap with fp32 = {overlap:.1%}")
+
+    config = vars(args).copy()
+    config["retrieval_overlap"] = overlaps
+    print(f"\nResults saved to {save_results(results, config, args.out, suffix='-embedder')}")
+
+
+if __name__ == "__main__":
+    main()
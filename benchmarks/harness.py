@@ -0,0 +1,160 @@
+from typing_extensions import Any, Callable, Iterable, Optional, TypedDict
+from datetime import datetime, timezone
+import json
+import os
+import platform
+import subprocess
+import time
+import tracemalloc
+
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), "results")
+
+
+class BenchResult(TypedDict):
+    name : str
+    items : int
+    unit : str
+    total_s : float
+    throughput : float
+    p50_ms : Optional[float]
+    p95_ms : Optional[float]
+    p99_ms : Optional[float]
+    peak_mem_mb : Optional[float]
+
+
+def percentile(samples: list[float], pct: float) -> Optional[float]:
+    """Nearest-rank percentile of samples, None when there are no samples"""
+    if not samples:
+        return None
+    ordered = sorted(samples)
+    rank = max(0, min(len(ordered) - 1, round(pct / 100 * len(ordered) + 0.5) - 1))
+    return ordered[rank]
+
+
+class Timer:
+    """
+    Collects per-item latencies inside a benchmark body
+    Usage:
+        timer = Timer()
+        for item in items:
+            with timer:
+                work(item)
+    """
+    def __init__(self) -> None:
+        self.samples: list[float] = []
+        self._start = 0.0
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.samples.append(time.perf_counter() - self._start)
+        return False
+
+    def lap(self, start: float) -> float:
+        """Record the time since start and return the current clock"""
+        now = time.perf_counter()
+        self.samples.append(now - start)
+        return now
+
+
+def run_benchmark(name: str, body: Callable[[Timer], int], unit: str = "items", measure_memory: bool = True) -> BenchResult:
+    """
+    Runs body(timer) once for timing and, optionally, once more under tracemalloc
+    so the memory tracing does not distort the latency numbers.
+    Args:
+        name : benchmark name
+        body : callable doing the work, returns the number of processed items
+        unit : name of the processed items (lines, chunks, queries...)
+        measure_memory : also report peak python heap usage
+    Returns:
+        BenchResult
+    """
+    timer = Timer()
+    start = time.perf_counter()
+    items = body(timer)
+    total = time.perf_counter() - start
+
+    peak_mb = None
+    if measure_memory:
+        tracemalloc.start()
+        try:
+            body(Timer())
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        peak_mb = peak / (1024 * 1024)
+
+    to_ms = lambda value: None if value is None else value * 1000
+    return BenchResult(
+        name=name,
+        items=items,
+        unit=unit,
+        total_s=total,
+        throughput=items / total if total else 0.0,
+        p50_ms=to_ms(percentile(timer.samples, 50)),
+        p95_ms=to_ms(percentile(timer.samples, 95)),
+        p99_ms=to_ms(percentile(timer.samples, 99)),
+        peak_mem_mb=peak_mb,
+    )
+
+
+def git_commit() -> str:
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                             cwd=os.path.dirname(__file__), timeout=10)
+        return out.stdout.strip() or "unknown"
+    except (OSError, subprocess.SubprocessError):
+        return "unknown"
+
+
+def save_results(results: Iterable[BenchResult], config: dict[str, Any], out_path: Optional[str] = None, suffix: str = "") -> str:
+    """
+    Saves the results as json, by default to benchmarks/results/<commit><suffix>.json
+    Returns:
+        The path of the written file
+    """
+    commit = git_commit()
+    if out_path is None:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        out_path = os.path.join(RESULTS_DIR, f"{commit}{suffix}.json")
+    payload = {
+        "commit": commit,
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "config": config,
+        "results": list(results),
+    }
+    with open(out_path, "w", encoding="utf-8") as f:
+        json.dump(payload, f, indent=2)
+    return out_path
+
+
+def load_results(path: str) -> dict[str, Any]:
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def format_table(results: Iterable[BenchResult], baseline: Optional[dict[str, Any]] = None) -> str:
+    """
+    Formats results as a text table, with the throughput change against a baseline run if given
+    """
+    base = {r["name"]: r for r in baseline["results"]} if baseline else {}
+    fmt = lambda value: "-" if value is None else f"{value:.3f}"
+    header = f"{'benchmark':<22}{'items':>9}{'throughput/s':>15}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'peak MB':>10}"
+    if base:
+        header += f"{'vs base':>10}"
+    rows = [header, "-" * len(header)]
+    for r in results:
+        row = (f"{r['name']:<22}{r['items']:>9}{r['throughput']:>15.1f}"
+               f"{fmt(r['p50_ms']):>10}{fmt(r['p95_ms']):>10}{fmt(r['p99_ms']):>10}{fmt(r['peak_mem_mb']):>10}")
+        if base:
+            old = base.get(r["name"])
+            if old and old["throughput"]:
+                row += f"{(r['throughput'] / old['throughput'] - 1) * 100:>+9.1f}%"
+            else:
+                row += f"{'n/a':>10}"
+        rows.append(row)
+    return "\n".join(rows)
@@ -0,0 +1,159 @@
+from datetime import datetime, timedelta
+from typing_extensions import Iterator, Optional, Sequence, Tuple
+import os
+import random
+
+# Timestamp formats understood by LogChunker._parse_log_line.
+# syslog has no year: the parser takes it from the previous dated line, or the file's modification time
+TIMESTAMP_FORMATS = {
+    "iso": "%Y-%m-%d %H:%M:%S",
+    "iso_ms": "%Y-%m-%d %H:%M:%S.%f",
+    "slash": "%Y/%m/%d %H:%M:%S",
+    "syslog": "%b %d %H:%M:%S",
+}
+
+SERVICES = ["api", "auth", "billing", "camera", "scheduler", "storage", "worker", "gateway"]
+
+_SUBJECTS = ["request", "session", "job", "upload", "connection", "cache entry", "stream", "payment", "frame", "token"]
+_ACTIONS = ["processed", "queued", "completed", "started", "refreshed", "acknowledged", "resumed", "flushed"]
+_VARIABLES = [
+    "id={id}", "user={user}", "in {ms}ms", "from {ip}", "size={size}B", "attempt {attempt}", "path=/v1/{word}/{id}",
+]
+_ERROR_TEMPLATES = [
+    "Failed to connect to {ip} after {attempt} retries",
+    "Unhandled exception in {word} handler: TimeoutError",
+    "Database error: deadlock detected on table {word}",
+    "Critical: disk usage at {pct}% on volume {word}",
+    "Fatal error while decoding frame id={id}",
+]
+_WARNING_TEMPLATES = [
+    "Slow response from {word} service in {ms}ms",
+    "Retrying {word} request, attempt {attempt}",
+    "Queue depth {size} above soft limit",
+]
+_WORDS = ["orders", "users", "frames", "events", "metrics", "invoices", "devices", "alerts"]
+
+
+class SyntheticLogGenerator:
+    """
+    Deterministic generator of synthetic log files for benchmarks.
+    The same arguments always produce byte-identical output.
+    A file uses one timestamp format, like a real service, unless several formats are passed to mix.
+    """
+    def __init__(self,
+                 seed: int = 42,
+                 error_rate: float = 0.02,
+                 warning_rate: float = 0.05,
+                 debug_rate: float = 0.1,
+                 templates: int = 50,
+                 formats: Optional[Sequence[str]] = None,
+                 start: datetime = datetime(2025, 10, 5, 0, 0, 0),
+                 mean_interval_ms: int = 250) -> None:
+        """
+        Args:
+            seed : random seed
+            error_rate : fraction of ERROR/CRITICAL lines
+            warning_rate : fraction of WARNING lines
+            debug_rate : fraction of DEBUG lines (the rest are INFO)
+            templates : number of distinct INFO/DEBUG message templates
+            formats : timestamp formats, keys of TIMESTAMP_FORMATS (default: iso only). With several,
+                      each line picks one at random. syslog lines carry no year, write() sets the file's
+                      modification time to the last line so the parser dates them in the right year
+            start : timestamp of the first line
+            mean_interval_ms : average gap between two consecutive lines
+        """
+        if not 0 <= error_rate + warning_rate + debug_rate <= 1:
+            raise ValueError("error_rate + warning_rate + debug_rate must be within [0, 1]")
+        if templates < 1:
+            raise ValueError("templates must be at least 1")
+        formats = list(formats or ["iso"])
+        unknown = [fmt for fmt in formats if fmt not in TIMESTAMP_FORMATS]
+        if unknown:
+            raise ValueError(f"Unknown timestamp formats: {unknown}")
+
+        self.seed = seed
+        self.error_rate = error_rate
+        self.warning_rate = warning_rate
+        self.debug_rate = debug_rate
+        self.formats = formats
+        self.start = start
+        self.mean_interval_ms = mean_interval_ms
+        self.templates = self._build_templates(templates)
+
+    def _build_templates(self, count: int) -> list[str]:
+        rng = random.Random(self.seed)
+        templates = []
+        for i in range(count):
+            subject = _SUBJECTS[i % len(_SUBJECTS)]
+            action = _ACTIONS[(i // len(_SUBJECTS)) % len(_ACTIONS)]
+            variables = rng.sample(_VARIABLES, k=1 + i % 3)
+            templates.append(f"{subject.capitalize()} {action} " + " ".join(variables) + f" [t{i}]")
+        return templates
+
+    @staticmethod
+    def _fill(template: str, rng: random.Random) -> str:
+        return template.format(
+            id=rng.randint(1, 99999),
+            user=f"u{rng.randint(1, 500)}",
+            ms=rng.randint(1, 5000),
+            ip=f"10.0.{rng.randint(0, 255)}.{rng.randint(1, 254)}",
+            size=rng.randint(1, 1 << 20),
+            attempt=rng.randint(1, 5),
+            word=rng.choice(_WORDS),
+            pct=rng.randint(90, 100),
+        )
+
+    @staticmethod
+    def _format_timestamp(ts: datetime, fmt: str) -> str:
+        text = ts.strftime(TIMESTAMP_FORMATS[fmt])
+        if fmt == "iso_ms":
+            # _parse_log_line only matches millisecond precision
+            text = text[:-3]
+        return text
+
+    def lines(self, n_lines: int) -> Iterator[str]:
+        """
+        Yields n_lines log lines (without trailing newline)
+        """
+        for _, line in self._timed_lines(n_lines):
+            yield line
+
+    def _timed_lines(self, n_lines: int) -> Iterator[Tuple[datetime, str]]:
+        rng = random.Random(self.seed)
+        ts = self.start
+        # Zipf-like weights so a few templates dominate, like real services
+        weights = [1.0 / (rank + 1) for rank in range(len(self.templates))]
+        for _ in range(n_lines):
+            ts += timedelta(milliseconds=rng.expovariate(1.0 / self.mean_interval_ms))
+            roll = rng.random()
+            if roll < self.error_rate:
+                level = "CRITICAL" if rng.random() < 0.1 else "ERROR"
+                message = self._fill(rng.choice(_ERROR_TEMPLATES), rng)
+            elif roll < self.error_rate + self.warning_rate:
+                level = "WARNING"
+                message = self._fill(rng.choice(_WARNING_TEMPLATES), rng)
+            else:
+                level = "DEBUG" if roll < self.error_rate + self.warning_rate + self.debug_rate else "INFO"
+                message = self._fill(rng.choices(self.templates, weights=weights)[0], rng)
+            fmt = rng.choice(self.formats) if len(self.formats) > 1 else self.formats[0]
+            service = rng.choice(SERVICES)
+            yield ts, f"{self._format_timestamp(ts, fmt)} [{level}] {service}: {message}"
+
+    def write(self, file_path: str, n_lines: int) -> str:
+        """
+        Writes n_lines synthetic log lines to file_path, its modification time is the last line's timestamp
+        Returns:
+            The file path
+        """
+        last = self.start
+        with open(file_path, "w", encoding="utf-8") as f:
+            for last, line in self._timed_lines(n_lines):
+                f.write(line + "\n")
+        os.utime(file_path, (last.timestamp(), last.timestamp()))
+        return file_path
+
+
+if __name__ == "__main__":
+    generator = SyntheticLogGenerator()
+    for line in generator.lines(10):
+        print(line)
@@ -0,0 +1,42 @@
+from typing_extensions import Sequence
+import hashlib
+import re
+import numpy as np
+
+STUB_DIM = 384
+
+_TOKEN_RE = re.compile(r"[a-z]+|\d+")
+
+
+class StubEmbedder:
+    """
+    Offline stand-in for Embedder
+    Feature-hashes tokens into a fixed size vector, so it is deterministic,
+    needs no model download and keeps the same interface as Embedder.
+    """
+    def __init__(self, dim: int = STUB_DIM) -> None:
+        self.dim = dim
+        self.device = 'cpu'
+        self._buckets: dict[str, tuple[int, float]] = {}
+
+    def _bucket(self, token: str) -> tuple[int, float]:
+        if token in self._buckets:
+            return self._buckets[token]
+        digest = hashlib.blake2b(token.encode(), digest_size=8).digest()
+        value = int.from_bytes(digest, "little")
+        bucket = (value % self.dim, 1.0 if value >> 63 else -1.0)
+        self._buckets[token] = bucket
+        return bucket
+
+    def embed(self, document: str) -> np.ndarray:
+        vector = np.zeros(self.dim, dtype=np.float32)
+        for token in _TOKEN_RE.findall(document.lower()):
+            index, sign = self._bucket(token)
+            vector[index] += sign
+        norm = np.linalg.norm(vector)
+        if norm:
+            vector /= norm
+        return vector
+
+    def embed_batch(self, documents: Sequence[str]) -> np.ndarray:
+        return np.stack([self.embed(document) for document in documents]) if documents else np.zeros((0, self.dim), dtype=np.float32)
@@ -0,0 +1,179 @@
+from typing_extensions import Any, Callable, Optional
+import os
+import random
+import time
+
+from app.core.embedding.log_chunker import LogChunker
+from app.core.embedding.indexer import InMemoryIndexer
+from app.core.embedding.pipeline import VectorPipeline
+
+from .harness import BenchResult, Timer, run_benchmark
+from .log_generator import SyntheticLogGenerator
+
+QUERIES = [
+    "database deadlock errors",
+    "connection failures to the gateway",
+    "slow responses from the orders service",
+    "disk usage critical",
+    "session refreshed for user",
+    "unhandled exception in handler",
+    "queue depth above limit",
+    "payment processed",
+]
+
+
+class BenchContext:
+    """
+    Shared inputs for one benchmark run: the generated log file and the embedder
+    """
+    def __init__(self, log_path: str, generator: SyntheticLogGenerator, embedder: Any, window_size: int, n_queries: int) -> None:
+        self.log_path = log_path
+        self.generator = generator
+        self.embedder = embedder
+        self.window_size = window_size
+        self.n_queries = n_queries
+        self._chunks: Optional[list[str]] = None
+
+    @property
+    def chunk_texts(self) -> list[str]:
+        if self._chunks is None:
+            chunker = LogChunker()
+            self._chunks = [c['text'] for c in chunker.invoke(self.log_path, window_size=self.window_size)]
+        return self._chunks
+
+    def queries(self) -> list[str]:
+        rng = random.Random(self.generator.seed)
+        return [rng.choice(QUERIES) for _ in range(self.n_queries)]
+
+
+def bench_parsing(ctx: BenchContext) -> Callable[[Timer], int]:
+    with open(ctx.log_path, "r", encoding="utf-8") as f:
+        lines = [line.strip() for line in f]
+    chunker = LogChunker()
+
+    def body(timer: Timer) -> int:
+        for line in lines:
+            with timer:
+                chunker._parse_log_line(line)
+        return len(lines)
+    return body
+
+
+def bench_chunking(ctx: BenchContext) -> Callable[[Timer], int]:
+    chunker = LogChunker()
+
+    def body(timer: Timer) -> int:
+        count = 0
+        last = time.perf_counter()
+        for _ in chunker.invoke(ctx.log_path, window_size=ctx.window_size):
+            last = timer.lap(last)
+            count += 1
+        return count
+    return body
+
+
+def bench_embedding(ctx: BenchContext) -> Callable[[Timer], int]:
+    texts = ctx.chunk_texts
+
+    def body(timer: Timer) -> int:
+        for text in texts:
+            with timer:
+                ctx.embedder.embed(text)
+        return len(texts)
+    return body
+
+
+def bench_embedding_batch(ctx: BenchContext, batch_size: int = 32) -> Callable[[Timer], int]:
+    texts = ctx.chunk_texts
+
+    def body(timer: Timer) -> int:
+        for start in range(0, len(texts), batch_size):
+            with timer:
+                ctx.embedder.embed_batch(texts[start:start + batch_size])
+        return len(texts)
+    return body
+
+
+def _embeddings(ctx: BenchContext) -> list:
+    return list(ctx.embedder.embed_batch(ctx.chunk_texts))
+
+
+def bench_index_add(ctx: BenchContext) -> Callable[[Timer], int]:
+    texts = ctx.chunk_texts
+    vectors = _embeddings(ctx)
+
+    def body(timer: Timer) -> int:
+        indexer = InMemoryIndexer()
+        for vector, text in zip(vectors, texts):
+            with timer:
+                indexer.add(vector, text, metadata={})
+        return len(vectors)
+    return body
+
+
+def bench_index_search(ctx: BenchContext) -> Callable[[Timer], int]:
+    indexer = InMemoryIndexer()
+    for vector, text in zip(_embeddings(ctx), ctx.chunk_texts):
+        indexer.add(vector, text, metadata={})
+    query_vectors = [ctx.embedder.embed(q) for q in ctx.queries()]
+
+    def body(timer: Timer) -> int:
+        for vector in query_vectors:
+            with timer:
+                indexer.search(vector, k=3)
+        return len(query_vectors)
+    return body
+
+
+def bench_create_db(ctx: BenchContext, dedup: bool = True) -> Callable[[Timer], int]:
+    with open(ctx.log_path, "r", encoding="utf-8") as f:
+        n_lines = sum(1 for _ in f)
+
+    def body(timer: Timer) -> int:
+        pipeline = VectorPipeline(InMemoryIndexer, embedder=ctx.embedder, dedup=dedup)
+        with timer:
+            pipeline.create_db(ctx.log_path)
+        return n_lines
+    return body
+
+
+def bench_create_db_no_dedup(ctx: BenchContext) -> Callable[[Timer], int]:
+    return bench_create_db(ctx, dedup=False)
+
+
+# name -> (body factory, unit)
+BENCHMARKS: dict[str, tuple[Callable[[BenchContext], Callable[[Timer], int]], str]] = {
+    "parse_line": (bench_parsing, "lines"),
+    "chunking": (bench_chunking, "chunks"),
+    "embedding": (bench_embedding, "chunks"),
+    "embedding_batch": (bench_embedding_batch, "chunks"),
+    "index_add": (bench_index_add, "vectors"),
+    "index_search": (bench_index_search, "queries"),
+    "create_db": (bench_create_db, "lines"),
+    "create_db_no_dedup": (bench_create_db_no_dedup, "lines"),
+}
+
+
+def run_suite(ctx: BenchContext, names: Optional[list[str]] = None, measure_memory: bool = True) -> list[BenchResult]:
+    """
+    Runs the selected benchmarks (default: all) in declaration order
+    """
+    selected = names or list(BENCHMARKS)
+    unknown = [name for name in selected if name not in BENCHMARKS]
+    if unknown:
+        raise ValueError(f"Unknown benchmarks: {unknown}. Available: {list(BENCHMARKS)}")
+
+    results = []
+    for name in BENCHMARKS:
+        if name not in selected:
+            continue
+        factory, unit = BENCHMARKS[name]
+        print(f"[bench] {name} ...", flush=True)
+        results.append(run_benchmark(name, factory(ctx), unit=unit, measure_memory=measure_memory))
+    return results
+
+
+def make_context(work_dir: str, n_lines: int, window_size: int, n_queries: int, embedder: Any, **generator_kwargs) -> BenchContext:
+    generator = SyntheticLogGenerator(**generator_kwargs)
+    log_path = generator.write(os.path.join(work_dir, "synthetic.log"), n_lines)
+    return BenchContext(log_path, generator, embedder, window_size, n_queries)
@@ -2,6 +2,7 @@ from .prompts import SYSTEM_PROMPT
 from langgraph.graph import StateGraph, START, END
 from langgraph.graph.state import CompiledStateGraph
 from langchain_core.tools import BaseTool
+from langchain_core.runnables import RunnableConfig
 from langchain_openai import ChatOpenAI
 from langchain_core.messages import SystemMessage, AIMessage, ToolMessage
 from typing_extensions import Literal
@@ -9,18 +10,23 @@ from typing_extensions import Literal
 from .state import AgentState
 
 async def build_workflow(chat_model : ChatOpenAI, tools : list[BaseTool], tool_dict : dict[str, BaseTool])-> CompiledStateGraph:
+    """
+    Compiled once and shared by concurrent requests, per request values (log_file_path)
+    are passed in the run config's 'configurable' and forwarded to the tools
+    """
     model = chat_model.bind_tools(tools)
     async def llm_node(state: AgentState)-> dict:
         messages = [SystemMessage(content=SYSTEM_PROMPT.format(log_list=state['log_list'], max_executions=state['max_executions'], execution_count=state['execution_count']))] + state['messages']
         response = await model.ainvoke(messages)
         return {"messages" : [response]}
 
-    async def tool_node(state : AgentState) -> AgentState:
+    async def tool_node(state : AgentState, config : RunnableConfig) -> AgentState:
         last_message = state['messages'][-1]
+        log_file_path = config.get('configurable', {}).get('log_file_path')
         if isinstance(last_message, AIMessage):
             for tool_call in last_message.tool_calls:
                 tool = tool_dict[tool_call['name']]
-                tool_result = await tool.ainvoke(tool_call['args'], config={'configurable' : {'tool_call_id' : tool_call['id']}})
+                tool_result = await tool.ainvoke(tool_call['args'], config={'configurable' : {'tool_call_id' : tool_call['id'], 'log_file_path' : log_file_path}})
                 state['messages'].append(ToolMessage(content=tool_result, tool_call_id=tool_call['id']))
                 
         return state
@@ -10,6 +10,8 @@ The log file is always at '/app/log.txt' inside the tool.
 You must write the code by ovserving the provided log_list, it contains the structure of the logs present in the log file
 If you need to perform multiple steps to answer the query or need some data to construct data use the 'execute_python_code' or log_list tool
 gather some data and write the code to answer the query.
+Print only what the answer needs (counts, aggregates, a few example lines), never whole slices of the log:
+long output is cut to its head and tail, and the full text is kept in an artifact you can page through with 'read_artifact'.
 You can perform upto {max_executions} executions.
 Current Execution Count: {execution_count} 
 Do not answer from memory. Always write and run the code.
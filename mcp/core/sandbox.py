@@ -0,0 +1,198 @@
+import asyncio
+import os
+import re
+import tempfile
+import time
+import uuid
+from collections import deque
+from typing_extensions import Deque, List, Optional, TextIO, TypedDict
+
+# characters of each stream returned to the model, the rest is spilled to an artifact file
+MAX_OUTPUT_CHARS = int(os.getenv('SANDBOX_MAX_OUTPUT', 8000))
+SANDBOX_TIMEOUT = float(os.getenv('SANDBOX_TIMEOUT', 30))
+ARTIFACT_DIR = os.getenv('SANDBOX_ARTIFACT_DIR', os.path.join(tempfile.gettempdir(), 'log-analyzer-artifacts'))
+# newest artifacts kept on disk, older ones are deleted when a new one is written
+ARTIFACT_KEEP = int(os.getenv('SANDBOX_ARTIFACT_KEEP', 50))
+
+READ_SIZE = 1 << 16
+_ARTIFACT_ID_RE = re.compile(r"^[0-9a-f]{12}-(stdout|stderr)$")
+
+class BoundedOutput:
+    """
+    Keeps the first and last max_chars / 2 characters of a stream for the model. Once the stream
+    outgrows max_chars, everything (the kept head included) is written to an artifact file as it arrives,
+    so memory stays bounded whatever the code prints.
+    """
+    def __init__(self, name : str, max_chars : int = MAX_OUTPUT_CHARS, artifact_dir : str = ARTIFACT_DIR) -> None:
+        self.name = name
+        self.head_chars = max_chars // 2
+        self.tail_chars = max_chars - self.head_chars
+        self.artifact_dir = artifact_dir
+        self._head : List[str] = []
+        self._head_len = 0
+        self._tail : Deque[str] = deque()
+        self._tail_len = 0
+        self.total = 0
+        self.artifact_id : Optional[str] = None
+        self._spill : Optional[TextIO] = None
+
+    def write(self, text : str):
+        self.total += len(text)
+        if self._spill is None and self.total > self.head_chars + self.tail_chars:
+            self._open_spill()
+        if self._spill is not None:
+            self._spill.write(text)
+        if self._head_len < self.head_chars:
+            part = text[:self.head_chars - self._head_len]
+            self._head.append(part)
+            self._head_len += len(part)
+            text = text[len(part):]
+        if text:
+            self._tail.append(text)
+            self._tail_len += len(text)
+            while self._tail_len - len(self._tail[0]) >= self.tail_chars:
+                self._tail_len -= len(self._tail.popleft())
+
+    def _open_spill(self):
+        os.makedirs(self.artifact_dir, exist_ok=True)
+        self.artifact_id = f"{uuid.uuid4().hex[:12]}-{self.name}"
+        self._spill = open(artifact_path(self.artifact_id, self.artifact_dir), "w", encoding="utf-8")
+        # until now the head and tail held everything written
+        self._spill.write("".join(self._head) + "".join(self._tail))
+        _prune_artifacts(self.artifact_dir)
+
+    def close(self):
+        if self._spill is not None:
+            self._spill.close()
+            self._spill = None
+
+    def render(self) -> str:
+        """
+        The output for the model: all of it, or its head and tail around a note on what was cut
+        """
+        head = "".join(self._head)
+        tail = "".join(self._tail)
+        if self.artifact_id is None:
+            return head + tail
+        tail = tail[-self.tail_chars:]
+        cut = self.total - len(head) - len(tail)
+        note = (f"\n... [{cut} characters of {self.name} cut, {self.total} in total. The full output is in artifact "
+                f"'{self.artifact_id}', page through it with read_artifact or print less] ...\n")
+        return head + note + tail
+
+def artifact_path(artifact_id : str, artifact_dir : str = ARTIFACT_DIR) -> str:
+    if not _ARTIFACT_ID_RE.match(artifact_id):
+        raise ValueError(f"Invalid artifact id: {artifact_id}")
+    return os.path.join(artifact_dir, f"{artifact_id}.txt")
+
+def _prune_artifacts(artifact_dir : str):
+    try:
+        entries = sorted((entry for entry in os.scandir(artifact_dir) if entry.name.endswith(".txt")),
+                         key=lambda entry: entry.stat().st_mtime)
+        for entry in entries[:max(0, len(entries) - ARTIFACT_KEEP)]:
+            os.remove(entry.path)
+    except OSError:
+        pass
+
+def read_artifact(artifact_id : str, start_line : int = 0, max_lines : int = 200,
+                  max_chars : int = MAX_OUTPUT_CHARS, artifact_dir : str = ARTIFACT_DIR) -> str:
+    """
+    Lines [start_line, start_line + max_lines) of an artifact, cut to max_chars
+    """
+    try:
+        path = artifact_path(artifact_id, artifact_dir)
+    except ValueError as e:
+        return f"Error: {e}"
+    if not os.path.exists(path):
+        return f"Error: artifact '{artifact_id}' not found (artifacts are kept for the {ARTIFACT_KEEP} newest outputs)"
+    lines : List[str] = []
+    size = 0
+    next_line = start_line
+    total = 0
+    with open(path, encoding="utf-8", errors="replace") as f:
+        for number, line in enumerate(f):
+            total = number + 1
+            if number < start_line or len(lines) >= max_lines:
+                continue
+            if size + len(line) > max_chars:
+                if not lines:
+                    # a single line over the budget is cut, paging moves on to the next one
+                    lines.append(line[:max_chars] + " ...[line cut]\n")
+                    next_line = number + 1
+                # stop at the budget, the rest is one read_artifact call away
+                max_lines = len(lines)
+                continue
+            lines.append(line)
+            size += len(line)
+            next_line = number + 1
+    header = f"[artifact '{artifact_id}', lines {start_line}-{next_line - 1} of {total}"
+    header += f", continue with start_line={next_line}]\n" if next_line < total else "]\n"
+    return header + "".join(lines)
+
+class SandboxResult(TypedDict):
+    returncode : Optional[int]
+    stdout : str
+    stderr : str
+    timed_out : bool
+    elapsed_s : float
+    artifacts : List[str]
+
+async def _pump(stream : asyncio.StreamReader, output : BoundedOutput):
+    while True:
+        data = await stream.read(READ_SIZE)
+        if not data:
+            break
+        # split multi-byte characters are replaced, good enough for output meant to be read
+        output.write(data.decode("utf-8", errors="replace"))
+
+async def _stop(process : asyncio.subprocess.Process, on_timeout : Optional[List[str]]):
+    if on_timeout:
+        killer = await asyncio.create_subprocess_exec(*on_timeout, stdout=asyncio.subprocess.DEVNULL,
+                                                      stderr=asyncio.subprocess.DEVNULL)
+        await killer.wait()
+    if process.returncode is None:
+        process.kill()
+    await process.wait()
+
+async def run_streamed(command : List[str], timeout : float = SANDBOX_TIMEOUT, max_chars : int = MAX_OUTPUT_CHARS,
+                       on_timeout : Optional[List[str]] = None) -> SandboxResult:
+    """
+    Runs a command reading stdout and stderr as they are produced, each bounded by a BoundedOutput
+    Args:
+        command : the command and its arguments
+        timeout : seconds before the process is killed, the output read so far is returned
+        max_chars : characters of each stream kept for the caller
+        on_timeout : command run after a timeout to stop what the process started (e.g. docker kill)
+    """
+    started = time.perf_counter()
+    stdout, stderr = BoundedOutput("stdout", max_chars), BoundedOutput("stderr", max_chars)
+    process = await asyncio.create_subprocess_exec(*command, stdout=asyncio.subprocess.PIPE,
+                                                   stderr=asyncio.subprocess.PIPE)
+    pumps = asyncio.gather(_pump(process.stdout, stdout), _pump(process.stderr, stderr))
+    # pumps cancelled on a timeout or cancellation end with an exception nobody awaits
+    pumps.add_done_callback(lambda future: None if future.cancelled() else future.exception())
+    timed_out = False
+    try:
+        await asyncio.wait_for(asyncio.shield(pumps), timeout=timeout)
+        await process.wait()
+    except asyncio.TimeoutError:
+        timed_out = True
+        await _stop(process, on_timeout)
+        try:
+            # the pipes close with the process, drain what is left
+            await asyncio.wait_for(pumps, timeout=5)
+        except asyncio.TimeoutError:
+            pumps.cancel()
+    except asyncio.CancelledError:
+        # the analysis was cancelled (scheduler deadline), do not leave the process running
+        pumps.cancel()
+        await asyncio.shield(_stop(process, on_timeout))
+        raise
+    finally:
+        stdout.close()
+        stderr.close()
+    return SandboxResult(returncode=process.returncode, stdout=stdout.render(), stderr=stderr.render(),
+                         timed_out=timed_out, elapsed_s=round(time.perf_counter() - started, 2),
+                         artifacts=[output.artifact_id for output in (stdout, stderr) if output.artifact_id])
+
+__all__ = ['BoundedOutput', 'run_streamed', 'read_artifact', 'SandboxResult']
@@ -0,0 +1,92 @@
+import asyncio
+import time
+from typing_extensions import Any, Awaitable, Callable, Optional, TypeVar
+
+T = TypeVar("T")
+
+class SchedulerBusy(Exception):
+    """Raised when the queue is full, the caller should retry later"""
+
+class SchedulerTimeout(Exception):
+    """Raised when a request did not finish (queue wait + run) within its timeout"""
+
+class AnalysisScheduler:
+    """
+    Runs analysis requests with bounded concurrency.
+    At most max_concurrency requests run at once, up to max_queue more wait in FIFO order
+    (asyncio.Semaphore wakes waiters in order), anything beyond is rejected right away.
+    Each request has a deadline covering its queue wait and its run.
+    """
+    def __init__(self, max_concurrency : int = 4, max_queue : int = 32, timeout : float = 300) -> None:
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self._slots = asyncio.Semaphore(max_concurrency)
+        self._queued = 0
+        self._running = 0
+        self._metrics = {
+            "submitted": 0, "started": 0, "completed": 0, "failed": 0, "timed_out": 0, "rejected": 0,
+            "max_queue_depth": 0, "total_wait_s": 0.0, "total_run_s": 0.0,
+        }
+
+    async def run(self, work : Callable[[], Awaitable[T]], timeout : Optional[float] = None) -> T:
+        """
+        Args:
+            work : coroutine factory, only called once a slot is free
+            timeout : seconds from submission, default the scheduler's timeout
+        Raises:
+            SchedulerBusy : the queue is full
+            SchedulerTimeout : the request did not finish in time (it is cancelled)
+        """
+        if self._slots.locked() and self._queued >= self.max_queue:
+            self._metrics["rejected"] += 1
+            raise SchedulerBusy(f"{self._queued} requests already queued, retry later")
+        self._metrics["submitted"] += 1
+        submitted = time.perf_counter()
+        deadline = submitted + (timeout or self.timeout)
+
+        if not self._slots.locked():
+            # a free slot, acquire() returns without waiting
+            await self._slots.acquire()
+        else:
+            self._queued += 1
+            self._metrics["max_queue_depth"] = max(self._metrics["max_queue_depth"], self._queued)
+            try:
+                await asyncio.wait_for(self._slots.acquire(), timeout=max(0.0, deadline - time.perf_counter()))
+            except asyncio.TimeoutError:
+                self._metrics["timed_out"] += 1
+                raise SchedulerTimeout(f"request waited {time.perf_counter() - submitted:.1f}s in queue")
+            finally:
+                self._queued -= 1
+
+        started = time.perf_counter()
+        self._metrics["started"] += 1
+        self._metrics["total_wait_s"] += started - submitted
+        self._running += 1
+        try:
+            result = await asyncio.wait_for(work(), timeout=max(0.0, deadline - started))
+        except asyncio.TimeoutError:
+            self._metrics["timed_out"] += 1
+            raise SchedulerTimeout(f"request did not finish within {timeout or self.timeout:g}s")
+        except Exception:
+            self._metrics["failed"] += 1
+            raise
+        else:
+            self._metrics["completed"] += 1
+            return result
+        finally:
+            self._running -= 1
+            self._metrics["total_run_s"] += time.perf_counter() - started
+            self._slots.release()
+
+    def metrics(self) -> dict[str, Any]:
+        started = max(1, self._metrics["started"])
+        return {
+            "running": self._running,
+            "queue_depth": self._queued,
+            "max_concurrency": self.max_concurrency,
+            "max_queue": self.max_queue,
+            **{key: value for key, value in self._metrics.items() if not key.startswith("total_")},
+            "avg_wait_s": round(self._metrics["total_wait_s"] / started, 3),
+            "avg_run_s": round(self._metrics["total_run_s"] / max(1, self._metrics["started"] - self._running), 3),
+        }
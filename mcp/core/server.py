@@ -1,51 +1,168 @@
-from mcp.server.fastmcp import FastMCP
+from mcp.server.fastmcp import FastMCP, Context
 from langchain_core.tools import tool
+from langchain_core.runnables import RunnableConfig
 from langchain_openai import ChatOpenAI
 from langchain_core.messages import HumanMessage, AnyMessage
 from .state import AgentState
 from pydantic import Field
-import subprocess
+from contextlib import asynccontextmanager
+from typing_extensions import TypedDict
+from langgraph.graph.state import CompiledStateGraph
+import httpx
+import json
 import os
 import asyncio
+import gzip
+import shutil
+import tempfile
+import uuid
 
 from .builder import build_workflow
+from .scheduler import AnalysisScheduler, SchedulerBusy, SchedulerTimeout
+from .sandbox import SANDBOX_TIMEOUT, run_streamed, read_artifact as read_artifact_lines
 
 from dotenv import load_dotenv
 load_dotenv()
 
+MODEL_NAME = os.getenv('MCP_MODEL', 'gpt-4.1-mini')
+# analyses running at once, more wait in the queue (up to MCP_MAX_QUEUE) and the rest is rejected
+MAX_CONCURRENCY = int(os.getenv('MCP_MAX_CONCURRENCY', 4))
+MAX_QUEUE = int(os.getenv('MCP_MAX_QUEUE', 32))
+REQUEST_TIMEOUT = float(os.getenv('MCP_REQUEST_TIMEOUT', 300))
+# docker containers running at once, across all analyses
+SANDBOX_CONCURRENCY = int(os.getenv('SANDBOX_CONCURRENCY', 2))
+
+_sandbox_slots = asyncio.Semaphore(SANDBOX_CONCURRENCY)
+_sandbox_busy = 0
+
 async def _run_sandboxed_code(code: str, log_file_path: str) -> str:
+    global _sandbox_busy
+    async with _sandbox_slots:
+        _sandbox_busy += 1
+        try:
+            return await _run_container(code, log_file_path)
+        finally:
+            _sandbox_busy -= 1
+
+def _decompress(gz_path: str) -> str:
+    """
+    Decompresses a .gz log to a temporary file
+    Returns:
+        The temporary file's path, the caller removes it
+    """
+    with gzip.open(gz_path, "rb") as source, tempfile.NamedTemporaryFile("wb", suffix=".log", prefix="sandbox-log-",
+                                                                           delete=False) as target:
+        try:
+            shutil.copyfileobj(source, target, 1 << 20)
+        except BaseException:
+            target.close()
+            os.remove(target.name)
+            raise
+    return target.name
+
+async def _run_container(code: str, log_file_path: str) -> str:
     print(f"---Sandbox: Received request to run code.---")
     try:
         host_log_path = os.path.abspath(log_file_path)
         if not os.path.exists(host_log_path):
             return f"Error: Log file not found at {host_log_path}"
+        if not os.path.isfile(host_log_path):
+            return f"Error: {host_log_path} is not a single log file, the sandbox mounts one file at /app/log.txt"
 
-        mount_arg = f"{host_log_path}:/app/log.txt:ro" 
-
-        result = await asyncio.to_thread(
-            subprocess.run,
-            [
-                "docker", "run", "--rm", "--network", "none",
-                "--memory", "256m", "--cpus", "0.5",
-                "-v", mount_arg, "python:3.11-slim",
-                "python", "-c", code
-            ],
-            capture_output=True, text=True, timeout=30
-        )
-        if result.returncode == 0:
-            return f"Execution successful. Output:\n{result.stdout}"
+        decompressed = None
+        if host_log_path.endswith(".gz"):
+            # the code reads /app/log.txt as text, so a rotated .gz file is mounted decompressed
+            decompressed = await asyncio.to_thread(_decompress, host_log_path)
+        mount_arg = f"{decompressed or host_log_path}:/app/log.txt:ro"
+        # named, so a timed out run can be killed (stopping the docker client leaves the container running)
+        container = f"sandbox-{uuid.uuid4().hex[:12]}"
+
+        try:
+            result = await run_streamed(
+                [
+                    "docker", "run", "--rm", "--name", container, "--network", "none",
+                    "--memory", "256m", "--cpus", "0.5",
+                    "-v", mount_arg, "python:3.11-slim",
+                    "python", "-u", "-c", code
+                ],
+                timeout=SANDBOX_TIMEOUT, on_timeout=["docker", "kill", container]
+            )
+        finally:
+            if decompressed is not None:
+                os.remove(decompressed)
+        if result['timed_out']:
+            output = f"Execution timed out after {SANDBOX_TIMEOUT:g}s. Partial output:\n{result['stdout']}"
+            if result['stderr']:
+                output += f"\nError:\n{result['stderr']}"
+            return output
+        if result['returncode'] == 0:
+            return f"Execution successful. Output:\n{result['stdout']}"
         else:
-            return f"Execution failed. Error:\n{result.stderr}"
+            return f"Execution failed. Error:\n{result['stderr']}"
     except Exception as e:
         return f"An unexpected error occurred: {e}"
 
-mcp = FastMCP(name="Intelligent Python Server", instructions="Intelligently execute natural language python code")
+@tool
+async def execute_code_for_this_query(code : str, config : RunnableConfig):
+    """
+    Executes the given Python code in a sandbox. The log file is at '/app/log.txt' inside the tool.
+    The code MUST print its final answer to stdout.
+    Args:
+        code : The Python code to execute
+    Returns:
+        The stdout of the executed Python code
+    """
+    # the graph is shared by all requests, the log file of this request comes with the run config
+    log_file_path = config.get('configurable', {}).get('log_file_path')
+    if not log_file_path:
+        return "Error: no log file path for this analysis"
+    return await _run_sandboxed_code(code=code, log_file_path=log_file_path)
+
+@tool
+def read_artifact(artifact_id : str, start_line : int = 0, max_lines : int = 200):
+    """
+    Reads part of the full output of an earlier execution that was too long to return
+    Args:
+        artifact_id : the artifact named in the truncation note
+        start_line : first line to read (0-based)
+        max_lines : number of lines to read
+    Returns:
+        The lines, with the start_line to continue from
+    """
+    return read_artifact_lines(artifact_id, start_line, max_lines)
+
+class AnalysisRuntime(TypedDict):
+    agent : CompiledStateGraph
+    scheduler : AnalysisScheduler
+
+@asynccontextmanager
+async def lifespan(server : FastMCP):
+    """
+    Builds the chat model (one pooled HTTP client) and the compiled analysis graph once per server run
+    """
+    http_client = httpx.AsyncClient(limits=httpx.Limits(max_connections=MAX_CONCURRENCY * 2,
+                                                        max_keepalive_connections=MAX_CONCURRENCY))
+    chat_model = ChatOpenAI(
+        model=MODEL_NAME,
+        temperature=0,
+        http_async_client=http_client
+    )
+    tools = [execute_code_for_this_query, read_artifact]
+    tool_dict = {tool.name : tool for tool in tools}
+    agent = await build_workflow(chat_model, tools, tool_dict)
+    try:
+        yield AnalysisRuntime(agent=agent, scheduler=AnalysisScheduler(MAX_CONCURRENCY, MAX_QUEUE, REQUEST_TIMEOUT))
+    finally:
+        await http_client.aclose()
+
+mcp = FastMCP(name="Intelligent Python Server", instructions="Intelligently execute natural language python code", lifespan=lifespan)
 
 @mcp.tool()
 async def delegate_complex_analysis(
     log_list : list[str],
     query : str = Field(description="The natural language analysis task"),
-    log_file_path : str = Field(description="The full path to the log file on the host")
+    log_file_path : str = Field(description="The full path to the log file on the host"),
+    ctx : Context = None
 ):
     """
     Accepts a complex, natural-language analysis task,
@@ -55,30 +172,33 @@ async def delegate_complex_analysis(
         query : The natural language analysis task
         log_file_path : The full path to the log file on the host
     """
+    runtime : AnalysisRuntime = ctx.request_context.lifespan_context
 
-    @tool
-    async def execute_code_for_this_query(code : str):
-        """
-        Executes the given Python code in a sandbox. The log file is at '/app/log.txt' inside the tool.
-        The code MUST print its final answer to stdout.
-        Args:
-            code : The Python code to execute
-        Returns:
-            The stdout of the executed Python code
-        """
-        return await _run_sandboxed_code(code=code, log_file_path=log_file_path)
-
-    tools = [execute_code_for_this_query]
-    tool_dict = {tool.name : tool for tool in tools}
+    async def analyse():
+        messages: list[AnyMessage] = [HumanMessage(content=query)]
+        final_state = await runtime['agent'].ainvoke(
+            AgentState(messages=messages, max_executions=4, execution_count=0, log_list=log_list),
+            config={'configurable': {'log_file_path': log_file_path}}
+        )
+        return final_state['messages'][-1].content
 
-    chat_model = ChatOpenAI(
-        model='gpt-4.1-mini',
-        temperature=0
-    )
-    messages: list[AnyMessage] = [HumanMessage(content=query)]
-    agent = await build_workflow(chat_model, tools, tool_dict)
-    final_state = await agent.ainvoke(AgentState(messages=messages, max_executions=4, execution_count=0, log_list=log_list))
-    return final_state['messages'][-1].content
+    try:
+        return await runtime['scheduler'].run(analyse)
+    except (SchedulerBusy, SchedulerTimeout) as e:
+        return f"Analysis not completed: {e}"
+
+# a resource, not a tool: clients list tools to hand them to their model, metrics are for operators
+@mcp.resource("metrics://analysis", mime_type="application/json")
+def analysis_metrics() -> str:
+    """
+    Scheduler metrics: running analyses, queue depth, completed / failed / timed out / rejected counts,
+    average queue wait and run time, plus busy sandbox slots
+    """
+    runtime : AnalysisRuntime = mcp.get_context().request_context.lifespan_context
+    metrics = runtime['scheduler'].metrics()
+    metrics['sandbox_busy'] = _sandbox_busy
+    metrics['sandbox_concurrency'] = SANDBOX_CONCURRENCY
+    return json.dumps(metrics)
     
 async def test_sandbox():
     code = "print('Hello from inside Docker!')"
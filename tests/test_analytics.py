@@ -0,0 +1,58 @@
+"""
+LogQueryEngine over the columns of a log mixing ISO and year-less syslog timestamps.
+Run with `python -m unittest discover tests` from the repository root.
+"""
+from datetime import datetime, timedelta
+import os
+import tempfile
+import unittest
+
+from app.core.analytics.engine import LogQueryEngine
+from app.core.analytics.spec import Filter, LogQuerySpec
+from app.core.embedding.indexer import InMemoryIndexer
+from app.core.embedding.pipeline import VectorPipeline
+from benchmarks.log_generator import SyntheticLogGenerator
+from benchmarks.stub_model import StubEmbedder
+
+class MixedFormatQueryTest(unittest.TestCase):
+    def setUp(self):
+        self.work_dir = tempfile.TemporaryDirectory()
+        generator = SyntheticLogGenerator(formats=["iso", "syslog"])
+        self.lines = list(generator.lines(2000))
+        path = generator.write(os.path.join(self.work_dir.name, "api.log"), 2000)
+        mtime = (generator.start + timedelta(days=1)).timestamp()
+        os.utime(path, (mtime, mtime))
+        self.pipe = VectorPipeline(InMemoryIndexer, embedder=StubEmbedder())
+        self.pipe.create_db(path)
+        self.engine = LogQueryEngine(self.pipe.columns)
+
+    def tearDown(self):
+        self.pipe.close()
+        self.work_dir.cleanup()
+
+    def test_first_and_last_seen_are_in_the_log_year(self):
+        result = self.engine.run(LogQuerySpec(group_by=["level"]))
+
+        self.assertEqual(sum(group["count"] for group in result["groups"]), 2000)
+        for group in result["groups"]:
+            self.assertTrue(group["first_seen"].startswith("2025-10-05"), group)
+            self.assertTrue(group["last_seen"].startswith("2025-10-05"), group)
+
+    def test_start_time_keeps_syslog_rows(self):
+        syslog_errors = sum(1 for line in self.lines if line.startswith("Oct") and "[ERROR]" in line)
+        result = self.engine.run(LogQuerySpec(start_time="2025-10-05 00:00:00",
+                                              filters=[Filter(field="level", value="ERROR")], sample_rows=20))
+
+        self.assertGreater(syslog_errors, 0)
+        self.assertEqual(result["matched_rows"], sum(1 for line in self.lines if "[ERROR]" in line))
+        self.assertTrue(any(row["text"].startswith("Oct") for row in result["samples"]))
+
+    def test_buckets_follow_the_log(self):
+        result = self.engine.run(LogQuerySpec(start_time="2025-10-05 00:00:00", end_time="2025-10-06 00:00:00",
+                                              bucket="minute"))
+
+        self.assertEqual(result["matched_rows"], 2000)
+        self.assertTrue(all(group["bucket"].startswith("2025-10-05 00:") for group in result["groups"]))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,135 @@
+"""
+ChunkDeduplicator: exact and near duplicates, occurrence counts of overlapping windows, max_gap and finish().
+Run with `python -m unittest discover tests` from the repository root.
+"""
+from datetime import datetime, timedelta
+import unittest
+
+from app.core.embedding.dedup import ChunkDeduplicator
+from app.core.embedding.types import Chunk, ChunkMetaData
+
+START = datetime(2025, 10, 5)
+
+def chunk(lines, start_line=None, has_error=False) -> Chunk:
+    end_line = start_line + len(lines) - 1 if start_line is not None else None
+    first = START + timedelta(seconds=start_line or 0)
+    return Chunk(text="".join(f"{line}\n" for line in lines),
+                 metadata=ChunkMetaData(start_timestamp=first, end_timestamp=first + timedelta(seconds=len(lines) - 1),
+                                        has_error=has_error, source="api.log", service="api", occurrences=1,
+                                        last_seen=None, start_line=start_line, end_line=end_line))
+
+def heartbeats(first : int, count : int):
+    return [f"2025-10-05 10:00:{i % 60:02d} [INFO] api: heartbeat ok from 10.0.0.{i % 250} in {i}ms" for i in range(first, first + count)]
+
+NOISE = [f"2025-10-05 10:00:00 [INFO] {word}: {word} worker {word} started" for word in
+         ("billing", "camera", "storage", "scheduler", "gateway", "frames", "invoices", "metrics")]
+
+class DuplicateTest(unittest.TestCase):
+    def test_exact_duplicate_after_masking(self):
+        dedup = ChunkDeduplicator()
+        first = chunk(heartbeats(0, 10))
+
+        self.assertFalse(dedup.is_duplicate(first))
+        # only the ip, duration and time differ, the templates are the same
+        self.assertTrue(dedup.is_duplicate(chunk(heartbeats(100, 10))))
+        self.assertEqual(dedup.stats, {"chunks": 2, "unique": 1, "exact": 1, "near": 0})
+        self.assertEqual(first["metadata"]["occurrences"], 2)
+        self.assertEqual(first["metadata"]["last_seen"], START + timedelta(seconds=9))
+
+    def test_near_duplicate(self):
+        dedup = ChunkDeduplicator(max_distance=3)
+        lines = heartbeats(0, 40) + NOISE[:1]
+
+        self.assertFalse(dedup.is_duplicate(chunk(lines)))
+        # one line of 41 replaced: another digest, a close SimHash
+        self.assertTrue(dedup.is_duplicate(chunk(lines[:-1] + NOISE[1:2])))
+        self.assertEqual(dedup.stats["near"], 1)
+
+    def test_different_chunks_are_kept(self):
+        dedup = ChunkDeduplicator(max_distance=3)
+
+        self.assertFalse(dedup.is_duplicate(chunk(heartbeats(0, 8))))
+        self.assertFalse(dedup.is_duplicate(chunk(NOISE)))
+        self.assertEqual(dedup.stats["unique"], 2)
+
+    def test_error_windows_never_fold_into_clean_ones(self):
+        dedup = ChunkDeduplicator()
+
+        self.assertFalse(dedup.is_duplicate(chunk(heartbeats(0, 10))))
+        self.assertFalse(dedup.is_duplicate(chunk(heartbeats(0, 10), has_error=True)))
+
+    def test_horizon(self):
+        dedup = ChunkDeduplicator(horizon=1)
+
+        dedup.is_duplicate(chunk(heartbeats(0, 10)))
+        dedup.is_duplicate(chunk(NOISE))
+        # the heartbeat canonical left the horizon
+        self.assertFalse(dedup.is_duplicate(chunk(heartbeats(0, 10))))
+
+class OccurrenceTest(unittest.TestCase):
+    def test_overlapping_windows_count_once(self):
+        dedup = ChunkDeduplicator()
+        lines = heartbeats(0, 50)
+        windows = [chunk(lines[i:i + 10], start_line=i) for i in range(len(lines) - 9)]
+
+        duplicates = [dedup.is_duplicate(window) for window in windows]
+
+        self.assertEqual(duplicates, [False] + [True] * (len(windows) - 1))
+        # windows starting at 0, 10, 20, 30 and 40 do not overlap, the ones in between shift by a line
+        self.assertEqual(windows[0]["metadata"]["occurrences"], 5)
+
+    def test_chunks_without_line_numbers_all_count(self):
+        dedup = ChunkDeduplicator()
+        first = chunk(heartbeats(0, 10))
+        dedup.is_duplicate(first)
+
+        for _ in range(3):
+            self.assertTrue(dedup.is_duplicate(chunk(heartbeats(0, 10))))
+
+        self.assertEqual(first["metadata"]["occurrences"], 4)
+
+class MaxGapTest(unittest.TestCase):
+    def test_forced_keep_after_max_gap(self):
+        dedup = ChunkDeduplicator(max_gap=9)
+        lines = heartbeats(0, 40)
+        windows = [chunk(lines[i:i + 10], start_line=i) for i in range(len(lines) - 9)]
+
+        kept = [window["metadata"]["start_line"] for window in windows if not dedup.is_duplicate(window)]
+
+        # a window is kept after every 9 duplicates, so each line lies in a kept window
+        self.assertEqual(kept, [0, 10, 20, 30])
+
+    def test_finish_returns_the_suppressed_last_window(self):
+        dedup = ChunkDeduplicator(max_gap=9)
+        lines = heartbeats(0, 25)
+        windows = [chunk(lines[i:i + 10], start_line=i) for i in range(len(lines) - 9)]
+        for window in windows:
+            dedup.is_duplicate(window)
+
+        tail = dedup.finish()
+
+        # lines 20-24 are only in the last window
+        self.assertIs(tail, windows[-1])
+        self.assertEqual(dedup.stats["unique"], 3)
+        self.assertIsNone(dedup.finish())
+
+    def test_finish_undoes_the_occurrence(self):
+        dedup = ChunkDeduplicator()
+        first = chunk(heartbeats(0, 10), start_line=0)
+        dedup.is_duplicate(first)
+        dedup.is_duplicate(chunk(heartbeats(10, 10), start_line=10))
+        self.assertEqual(first["metadata"]["occurrences"], 2)
+
+        self.assertIsNotNone(dedup.finish())
+
+        self.assertEqual(first["metadata"]["occurrences"], 1)
+        self.assertIsNone(first["metadata"]["last_seen"])
+
+    def test_finish_after_a_kept_chunk(self):
+        dedup = ChunkDeduplicator()
+        dedup.is_duplicate(chunk(heartbeats(0, 10)))
+
+        self.assertIsNone(dedup.finish())
+
+if __name__ == "__main__":
+    unittest.main()
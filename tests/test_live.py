@@ -0,0 +1,54 @@
+"""
+LogTailer rotation: chunks stored as byte ranges keep reading the rotated file.
+Run with `python -m unittest discover tests` from the repository root.
+"""
+import os
+import tempfile
+import unittest
+
+from app.core.embedding.indexer import InMemoryIndexer
+from app.core.embedding.live import LogTailer
+from app.core.embedding.pipeline import VectorPipeline
+from benchmarks.stub_model import StubEmbedder
+
+def write_lines(path : str, lines, mode : str = "w"):
+    with open(path, mode) as f:
+        f.writelines(f"{line}\n" for line in lines)
+
+class RotationTest(unittest.TestCase):
+    def setUp(self):
+        self.work_dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.work_dir.name, "app.log")
+        write_lines(self.path, (f"2025-10-05 10:{i // 60:02d}:{i % 60:02d} [INFO] payment processed order={i}"
+                                for i in range(300)))
+        self.pipe = VectorPipeline(InMemoryIndexer, embedder=StubEmbedder(), dedup=False)
+        self.pipe.create_db(self.path)
+
+    def tearDown(self):
+        self.pipe.close()
+        self.work_dir.cleanup()
+
+    def test_rotated_chunks_read_the_rotated_file(self):
+        tailer = LogTailer(self.pipe, self.path, poll_interval=0.1)
+        try:
+            os.rename(self.path, f"{self.path}.1")
+            write_lines(self.path, (f"2025-10-05 11:{i // 60:02d}:{i % 60:02d} [ERROR] NEW FILE line {i} db timeout"
+                                    for i in range(400)))
+            tailer.poll_once()
+        finally:
+            tailer.stop()
+
+        self.assertEqual(tailer.stats["rotations"], 1)
+        self.assertEqual(self.pipe.text_store.paths, [os.path.abspath(f"{self.path}.1")])
+        hits = self.pipe.query("payment processed", k=3)
+        self.assertTrue(hits)
+        for hit in hits:
+            self.assertNotIn("NEW FILE", hit["document"])
+            self.assertIn(f"payment processed order={hit['metadata']['start_line']}", hit["document"].splitlines()[0])
+
+    def test_rename_of_unknown_file_is_ignored(self):
+        self.pipe.text_store.rename_source(os.path.join(self.work_dir.name, "other.log"), "elsewhere.log")
+        self.assertEqual(self.pipe.text_store.paths, [os.path.abspath(self.path)])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,137 @@
+"""
+Deletes, tombstones and compaction of InMemoryIndexer, RetentionPolicy and BackgroundCompactor.
+Run with `python -m unittest discover tests` from the repository root.
+"""
+from datetime import datetime, timedelta
+import os
+import tempfile
+import time
+import unittest
+
+import numpy as np
+
+from app.core.embedding.indexer import InMemoryIndexer
+from app.core.embedding.pipeline import VectorPipeline
+from app.core.embedding.retention import BackgroundCompactor, RetentionPolicy
+from benchmarks.log_generator import SyntheticLogGenerator
+from benchmarks.stub_model import StubEmbedder
+
+START = datetime(2025, 10, 5)
+
+def filled_indexer(n : int = 20) -> InMemoryIndexer:
+    """n chunks, one minute apart"""
+    rng = np.random.default_rng(0)
+    indexer = InMemoryIndexer()
+    metadatas = [{"start_timestamp": START + timedelta(minutes=i), "end_timestamp": START + timedelta(minutes=i, seconds=59),
+                  "service": "api"} for i in range(n)]
+    indexer.add_batch(rng.random((n, 16), dtype="float32"), [f"chunk {i}" for i in range(n)], metadatas)
+    return indexer
+
+def all_hits(indexer : InMemoryIndexer):
+    return indexer.search(np.zeros(16, dtype="float32"), k=100)
+
+class TombstoneTest(unittest.TestCase):
+    def test_delete_tombstones_then_compact(self):
+        indexer = filled_indexer()
+
+        self.assertEqual(indexer.delete([0, 1, 2, 999]), 3)
+        self.assertEqual((len(indexer), indexer.tombstones), (17, 3))
+        self.assertEqual(indexer.memory_report()["vectors"], 17)
+        self.assertFalse({0, 1, 2} & {hit["id"] for hit in all_hits(indexer)})
+
+        self.assertEqual(indexer.compact(), 3)
+        self.assertEqual(indexer.tombstones, 0)
+        self.assertEqual(indexer.compact(), 0)
+        hits = all_hits(indexer)
+        self.assertEqual(sorted(hit["id"] for hit in hits), list(range(3, 20)))
+        self.assertEqual({hit["id"]: hit["document"] for hit in hits}[5], "chunk 5")
+
+    def test_delete_range(self):
+        indexer = filled_indexer()
+
+        deleted = indexer.delete_range(end=START + timedelta(minutes=5))
+
+        self.assertEqual(deleted, 5)
+        self.assertEqual(min(hit["id"] for hit in all_hits(indexer)), 5)
+
+class RetentionTest(unittest.TestCase):
+    def test_max_age_keeps_the_newest_chunks(self):
+        indexer = filled_indexer()
+
+        deleted = indexer.apply_retention(RetentionPolicy(max_age=timedelta(minutes=10)))
+
+        # the cutoff is 10 minutes before the newest line (19:59), chunk 9 ends right at it
+        self.assertEqual(deleted, 10)
+        self.assertEqual(indexer.tombstones, 0)
+        self.assertEqual(sorted(hit["id"] for hit in all_hits(indexer)), list(range(10, 20)))
+
+    def test_max_vectors_drops_the_oldest(self):
+        indexer = filled_indexer()
+
+        deleted = indexer.apply_retention(RetentionPolicy(max_vectors=5), compact=False)
+
+        self.assertEqual(deleted, 15)
+        self.assertEqual(indexer.tombstones, 15)
+        self.assertEqual(sorted(hit["id"] for hit in all_hits(indexer)), list(range(15, 20)))
+
+    def test_max_age_keeps_syslog_dated_chunks(self):
+        with tempfile.TemporaryDirectory() as work_dir:
+            generator = SyntheticLogGenerator(formats=["iso", "syslog"])
+            path = generator.write(os.path.join(work_dir, "api.log"), 2000)
+            mtime = (generator.start + timedelta(hours=1)).timestamp()
+            os.utime(path, (mtime, mtime))
+            pipe = VectorPipeline(InMemoryIndexer, embedder=StubEmbedder(), dedup=False,
+                                  retention=RetentionPolicy(max_age=timedelta(hours=1)))
+            pipe.create_db(path)
+
+            # the log spans a few minutes, nothing is older than an hour
+            self.assertEqual(len(pipe.columns), 2000)
+            self.assertEqual(pipe.rollups.query()["total_lines"], 2000)
+            self.assertTrue(all(hit["metadata"]["start_timestamp"].year == 2025 for hit in pipe.query("request", k=50)))
+            pipe.close()
+
+class BackgroundCompactorTest(unittest.TestCase):
+    def test_run_once_waits_for_min_ratio(self):
+        indexer = filled_indexer()
+        compacted = []
+        compactor = BackgroundCompactor(indexer, min_ratio=0.2, on_compact=compacted.append)
+
+        indexer.delete([0, 1])
+        self.assertEqual(compactor.run_once(), 0)
+        indexer.delete([2, 3])
+        self.assertEqual(compactor.run_once(), 4)
+        self.assertEqual((compactor.compactions, compacted, indexer.tombstones), (1, [4], 0))
+
+    def test_background_thread_compacts_and_stops(self):
+        indexer = filled_indexer()
+        compactor = BackgroundCompactor(indexer, interval=0.05, min_ratio=0.0).start()
+        try:
+            indexer.delete([0, 1, 2])
+            deadline = time.monotonic() + 5
+            while indexer.tombstones and time.monotonic() < deadline:
+                time.sleep(0.02)
+            self.assertEqual(indexer.tombstones, 0)
+        finally:
+            started = time.monotonic()
+            compactor.stop()
+        self.assertLess(time.monotonic() - started, 1.0)
+        self.assertIsNone(compactor._thread)
+
+        # stopped, deletes stay tombstoned
+        indexer.delete([3])
+        time.sleep(0.2)
+        self.assertEqual(indexer.tombstones, 1)
+
+    def test_pipeline_close_stops_the_compactor(self):
+        pipe = VectorPipeline(InMemoryIndexer, embedder=StubEmbedder(), compact_interval=60)
+        thread = pipe._compactor._thread
+
+        started = time.monotonic()
+        pipe.close()
+
+        self.assertLess(time.monotonic() - started, 1.0)
+        self.assertFalse(thread.is_alive())
+        self.assertIsNone(pipe._compactor)
+
+if __name__ == "__main__":
+    unittest.main()
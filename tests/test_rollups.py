@@ -0,0 +1,46 @@
+"""
+Per-minute rollups of a log mixing ISO and year-less syslog timestamps.
+Run with `python -m unittest discover tests` from the repository root.
+"""
+from datetime import datetime, timedelta
+import os
+import tempfile
+import unittest
+
+from app.core.embedding.indexer import InMemoryIndexer
+from app.core.embedding.pipeline import VectorPipeline
+from benchmarks.log_generator import SyntheticLogGenerator
+from benchmarks.stub_model import StubEmbedder
+
+class MixedFormatRollupTest(unittest.TestCase):
+    def setUp(self):
+        self.work_dir = tempfile.TemporaryDirectory()
+        self.generator = SyntheticLogGenerator(formats=["iso", "iso_ms", "slash", "syslog"])
+        path = self.generator.write(os.path.join(self.work_dir.name, "api.log"), 2000)
+        mtime = (self.generator.start + timedelta(hours=1)).timestamp()
+        os.utime(path, (mtime, mtime))
+        self.pipe = VectorPipeline(InMemoryIndexer, embedder=StubEmbedder())
+        self.pipe.create_db(path)
+
+    def tearDown(self):
+        self.pipe.close()
+        self.work_dir.cleanup()
+
+    def test_rates_span_the_log_not_the_years(self):
+        stats = self.pipe.rollups.query()
+
+        self.assertEqual(stats["total_lines"], 2000)
+        self.assertEqual(stats["first_minute"], "2025-10-05 00:00:00")
+        self.assertTrue(stats["last_minute"].startswith("2025-10-05 00:"))
+        # ~250 ms between lines
+        self.assertGreater(stats["lines_per_minute"], 150)
+        self.assertLess(stats["lines_per_minute"], 300)
+
+    def test_range_counts_syslog_lines(self):
+        start = datetime(2025, 10, 5)
+        stats = self.pipe.rollups.query(start=start, end=start + timedelta(hours=1))
+
+        self.assertEqual(stats["total_lines"], 2000)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,161 @@
+"""
+RoutedChatModel over langchain's fake chat models: failover, hedging, deadline and rate limit cooldown.
+Run with `python -m unittest discover tests` from the repository root.
+"""
+import asyncio
+import itertools
+import time
+import unittest
+from typing import Any, List
+
+from langchain_core.language_models.fake_chat_models import GenericFakeChatModel
+from langchain_core.messages import HumanMessage
+
+from app.core.agent.routing import ModelRoutingError, RoutedChatModel
+
+class RateLimitError(Exception):
+    """Stand-in for the provider clients' 429 error"""
+    def __init__(self, retry_after : str = None) -> None:
+        super().__init__("429 Too Many Requests")
+        self.status_code = 429
+        self.response = type("Response", (), {"status_code": 429, "headers": {"retry-after": retry_after}})()
+
+class ScriptedChatModel(GenericFakeChatModel):
+    """
+    GenericFakeChatModel answering `answer` after the next of `delays` seconds (the last one repeats),
+    or raising `error`. Sleeps with asyncio, so a cancelled hedge stops right away.
+    """
+    answer : str = "ok"
+    delays : List[float] = [0.0]
+    error : Any = None
+    calls : int = 0
+
+    def __init__(self, **kwargs) -> None:
+        super().__init__(messages=itertools.repeat(kwargs.get("answer", "ok")), **kwargs)
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs):
+        delay = self.delays[min(self.calls, len(self.delays) - 1)]
+        self.calls += 1
+        await asyncio.sleep(delay)
+        if self.error is not None:
+            raise self.error
+        return self._generate(messages, stop=stop, **kwargs)
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        if self.error is not None:
+            raise self.error
+        return super()._generate(messages, stop=stop, **kwargs)
+
+QUESTION = [HumanMessage("which service fails?")]
+
+class RoutedChatModelTest(unittest.IsolatedAsyncioTestCase):
+    async def test_failover_on_error(self):
+        primary = ScriptedChatModel(error=ValueError("boom"))
+        fallback = ScriptedChatModel(answer="from fallback")
+        router = RoutedChatModel([("primary", primary), ("fallback", fallback)], deadline=5, hedge=False)
+
+        response = await router.ainvoke(QUESTION)
+
+        self.assertEqual(response.content, "from fallback")
+        self.assertEqual((primary.calls, fallback.calls), (1, 1))
+        self.assertEqual(router.stats()["primary"]["error_rate"], 1.0)
+
+    async def test_hedge_to_next_backend(self):
+        slow = ScriptedChatModel(answer="slow", delays=[2.0])
+        fast = ScriptedChatModel(answer="fast")
+        router = RoutedChatModel([("slow", slow), ("fast", fast)], deadline=5, hedge_delay=0.05)
+
+        started = time.monotonic()
+        response = await router.ainvoke(QUESTION)
+
+        self.assertEqual(response.content, "fast")
+        self.assertLess(time.monotonic() - started, 1.0)
+        self.assertEqual(fast.calls, 1)
+
+    async def test_hedge_single_backend_with_itself(self):
+        model = ScriptedChatModel(delays=[2.0, 0.0])
+        router = RoutedChatModel([("only", model)], deadline=5, hedge_delay=0.05)
+
+        started = time.monotonic()
+        await router.ainvoke(QUESTION)
+
+        self.assertEqual(model.calls, 2)
+        self.assertLess(time.monotonic() - started, 1.0)
+
+    async def test_no_hedge_when_disabled(self):
+        slow = ScriptedChatModel(answer="slow", delays=[0.3])
+        fast = ScriptedChatModel(answer="fast")
+        router = RoutedChatModel([("slow", slow), ("fast", fast)], deadline=5, hedge_delay=0.05, hedge=False)
+
+        response = await router.ainvoke(QUESTION)
+
+        self.assertEqual(response.content, "slow")
+        self.assertEqual(fast.calls, 0)
+
+    async def test_hedge_delay_follows_p90_with_lower_bound(self):
+        model = ScriptedChatModel()
+        router = RoutedChatModel([("only", model)], deadline=8, min_hedge_delay=0.5)
+        self.assertEqual(router._hedge_delay("only"), 2.0)  # deadline / 4 without stats
+        for _ in range(5):
+            await router.ainvoke(QUESTION)
+        self.assertEqual(router._hedge_delay("only"), 0.5)
+
+    async def test_deadline(self):
+        backends = [(name, ScriptedChatModel(delays=[2.0])) for name in ("a", "b")]
+        router = RoutedChatModel(backends, deadline=0.2, hedge_delay=0.05)
+
+        started = time.monotonic()
+        with self.assertRaisesRegex(ModelRoutingError, "no response within 0.2s"):
+            await router.ainvoke(QUESTION)
+        self.assertLess(time.monotonic() - started, 1.0)
+
+    async def test_all_backends_fail(self):
+        backends = [(name, ScriptedChatModel(error=ValueError(f"{name} down"))) for name in ("a", "b")]
+        router = RoutedChatModel(backends, deadline=5)
+
+        with self.assertRaisesRegex(ModelRoutingError, "a down.*b down"):
+            await router.ainvoke(QUESTION)
+
+    async def test_rate_limited_backend_cools_down(self):
+        primary = ScriptedChatModel(answer="primary", error=RateLimitError())
+        fallback = ScriptedChatModel(answer="fallback")
+        router = RoutedChatModel([("primary", primary), ("fallback", fallback)], deadline=5, hedge=False)
+
+        self.assertEqual((await router.ainvoke(QUESTION)).content, "fallback")
+        self.assertGreater(router.stats()["primary"]["cooldown_s"], 0)
+
+        # while cooling down the primary is tried last, the fallback answers without it being called
+        primary.error = None
+        self.assertEqual((await router.ainvoke(QUESTION)).content, "fallback")
+        self.assertEqual(primary.calls, 1)
+
+        router._stats["primary"].cooldown_until = 0.0
+        self.assertEqual((await router.ainvoke(QUESTION)).content, "primary")
+
+    async def test_retry_after_sets_cooldown(self):
+        primary = ScriptedChatModel(error=RateLimitError(retry_after="30"))
+        router = RoutedChatModel([("primary", primary), ("fallback", ScriptedChatModel())], deadline=5, hedge=False)
+
+        await router.ainvoke(QUESTION)
+
+        self.assertAlmostEqual(router.stats()["primary"]["cooldown_s"], 30, delta=1)
+
+    def test_invoke_fails_over(self):
+        primary = ScriptedChatModel(error=ValueError("boom"))
+        router = RoutedChatModel([("primary", primary), ("fallback", ScriptedChatModel(answer="fallback"))])
+
+        self.assertEqual(router.invoke(QUESTION).content, "fallback")
+        self.assertEqual(router.stats()["primary"]["error_rate"], 1.0)
+
+class FromModelsTest(unittest.TestCase):
+    def test_routing_options_are_passed(self):
+        from app.core.agent.model_provider import ModelProvider
+
+        provider = ModelProvider.from_models([("fake", ScriptedChatModel())], deadline=5, hedge_delay=0.5,
+                                             hedge=False, min_hedge_delay=0.01)
+
+        self.assertEqual((provider.model.deadline, provider.model.hedge_delay, provider.model.hedge,
+                          provider.model.min_hedge_delay), (5, 0.5, False, 0.01))
+
+if __name__ == "__main__":
+    unittest.main()
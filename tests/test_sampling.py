@@ -0,0 +1,94 @@
+"""
+Sampling together with deduplication: no window is lost from the counts and every line stays indexed.
+Run with `python -m unittest discover tests` from the repository root.
+"""
+import os
+import tempfile
+import unittest
+
+from app.core.embedding.indexer import InMemoryIndexer
+from app.core.embedding.pipeline import VectorPipeline, WINDOW_SIZE
+from app.core.embedding.sampling import SamplingPolicy
+from benchmarks.log_generator import SyntheticLogGenerator
+from benchmarks.stub_model import StubEmbedder
+
+WORDS = ["cache", "queue", "disk", "auth", "frame", "token", "order", "user"]
+
+def heartbeat_line(i : int) -> str:
+    return f"2025-10-05 10:{i // 3600 % 60:02d}:{i // 60 % 60:02d} [INFO] api: heartbeat ok id={i}"
+
+def alternating_line(i : int) -> str:
+    """Two blocks of WINDOW_SIZE distinct routine lines, A B A B ..."""
+    j = i % WINDOW_SIZE
+    message = f"{WORDS[j % 8]} {WORDS[j // 8 % 8]} step{j // 8} block{'AB'[i // WINDOW_SIZE % 2]} id={i}"
+    return f"2025-10-05 10:{i // 3600 % 60:02d}:{i // 60 % 60:02d} [INFO] api: {message}"
+
+class SampledDedupTest(unittest.TestCase):
+    def setUp(self):
+        self.work_dir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.work_dir.cleanup()
+
+    def write(self, lines) -> str:
+        path = os.path.join(self.work_dir.name, "api.log")
+        with open(path, "w") as f:
+            f.writelines(f"{line}\n" for line in lines)
+        return path
+
+    def ingest(self, path : str, sampling=None, dedup : bool = True):
+        pipe = VectorPipeline(InMemoryIndexer, embedder=StubEmbedder(), dedup=dedup, sampling=sampling)
+        pipe.create_db(path)
+        pipe.close()
+        return sorted(pipe._indexer._metadata.values(), key=lambda metadata: metadata["start_line"])
+
+    @staticmethod
+    def repetitions(metadatas) -> float:
+        return sum(metadata["occurrences"] + metadata.get("sample_weight", 1.0) - 1 for metadata in metadatas)
+
+    def assertCovered(self, metadatas, n_lines : int):
+        covered = set()
+        for metadata in metadatas:
+            covered.update(range(metadata["start_line"], metadata["end_line"] + 1))
+        self.assertEqual(len(covered), n_lines)
+
+    def test_repetitions_add_up_to_the_windows(self):
+        blocks = 20
+        path = self.write(heartbeat_line(i) for i in range(blocks * WINDOW_SIZE))
+        for rate in (0.1, 0.5):
+            with self.subTest(rate=rate):
+                metadatas = self.ingest(path, SamplingPolicy(rate=rate, rare_count=0))
+
+                # one repetition per non overlapping window of the file
+                self.assertEqual(self.repetitions(metadatas), blocks)
+                self.assertCovered(metadatas, blocks * WINDOW_SIZE)
+
+    def test_sampling_keeps_the_duplicate_counts(self):
+        n_lines = 20 * WINDOW_SIZE
+        path = self.write(alternating_line(i) for i in range(n_lines))
+        expected = self.repetitions(self.ingest(path))
+        self.assertGreater(expected, 20)
+        for rate in (0.1, 0.5):
+            with self.subTest(rate=rate):
+                metadatas = self.ingest(path, SamplingPolicy(rate=rate, rare_count=0))
+
+                # no canonical is sampled away, so no occurrence is counted on a chunk that is not indexed
+                self.assertEqual(self.repetitions(metadatas), expected)
+                self.assertCovered(metadatas, n_lines)
+
+    def test_sampling_without_dedup(self):
+        path = SyntheticLogGenerator().write(os.path.join(self.work_dir.name, "api.log"), 3000)
+        lines = open(path).read().splitlines()
+
+        metadatas = self.ingest(path, SamplingPolicy(rate=0.1), dedup=False)
+
+        self.assertLess(len(metadatas), (len(lines) - WINDOW_SIZE + 1) / 5)
+        covered = set()
+        for metadata in metadatas:
+            covered.update(range(metadata["start_line"], metadata["end_line"] + 1))
+        important = [i for i, line in enumerate(lines) if "[ERROR]" in line or "[WARNING]" in line]
+        self.assertTrue(important)
+        self.assertTrue(all(i in covered for i in important))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,88 @@
+"""
+Index service access control: the token, the allowed roots and the unix socket's permissions.
+Run with `python -m unittest discover tests` from the repository root.
+"""
+import os
+import socket
+import stat
+import tempfile
+import threading
+import unittest
+
+from app.core.service.client import ServiceClient
+from app.core.service.server import IndexService, serve
+from benchmarks.stub_model import StubEmbedder
+
+TOKEN = "s3cret"
+
+def write_log(path : str):
+    with open(path, "w") as f:
+        f.writelines(f"2025-10-05 10:00:{i:02d} [INFO] api: request processed id={i}\n" for i in range(30))
+
+@unittest.skipUnless(hasattr(socket, "AF_UNIX"), "needs unix sockets")
+class ServiceAccessTest(unittest.TestCase):
+    def setUp(self):
+        self.work_dir = tempfile.TemporaryDirectory()
+        self.root = os.path.join(self.work_dir.name, "logs")
+        self.outside = os.path.join(self.work_dir.name, "private")
+        os.makedirs(self.root)
+        os.makedirs(self.outside)
+        self.log = os.path.join(self.root, "api.log")
+        self.secret = os.path.join(self.outside, "secret.log")
+        write_log(self.log)
+        write_log(self.secret)
+
+        self.socket_path = os.path.join(self.work_dir.name, "index.sock")
+        self.url = f"unix://{self.socket_path}"
+        self.service = IndexService(StubEmbedder(), roots=[self.root])
+        self.server = serve(self.url, self.service, token=TOKEN)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.service.close()
+        self.work_dir.cleanup()
+
+    def client(self, token : str = TOKEN) -> ServiceClient:
+        return ServiceClient(self.url, timeout=30, token=token)
+
+    def test_socket_is_owner_and_group_only(self):
+        self.assertEqual(stat.S_IMODE(os.stat(self.socket_path).st_mode), 0o660)
+
+    def test_wrong_or_missing_token_is_refused(self):
+        for token in ("wrong", ""):
+            with self.subTest(token=token):
+                with self.assertRaisesRegex(PermissionError, "token"):
+                    self.client(token).post("/open", {"db_type": "memory", "log_file_path": self.log})
+        self.assertEqual(self.service.requests, {})
+
+    def test_right_token_opens_the_dataset(self):
+        dataset = self.client().post("/open", {"db_type": "memory", "log_file_path": self.log})["dataset"]
+
+        hits = self.client().post("/search", {"dataset": dataset, "text": "request processed", "k": 1})
+        self.assertEqual(len(hits), 1)
+
+    def test_paths_outside_the_roots_are_refused(self):
+        link = os.path.join(self.root, "link.log")
+        os.symlink(self.secret, link)
+        for path in (self.secret, os.path.join(self.root, "..", "private", "secret.log"), link):
+            with self.subTest(path=path):
+                with self.assertRaisesRegex(PermissionError, "outside"):
+                    self.client().post("/open", {"db_type": "memory", "log_file_path": path})
+
+    def test_ingest_and_tail_outside_the_roots_are_refused(self):
+        dataset = self.client().post("/open", {"db_type": "memory", "log_file_path": self.log})["dataset"]
+        for route in ("/ingest", "/tail"):
+            with self.subTest(route=route):
+                with self.assertRaises(PermissionError):
+                    self.client().post(route, {"dataset": dataset, "path": self.secret})
+        self.assertEqual(self.service.metrics()["tailers"], {})
+
+class HttpTokenTest(unittest.TestCase):
+    def test_http_needs_a_token(self):
+        with self.assertRaisesRegex(ValueError, "token"):
+            serve("http://127.0.0.1:8765", IndexService(StubEmbedder(), roots=[tempfile.gettempdir()]), token="")
+
+if __name__ == "__main__":
+    unittest.main()
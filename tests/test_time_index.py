@@ -0,0 +1,96 @@
+"""
+Year-less syslog timestamps and the time range reads of LogTimeIndex.
+Run with `python -m unittest discover tests` from the repository root.
+"""
+from datetime import datetime, timedelta
+import os
+import tempfile
+import unittest
+
+from app.core.embedding.indexer import InMemoryIndexer
+from app.core.embedding.log_chunker import LogChunker, with_inferred_year
+from app.core.embedding.pipeline import VectorPipeline
+from benchmarks.log_generator import SyntheticLogGenerator
+from benchmarks.stub_model import StubEmbedder
+
+MIXED = [
+    "2025-10-04 23:59:57 [INFO] api: line 1",
+    "Oct 04 23:59:58 [INFO] api: line 2",
+    "2025/10/04 23:59:59 [INFO] api: line 3",
+    "Oct 05 00:00:00 [ERROR] api: line 4",
+    "2025-10-05 00:00:01.250 [INFO] api: line 5",
+    "Oct 05 00:00:02 [WARNING] api: line 6",
+    "    continuation of line 6",
+    "2025-10-05 00:00:09 [INFO] api: line 8",
+]
+
+def write_log(directory : str, name : str, lines, mtime : datetime) -> str:
+    path = os.path.join(directory, name)
+    with open(path, "w") as f:
+        f.writelines(f"{line}\n" for line in lines)
+    os.utime(path, (mtime.timestamp(), mtime.timestamp()))
+    return path
+
+class InferredYearTest(unittest.TestCase):
+    def test_year_of_the_reference(self):
+        self.assertEqual(with_inferred_year("Oct 05 00:00:00", datetime(2025, 10, 4, 23, 0)), datetime(2025, 10, 5))
+
+    def test_new_year_moves_forward_and_back(self):
+        self.assertEqual(with_inferred_year("Jan 01 00:00:01", datetime(2025, 12, 31, 23, 59)), datetime(2026, 1, 1, 0, 0, 1))
+        self.assertEqual(with_inferred_year("Dec 31 23:59:59", datetime(2026, 1, 1, 0, 5)), datetime(2025, 12, 31, 23, 59, 59))
+
+    def test_leap_day(self):
+        self.assertEqual(with_inferred_year("Feb 29 12:00:00", datetime(2024, 3, 1)), datetime(2024, 2, 29, 12))
+
+    def test_chunker_dates_syslog_lines_from_the_previous_line(self):
+        parser = LogChunker()
+        self.assertEqual(parser._parse_log_line(MIXED[1], datetime(2025, 10, 4, 23, 59, 57))["timestamp"],
+                         datetime(2025, 10, 4, 23, 59, 58))
+        self.assertNotEqual(parser._parse_log_line(MIXED[1])["timestamp"].year, 1900)
+
+class TimeRangeTest(unittest.TestCase):
+    def setUp(self):
+        self.work_dir = tempfile.TemporaryDirectory()
+        self.pipe = VectorPipeline(InMemoryIndexer, embedder=StubEmbedder())
+
+    def tearDown(self):
+        self.pipe.close()
+        self.work_dir.cleanup()
+
+    def texts(self, result):
+        return [line["text"] for line in result["lines"]]
+
+    def test_mixed_formats_range_is_complete(self):
+        path = write_log(self.work_dir.name, "api.log", MIXED, datetime(2025, 10, 5, 1, 0))
+        self.pipe.create_db(path)
+
+        center = datetime(2025, 10, 5)
+        result = self.pipe.read_range(center - timedelta(seconds=5), center + timedelta(seconds=5))
+
+        self.assertEqual(self.texts(result), MIXED[:7])
+        self.assertFalse(result["truncated"])
+        self.assertEqual(result["lines"][3]["timestamp"], datetime(2025, 10, 5))
+
+    def test_syslog_file_takes_the_year_from_its_mtime(self):
+        lines = ["Dec 31 23:59:58 [INFO] api: before", "Jan 01 00:00:02 [INFO] api: after"]
+        path = write_log(self.work_dir.name, "api.log", lines, datetime(2026, 1, 1, 0, 10))
+        self.pipe.create_db(path)
+
+        result = self.pipe.read_range(datetime(2025, 12, 31, 23, 59), datetime(2026, 1, 1, 0, 1))
+
+        self.assertEqual(self.texts(result), lines)
+        self.assertEqual([line["timestamp"].year for line in result["lines"]], [2025, 2026])
+
+    def test_generated_syslog_log_is_read_whole(self):
+        generator = SyntheticLogGenerator(formats=["syslog"])
+        path = generator.write(os.path.join(self.work_dir.name, "syslog.log"), 3000)
+        mtime = generator.start + timedelta(hours=1)
+        os.utime(path, (mtime.timestamp(), mtime.timestamp()))
+        self.pipe.create_db(path)
+
+        result = self.pipe.read_range(generator.start, generator.start + timedelta(hours=1), max_lines=10_000)
+
+        self.assertEqual(len(result["lines"]), 3000)
+
+if __name__ == "__main__":
+    unittest.main()